@@ -5,7 +5,12 @@ from .config import Config
 from .extensions import db, login_manager, csrf, limiter
 from .models import User
 from .services.billing import disable_expired_accounts
+from .services.conversations import build_conversation_summaries
+from .services.gating import sync_progress_ordinals
+from .services.outbox import resume_outbox
+from .services.search import ensure_search_index
 from .services.sqlite_schema import ensure_sqlite_schema
+from .services.user_cache import get_user_cache
 
 def create_app():
     app = Flask(__name__)
@@ -27,6 +32,20 @@ def create_app():
         except Exception:
             # Don't crash the app on schema patch failure; routes will show errors.
             pass
+        try:
+            sync_progress_ordinals()
+        except Exception:
+            app.logger.exception("could not sync progress ordinals")
+        try:
+            build_conversation_summaries()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("could not build conversation summaries")
+        try:
+            ensure_search_index()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("could not set up the search index")
 
     from .auth.routes import auth_bp
     from .admin.routes import admin_bp
@@ -46,7 +65,8 @@ def create_app():
 
     @login_manager.user_loader
     def load_user(user_id):
-        return db.session.get(User, int(user_id))
+        # Cached snapshot, not a session object (see services/user_cache.py)
+        return get_user_cache().get(int(user_id), lambda uid: db.session.get(User, uid))
 
     # billing job daily
     scheduler = BackgroundScheduler(daemon=True)
@@ -54,6 +74,14 @@ def create_app():
         with app.app_context():
             disable_expired_accounts()
     scheduler.add_job(_job, "interval", hours=24)
+    # email retries still due (e.g. queued before a restart)
+    def _outbox_job():
+        with app.app_context():
+            try:
+                resume_outbox()
+            finally:
+                db.session.remove()
+    scheduler.add_job(_outbox_job, "interval", minutes=1)
     scheduler.start()
 
     return app
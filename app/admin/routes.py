@@ -1,7 +1,14 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash
+from flask import Blueprint, current_app, render_template, redirect, url_for, request, flash, jsonify
 from ..decorators import role_required
 from ..extensions import db
-from ..models import Role, User, Lesson, Exercise
+from ..models import Role, User, Lesson, Exercise, RegradeJob
+from ..services.code_checker import parse_module_list
+from ..services.grading_queue import queue_stats
+from ..services.outbox import outbox_stats
+from ..services.user_cache import get_user_cache
+from ..services.regrade import (
+    cancel_regrade, launch_in_background, regrade_status, resume_regrade, start_regrade, tests_sha,
+)
 
 admin_bp = Blueprint("admin", __name__)
 
@@ -10,7 +17,18 @@ admin_bp = Blueprint("admin", __name__)
 def dashboard():
     teachers = User.query.filter_by(role=Role.TEACHER).order_by(User.created_at.desc()).all()
     lessons = Lesson.query.order_by(Lesson.order.asc()).all()
-    return render_template("admin_dashboard.html", teachers=teachers, lessons=lessons)
+    exercises = Exercise.query.order_by(Exercise.lesson_id.asc(), Exercise.order.asc()).all()
+    regrades = RegradeJob.query.order_by(RegradeJob.id.desc()).limit(5).all()
+    return render_template(
+        "admin_dashboard.html", teachers=teachers, lessons=lessons, exercises=exercises,
+        regrades=[regrade_status(j) for j in regrades], grading=queue_stats(), user_cache=get_user_cache().stats(),
+        outbox=outbox_stats(),
+    )
+
+@admin_bp.get("/api/grading-queue")
+@role_required(Role.ADMIN)
+def grading_queue():
+    return jsonify(queue_stats())
 
 @admin_bp.post("/create-teacher")
 @role_required(Role.ADMIN)
@@ -58,6 +76,7 @@ def create_exercise():
     level = (request.form.get("level") or "Beginner").strip()
     order = int(request.form.get("order") or "1")
     time_limit_ms = int(request.form.get("time_limit_ms") or "400")
+    memory_limit_mb = int(request.form.get("memory_limit_mb") or "256")
     token_reward = int(request.form.get("token_reward") or "1")
 
     # rule toggles (unchecked checkbox -> missing)
@@ -80,6 +99,17 @@ def create_exercise():
     forbid_print = _cb("forbid_print")
     require_input = _cb("require_input")
 
+    forbidden_imports = " ".join(parse_module_list(request.form.get("forbidden_imports")))
+    require_recursion = _cb("require_recursion")
+    forbid_recursion = _cb("forbid_recursion")
+    forbid_comprehensions = _cb("forbid_comprehensions")
+
+    bench_enabled = _cb("bench_enabled")
+    bench_function = (request.form.get("bench_function") or "").strip() or None
+    bench_inputs = (request.form.get("bench_inputs") or "").strip()
+    bench_repeats = int(request.form.get("bench_repeats") or "7")
+    bench_reference_ms = request.form.get("bench_reference_ms", type=float)
+
     # --- sanity checks / conflict resolution ---
     if require_function and not function_name:
         flash("If you require a function, you must set a function name.")
@@ -95,6 +125,16 @@ def create_exercise():
     if require_while and forbid_while:
         forbid_while = False
         flash("Note: both 'require_while' and 'forbid_while' were selected; keeping require_while.")
+    if require_recursion and forbid_recursion:
+        forbid_recursion = False
+        flash("Note: both 'require_recursion' and 'forbid_recursion' were selected; keeping require_recursion.")
+
+    if bench_enabled and not bench_inputs:
+        flash("A benchmark needs inputs.")
+        return redirect(url_for("admin.dashboard"))
+    if bench_enabled and not (bench_function or function_name):
+        flash("A benchmark needs a function name.")
+        return redirect(url_for("admin.dashboard"))
 
     if not (lesson_id and title and prompt and tests_py):
         flash("Please fill required exercise fields.")
@@ -102,13 +142,79 @@ def create_exercise():
 
     ex = Exercise(
         lesson_id=lesson_id, title=title, prompt=prompt, tests_py=tests_py,
-        hint=hint, level=level, order=order, time_limit_ms=time_limit_ms, token_reward=token_reward,
+        hint=hint, level=level, order=order, time_limit_ms=time_limit_ms,
+        memory_limit_mb=memory_limit_mb, token_reward=token_reward,
         require_if=require_if, require_else=require_else, allow_elif=allow_elif,
         require_for=require_for, require_while=require_while, forbid_for=forbid_for, forbid_while=forbid_while,
         require_function=require_function, function_name=function_name,
         require_print=require_print, forbid_print=forbid_print, require_input=require_input,
+        forbidden_imports=forbidden_imports, require_recursion=require_recursion,
+        forbid_recursion=forbid_recursion, forbid_comprehensions=forbid_comprehensions,
+        bench_enabled=bench_enabled, bench_function=bench_function, bench_inputs=bench_inputs,
+        bench_repeats=max(1, min(bench_repeats, 50)), bench_reference_ms=bench_reference_ms,
     )
     db.session.add(ex)
     db.session.commit()
     flash("Exercise created.")
     return redirect(url_for("admin.dashboard"))
+
+
+def _run_regrade_here() -> bool:
+    # The db backend has `python -m app.regrade` runners; otherwise the web
+    # process runs the job itself.
+    return current_app.config.get("GRADING_BACKEND", "thread") != "db"
+
+@admin_bp.get("/exercise/<int:exercise_id>/tests")
+@role_required(Role.ADMIN)
+def exercise_tests(exercise_id):
+    ex = Exercise.query.get_or_404(exercise_id)
+    jobs = RegradeJob.query.filter_by(exercise_id=ex.id).order_by(RegradeJob.id.desc()).limit(10).all()
+    return render_template("admin_exercise_tests.html", ex=ex, jobs=[regrade_status(j) for j in jobs])
+
+@admin_bp.post("/exercise/<int:exercise_id>/tests")
+@role_required(Role.ADMIN)
+def update_exercise_tests(exercise_id):
+    ex = Exercise.query.get_or_404(exercise_id)
+    tests_py = (request.form.get("tests_py") or "").strip()
+    if not tests_py:
+        flash("Tests cannot be empty.")
+        return redirect(url_for("admin.exercise_tests", exercise_id=ex.id))
+
+    changed = tests_sha(tests_py) != tests_sha(ex.tests_py)
+    ex.tests_py = tests_py
+    db.session.commit()
+    if request.form.get("regrade") is None:
+        flash("Tests saved. Existing submissions keep their old results." if changed else "Tests unchanged.")
+        return redirect(url_for("admin.exercise_tests", exercise_id=ex.id))
+
+    job = start_regrade(ex)
+    if _run_regrade_here():
+        launch_in_background(job.id)
+    flash(f"Tests saved. Regrading {job.total} submission(s) (job #{job.id}).")
+    return redirect(url_for("admin.exercise_tests", exercise_id=ex.id))
+
+@admin_bp.get("/api/regrade/<int:job_id>")
+@role_required(Role.ADMIN)
+def regrade_progress(job_id):
+    return jsonify(regrade_status(RegradeJob.query.get_or_404(job_id)))
+
+@admin_bp.post("/regrade/<int:job_id>/cancel")
+@role_required(Role.ADMIN)
+def regrade_cancel(job_id):
+    job = RegradeJob.query.get_or_404(job_id)
+    flash("Regrade cancelled." if cancel_regrade(job.id) else "That regrade is not running.")
+    return redirect(url_for("admin.exercise_tests", exercise_id=job.exercise_id))
+
+@admin_bp.post("/regrade/<int:job_id>/resume")
+@role_required(Role.ADMIN)
+def regrade_resume(job_id):
+    job = RegradeJob.query.get_or_404(job_id)
+    if job.tests_sha != tests_sha(job.exercise.tests_py):
+        flash("The tests changed since this regrade started; start a new one instead.")
+    elif resume_regrade(job.id):
+        if _run_regrade_here():
+            launch_in_background(job.id)
+        flash("Regrade resumed.")
+    else:
+        flash("Only failed or stalled regrades can be resumed.")
+    return redirect(url_for("admin.exercise_tests", exercise_id=job.exercise_id))
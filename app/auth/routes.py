@@ -8,7 +8,8 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from ..extensions import limiter
 from ..models import User, Role
 from ..extensions import db
-from ..services.emailer import send_email
+from ..services.emailer import smtp_config_error, smtp_settings
+from ..services.outbox import email_status, queue_email
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -67,6 +68,11 @@ def login_role_post(role):
             flash("Email does not match the admin account.")
             return redirect(url_for("auth.login_role", role=role))
 
+        err = smtp_config_error(smtp_settings(current_app.config))
+        if err:
+            flash(err)
+            return redirect(url_for("auth.login_role", role=role))
+
         code = f"{secrets.randbelow(1_000_000):06d}"
         ttl = int(current_app.config.get("ADMIN_OTP_TTL_SEC", 300))
         session["admin_otp_user_id"] = user.id
@@ -91,7 +97,8 @@ def login_role_post(role):
             legal="© EduPlatform",
         )
 
-        err = send_email(
+        # Sent by the outbox in the background; the OTP page shows its status.
+        email = queue_email(
             to_email=user.email,
             subject="EduPlatform Admin Login Code",
             body=(
@@ -100,12 +107,11 @@ def login_role_post(role):
                 f"This code expires in {expires_text}."
             ),
             html=html,
+            expires_in=ttl,
         )
-        if err:
-            flash(err)
-            return redirect(url_for("auth.login_role", role=role))
+        session["admin_otp_email_id"] = email.id
 
-        flash("A verification code was sent to your email.")
+        flash("A verification code is on its way to your email.")
         return redirect(url_for("auth.admin_otp"))
 
     login_user(user)
@@ -117,7 +123,7 @@ def login_role_post(role):
 def admin_otp():
     if not session.get("admin_otp_user_id"):
         return redirect(url_for("auth.login_role", role="admin"))
-    return render_template("auth_admin_otp.html")
+    return render_template("auth_admin_otp.html", delivery=email_status(session.get("admin_otp_email_id")))
 
 
 @auth_bp.post("/admin-otp")
@@ -135,6 +141,7 @@ def admin_otp_post():
         session.pop("admin_otp_user_id", None)
         session.pop("admin_otp_hash", None)
         session.pop("admin_otp_exp", None)
+        session.pop("admin_otp_email_id", None)
         flash("Verification code expired. Please login again.")
         return redirect(url_for("auth.login_role", role="admin"))
 
@@ -151,6 +158,7 @@ def admin_otp_post():
     session.pop("admin_otp_user_id", None)
     session.pop("admin_otp_hash", None)
     session.pop("admin_otp_exp", None)
+    session.pop("admin_otp_email_id", None)
 
     login_user(user)
     return redirect(url_for("core.index"))
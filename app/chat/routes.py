@@ -1,8 +1,12 @@
-from flask import Blueprint, render_template, redirect, url_for, request, abort
+from flask import Blueprint, current_app, render_template, redirect, url_for, request, abort, jsonify
 from flask_login import current_user
 from ..decorators import role_required
 from ..extensions import db
-from ..models import Role, User, Message
+from ..models import Role, User, Message, conversation_key
+from ..services.chat_hub import get_hub
+from ..services.conversations import (
+    history_page, inbox_json, inbox_page, mark_read, message_json, messages_after, record_message,
+)
 
 chat_bp = Blueprint("chat", __name__)
 
@@ -15,6 +19,20 @@ def _allowed_chat(other: User) -> bool:
         return True
     return False
 
+@chat_bp.get("/")
+@role_required(Role.ADMIN, Role.TEACHER, Role.STUDENT)
+def inbox():
+    before = request.args.get("before", type=int)
+    rows, more = inbox_page(current_user.id, before_id=before, limit=current_app.config.get("CHAT_INBOX_PAGE_SIZE", 30))
+    return render_template("chat_inbox.html", rows=rows, more=more)
+
+@chat_bp.get("/api/inbox")
+@role_required(Role.ADMIN, Role.TEACHER, Role.STUDENT)
+def inbox_api():
+    before = request.args.get("before", type=int)
+    rows, more = inbox_page(current_user.id, before_id=before, limit=current_app.config.get("CHAT_INBOX_PAGE_SIZE", 30))
+    return jsonify({"conversations": [inbox_json(c, name) for c, name in rows], "before": more})
+
 @chat_bp.get("/with/<int:user_id>")
 @role_required(Role.ADMIN, Role.TEACHER, Role.STUDENT)
 def chat_with(user_id):
@@ -22,12 +40,45 @@ def chat_with(user_id):
     if not _allowed_chat(other):
         abort(403)
 
-    msgs = Message.query.filter(
-        ((Message.sender_id==current_user.id) & (Message.receiver_id==other.id)) |
-        ((Message.sender_id==other.id) & (Message.receiver_id==current_user.id))
-    ).order_by(Message.created_at.asc()).all()
+    # Newest page only; the page fetches older ones from chat.history on scroll.
+    msgs, older = history_page(current_user.id, other.id, limit=current_app.config.get("CHAT_PAGE_SIZE", 50))
+    mark_read(current_user.id, other.id)
+    return render_template("chat.html", other=other, msgs=msgs, older=older)
+
+@chat_bp.get("/with/<int:user_id>/messages")
+@role_required(Role.ADMIN, Role.TEACHER, Role.STUDENT)
+def history(user_id):
+    other = User.query.get_or_404(user_id)
+    if not _allowed_chat(other):
+        abort(403)
+    cfg = current_app.config
+    names = {current_user.id: current_user.username, other.id: other.username}
+    after = request.args.get("after", type=int)
+    if after is None:
+        before = request.args.get("before", type=int)
+        msgs, older = history_page(current_user.id, other.id, before_id=before, limit=cfg.get("CHAT_PAGE_SIZE", 50))
+        return jsonify({"messages": [message_json(m, current_user.id, names) for m in msgs], "before": older})
 
-    return render_template("chat.html", other=other, msgs=msgs)
+    # ?after=<id>&wait=1: new messages, long-polling until one arrives.
+    hub = get_hub() if request.args.get("wait", type=int) else None
+    msgs = messages_after(current_user.id, other.id, after, limit=cfg.get("CHAT_PAGE_SIZE", 50))
+    retry_ms = 0
+    if not msgs and hub is not None:
+        # Give the connection back while waiting; the re-read starts a new
+        # transaction, so it sees the message that woke us.
+        db.session.rollback()
+        arrived = hub.wait(conversation_key(current_user.id, other.id), after, cfg.get("CHAT_WAIT_SEC", 25))
+        if arrived is None:
+            retry_ms = int(cfg.get("CHAT_WAIT_SEC", 25) * 200)  # too many waiting here: poll slowly
+        elif arrived:
+            msgs = messages_after(current_user.id, other.id, after, limit=cfg.get("CHAT_PAGE_SIZE", 50))
+    if any(m.receiver_id == current_user.id for m in msgs):
+        mark_read(current_user.id, other.id)  # shown on the open page
+    return jsonify({
+        "messages": [message_json(m, current_user.id, names) for m in msgs],
+        "after": msgs[-1].id if msgs else after,
+        "retry_ms": retry_ms,
+    })
 
 @chat_bp.post("/with/<int:user_id>")
 @role_required(Role.ADMIN, Role.TEACHER, Role.STUDENT)
@@ -36,8 +87,14 @@ def send(user_id):
     if not _allowed_chat(other):
         abort(403)
     text = (request.form.get("text") or "").strip()
+    m = None
     if text:
         m = Message(sender_id=current_user.id, receiver_id=other.id, text=text)
         db.session.add(m)
+        record_message(m)
         db.session.commit()
+        get_hub().publish(m.conversation_key, m.id)
+    if request.accept_mimetypes.best == "application/json":
+        names = {current_user.id: current_user.username, other.id: other.username}
+        return jsonify({"message": message_json(m, current_user.id, names) if m else None})
     return redirect(url_for("chat.chat_with", user_id=other.id))
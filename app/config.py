@@ -10,10 +10,109 @@ class Config:
 
 
     GRADER_TIMEOUT_SEC = int(os.environ.get("GRADER_TIMEOUT_SEC", "6"))
+    # rlimits for grading: Exercise.time_limit_ms of CPU plus this allowance for
+    # interpreter/pytest startup; memory when the exercise does not set one
+    GRADER_CPU_OVERHEAD_MS = int(os.environ.get("GRADER_CPU_OVERHEAD_MS", "1000"))
+    GRADER_MEMORY_LIMIT_MB = int(os.environ.get("GRADER_MEMORY_LIMIT_MB", "256"))
+    # Grading output: the tests are stopped once they print more than
+    # MAX_BYTES; KEEP_BYTES of each stream (head + tail) go into Submission.output
+    GRADER_OUTPUT_MAX_BYTES = int(os.environ.get("GRADER_OUTPUT_MAX_BYTES", str(1024 * 1024)))
+    GRADER_OUTPUT_KEEP_BYTES = int(os.environ.get("GRADER_OUTPUT_KEEP_BYTES", str(64 * 1024)))
+    # "Run" button: wall-clock timeout, CPU seconds and memory for student code
+    RUN_TIMEOUT_SEC = int(os.environ.get("RUN_TIMEOUT_SEC", "15"))
+    RUN_CPU_LIMIT_SEC = int(os.environ.get("RUN_CPU_LIMIT_SEC", "5"))
+    RUN_MEMORY_LIMIT_MB = int(os.environ.get("RUN_MEMORY_LIMIT_MB", "256"))
+    # "Run" output cap (the program is stopped past it, streamed or not) and the
+    # SSE keep-alive interval, which is also how soon a closed tab kills the program
+    RUN_OUTPUT_MAX_BYTES = int(os.environ.get("RUN_OUTPUT_MAX_BYTES", str(64 * 1024)))
+    RUN_STREAM_HEARTBEAT_SEC = float(os.environ.get("RUN_STREAM_HEARTBEAT_SEC", "2"))
+    # Admission control for running student code (Run, grading, benchmarks):
+    # slots shared by every process on the host (0 = CPU count), Runs in flight
+    # per student, and Run requests allowed to wait per process / for how long
+    EXEC_SLOTS = int(os.environ.get("EXEC_SLOTS", "0"))
+    EXEC_SLOT_DIR = os.environ.get("EXEC_SLOT_DIR", "instance/exec-slots")
+    EXEC_PER_USER = int(os.environ.get("EXEC_PER_USER", "2"))
+    EXEC_QUEUE_MAX = int(os.environ.get("EXEC_QUEUE_MAX", "8"))
+    EXEC_QUEUE_TIMEOUT_SEC = float(os.environ.get("EXEC_QUEUE_TIMEOUT_SEC", "5"))
+    # Reused job directories (Run, grading, benchmarks), kept per process under
+    # WORKSPACE_DIR ("" = /dev/shm if writable, else the temp dir; use a disk
+    # path if /dev/shm is small, e.g. Docker's 64 MB default)
+    WORKSPACE_DIR = os.environ.get("WORKSPACE_DIR", "")
+    WORKSPACE_POOL_SIZE = int(os.environ.get("WORKSPACE_POOL_SIZE", "4"))
+    # Benchmark runs for performance-graded exercises
+    BENCH_TIMEOUT_SEC = int(os.environ.get("BENCH_TIMEOUT_SEC", "20"))
+    BENCH_MAX_REPEATS = int(os.environ.get("BENCH_MAX_REPEATS", "50"))
+    # Not read from the environment on purpose: docker-compose sets
+    # USE_DOCKER_GRADER=1, but the web image has no docker CLI or daemon
+    # socket, and the pool's work dirs would have to be host paths.
     USE_DOCKER_GRADER = False
+    # "pytest" or "lite" (precompiled test_* functions, no pytest collection)
+    GRADER_ENGINE = os.environ.get("GRADER_ENGINE", "pytest")
+    # Pre-warmed pytest workers for local grading (0 = spawn pytest per submission)
+    GRADER_POOL_SIZE = int(os.environ.get("GRADER_POOL_SIZE", "2"))
+    GRADER_POOL_MAX_JOBS = int(os.environ.get("GRADER_POOL_MAX_JOBS", "50"))
+    # Result cache keyed on (engine, tests_py, normalized code); 0 entries disables it
+    GRADE_CACHE_ENTRIES = int(os.environ.get("GRADE_CACHE_ENTRIES", "2048"))
+    GRADE_CACHE_MAX_BYTES = int(os.environ.get("GRADE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    # Background grading threads per process and max queued submissions
+    GRADING_WORKERS = int(os.environ.get("GRADING_WORKERS", "2"))
+    GRADING_QUEUE_MAX = int(os.environ.get("GRADING_QUEUE_MAX", "100"))
+    # Thread backend only: PENDING rows older than this were lost by a restart
+    # and are marked ERROR (keep it above queue max * timeout / workers)
+    GRADING_STALE_SEC = int(os.environ.get("GRADING_STALE_SEC", "600"))
+    # "thread" = grade inside the web process; "db" = durable job table served
+    # by `python -m app.grader_worker` (can run on other machines)
+    GRADING_BACKEND = os.environ.get("GRADING_BACKEND", "thread")
+    GRADING_LEASE_SEC = int(os.environ.get("GRADING_LEASE_SEC", "30"))
+    GRADING_MAX_ATTEMPTS = int(os.environ.get("GRADING_MAX_ATTEMPTS", "3"))
+    # Bulk regrade after an exercise's tests change: pool processes (run at
+    # REGRADE_NICE), submissions per batch/transaction, and pause while more
+    # than REGRADE_MAX_LIVE_PENDING live submissions wait (-1 = never pause)
+    REGRADE_WORKERS = int(os.environ.get("REGRADE_WORKERS", "2"))
+    REGRADE_BATCH_SIZE = int(os.environ.get("REGRADE_BATCH_SIZE", "25"))
+    REGRADE_NICE = int(os.environ.get("REGRADE_NICE", "10"))
+    REGRADE_MAX_LIVE_PENDING = int(os.environ.get("REGRADE_MAX_LIVE_PENDING", "3"))
+    REGRADE_BACKOFF_SEC = float(os.environ.get("REGRADE_BACKOFF_SEC", "2"))
+    REGRADE_LEASE_SEC = int(os.environ.get("REGRADE_LEASE_SEC", "120"))
+
+    # Replaced whenever lessons/exercises are added or reordered; every process
+    # rebuilds its cached exercise sequence when it changes (see gating.py)
+    SEQUENCE_STAMP_FILE = os.environ.get("SEQUENCE_STAMP_FILE", "instance/exercise-sequence.stamp")
 
     DOCKER_IMAGE = os.environ.get("DOCKER_IMAGE", "edu_runner:latest")
+    DOCKER_BIN = os.environ.get("DOCKER_BIN", "docker")
+    # Long-lived runner containers reused across submissions (0 = docker run --rm per job)
+    DOCKER_POOL_SIZE = int(os.environ.get("DOCKER_POOL_SIZE", "2"))
+    DOCKER_POOL_MAX_JOBS = int(os.environ.get("DOCKER_POOL_MAX_JOBS", "100"))
+    DOCKER_POOL_DIR = os.environ.get("DOCKER_POOL_DIR", "instance/docker-work")
+
+
+    # Chat messages per page (older ones load as the user scrolls up) and
+    # conversations per inbox page
+    CHAT_PAGE_SIZE = int(os.environ.get("CHAT_PAGE_SIZE", "50"))
+    CHAT_INBOX_PAGE_SIZE = int(os.environ.get("CHAT_INBOX_PAGE_SIZE", "30"))
+    # Open chat pages long-poll for new messages (services/chat_hub.py): how long
+    # a request waits, how many may wait per process (each holds a worker
+    # thread), and how often other workers' messages are picked up
+    CHAT_WAIT_SEC = float(os.environ.get("CHAT_WAIT_SEC", "25"))
+    CHAT_MAX_WAITERS = int(os.environ.get("CHAT_MAX_WAITERS", "4"))
+    CHAT_POLL_SEC = float(os.environ.get("CHAT_POLL_SEC", "1"))
+
+    # Logged-in user snapshots cached per process (see services/user_cache.py);
+    # other processes see role/subscription changes within the TTL
+    USER_CACHE_TTL_SEC = float(os.environ.get("USER_CACHE_TTL_SEC", "10"))
+    USER_CACHE_ENTRIES = int(os.environ.get("USER_CACHE_ENTRIES", "2048"))
+
+    # Type-ahead suggestions (services/search.py): results per request, and
+    # how long each (scope, prefix) result is cached per process
+    SEARCH_SUGGEST_LIMIT = int(os.environ.get("SEARCH_SUGGEST_LIMIT", "8"))
+    SEARCH_SUGGEST_TTL_SEC = float(os.environ.get("SEARCH_SUGGEST_TTL_SEC", "30"))
+    SEARCH_SUGGEST_CACHE_ENTRIES = int(os.environ.get("SEARCH_SUGGEST_CACHE_ENTRIES", "1024"))
 
+    # Rate-limit counters shared by all workers on the host (services/ratelimit_store.py);
+    # "memory://" keeps them per process
+    RATELIMIT_STORAGE_URI = os.environ.get("RATELIMIT_STORAGE_URI", "sqlite-limits:///instance/ratelimits.db")
+    RATELIMIT_STRATEGY = os.environ.get("RATELIMIT_STRATEGY", "sliding-window-counter")
 
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = "Lax"
@@ -26,6 +125,17 @@ class Config:
     SMTP_PASS = os.environ.get("SMTP_PASS", "")
     SMTP_FROM = os.environ.get("SMTP_FROM", SMTP_USER)
     SMTP_USE_TLS = os.environ.get("SMTP_USE_TLS", "1") == "1"
+    SMTP_TIMEOUT_SEC = float(os.environ.get("SMTP_TIMEOUT_SEC", "10"))
+    # Email outbox (services/outbox.py): the sender keeps its SMTP connection
+    # for SMTP_IDLE_SEC after the last message; failed sends retry with
+    # backoff doubling from RETRY_BASE up to RETRY_MAX, MAX_ATTEMPTS in all
+    SMTP_IDLE_SEC = float(os.environ.get("SMTP_IDLE_SEC", "30"))
+    OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "20"))
+    OUTBOX_POLL_SEC = float(os.environ.get("OUTBOX_POLL_SEC", "5"))
+    OUTBOX_LEASE_SEC = int(os.environ.get("OUTBOX_LEASE_SEC", "300"))
+    OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "6"))
+    OUTBOX_RETRY_BASE_SEC = float(os.environ.get("OUTBOX_RETRY_BASE_SEC", "5"))
+    OUTBOX_RETRY_MAX_SEC = float(os.environ.get("OUTBOX_RETRY_MAX_SEC", "600"))
 
     ADMIN_OTP_TTL_SEC = int(os.environ.get("ADMIN_OTP_TTL_SEC", "300"))
     DEBUG = False
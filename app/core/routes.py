@@ -4,6 +4,7 @@ from ..decorators import role_required
 from ..models import Role, User, Lesson, Exercise, Submission, Progress
 from ..extensions import db
 from ..services.gating import progress_stats
+from ..services.search import EXERCISE, LESSON, USER, search as search_all, suggest, user_scope
 
 core_bp = Blueprint("core", __name__)
 
@@ -24,12 +25,24 @@ def index():
 @role_required(Role.ADMIN, Role.TEACHER, Role.STUDENT)
 def search():
     q = (request.args.get("q") or "").strip()
-    users = lessons = exercises = []
+    results = {"users": [], "lessons": [], "exercises": []}
     if q:
-        users = User.query.filter(User.username.contains(q)).limit(30).all()
-        lessons = Lesson.query.filter(Lesson.title.contains(q)).limit(30).all()
-        exercises = Exercise.query.filter(Exercise.title.contains(q)).limit(30).all()
-    return render_template("search.html", q=q, users=users, lessons=lessons, exercises=exercises)
+        results = search_all(q, user_scope(current_user), limit=30)
+    return render_template("search.html", q=q, **results)
+
+_SUGGEST_KINDS = {"user": USER, "lesson": LESSON, "exercise": EXERCISE}
+
+@core_bp.get("/api/search/suggest")
+@role_required(Role.ADMIN, Role.TEACHER, Role.STUDENT)
+def search_suggest():
+    # type-ahead: [{"id", "label"}] of one kind (?kind=user|lesson|exercise)
+    from flask import current_app, jsonify
+    q = (request.args.get("q") or "").strip()[:100]
+    kind = _SUGGEST_KINDS.get(request.args.get("kind") or "user")
+    if kind is None:
+        return jsonify({"error": "unknown kind"}), 400
+    limit = current_app.config.get("SEARCH_SUGGEST_LIMIT", 8)
+    return jsonify(suggest(q, user_scope(current_user), kind, limit))
 
 @core_bp.get("/api/stats")
 @role_required(Role.ADMIN, Role.TEACHER, Role.STUDENT)
@@ -10,5 +10,7 @@ from flask_wtf.csrf import CSRFProtect
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
+from .services import ratelimit_store  # noqa: F401  registers the "sqlite-limits" storage scheme
+
 csrf = CSRFProtect()
 limiter = Limiter(get_remote_address)
@@ -0,0 +1,117 @@
+"""Standalone grading worker.
+
+Usage:
+    python -m app.grader_worker [--concurrency N] [--poll SEC]
+
+Claims jobs from the `grading_job` table (GRADING_BACKEND = "db"), grades
+them and writes the result back to the Submission. Run as many of these as
+you like, on any machine that can reach the database.
+
+SIGTERM / SIGINT stop claiming new jobs and wait for in-flight ones to
+finish; a second signal exits immediately.
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+
+from . import create_app
+from .extensions import db
+from .services.job_queue import claim_job, finish_job, heartbeat, process_job
+
+
+class _Heartbeat(threading.Thread):
+    """Keeps the lease of one job alive while it is being graded."""
+
+    def __init__(self, app, job_id: int, worker_id: str, lease_sec: int):
+        super().__init__(daemon=True)
+        self.app = app
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.lease_sec = lease_sec
+        self.stopped = threading.Event()
+
+    def run(self):
+        interval = max(1.0, self.lease_sec / 3)
+        while not self.stopped.wait(interval):
+            with self.app.app_context():
+                try:
+                    if not heartbeat(self.job_id, self.worker_id, self.lease_sec):
+                        return
+                except Exception:
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+
+def _work(app, worker_id: str, stop: threading.Event, poll: float) -> None:
+    cfg = app.config
+    lease_sec = cfg.get("GRADING_LEASE_SEC", 30)
+    max_attempts = cfg.get("GRADING_MAX_ATTEMPTS", 3)
+
+    while not stop.is_set():
+        with app.app_context():
+            try:
+                job = claim_job(worker_id, lease_sec, max_attempts)
+                if job is None:
+                    db.session.remove()
+                    stop.wait(poll)
+                    continue
+
+                hb = _Heartbeat(app, job.id, worker_id, lease_sec)
+                hb.start()
+                error = ""
+                try:
+                    process_job(job)
+                except Exception as e:
+                    db.session.rollback()
+                    error = str(e) or e.__class__.__name__
+                finally:
+                    hb.stopped.set()
+                finish_job(job.id, worker_id, error, max_attempts)
+            except Exception as e:
+                db.session.rollback()
+                print(f"[{worker_id}] {e}", file=sys.stderr)
+                stop.wait(poll)
+            finally:
+                db.session.remove()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="EduPlatform grading worker")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("GRADER_WORKER_CONCURRENCY", "2")))
+    parser.add_argument("--poll", type=float, default=1.0, help="seconds between polls when idle")
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    stop = threading.Event()
+
+    def _on_signal(signum, _frame):
+        if stop.is_set():
+            print("Forced exit.", file=sys.stderr)
+            os._exit(1)
+        print("Draining in-flight jobs (signal again to force)...", file=sys.stderr)
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _on_signal)
+    signal.signal(signal.SIGINT, _on_signal)
+
+    base_id = f"{socket.gethostname()}:{os.getpid()}"
+    threads = []
+    for i in range(max(1, args.concurrency)):
+        t = threading.Thread(target=_work, args=(app, f"{base_id}:{i}", stop, args.poll), daemon=True)
+        t.start()
+        threads.append(t)
+
+    print(f"Grader worker {base_id} running with {len(threads)} thread(s).", file=sys.stderr)
+    while any(t.is_alive() for t in threads):
+        for t in threads:
+            t.join(timeout=0.5)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
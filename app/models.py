@@ -65,7 +65,8 @@ class Exercise(db.Model):
     order = db.Column(db.Integer, default=1)
 
     tests_py = db.Column(db.Text, nullable=False)
-    time_limit_ms = db.Column(db.Integer, default=400)
+    time_limit_ms = db.Column(db.Integer, default=400)  # CPU time for the tests
+    memory_limit_mb = db.Column(db.Integer, default=256)  # address space of the grading process
     token_reward = db.Column(db.Integer, default=1)
     hint = db.Column(db.Text, default="")
 
@@ -86,6 +87,18 @@ class Exercise(db.Model):
     forbid_print = db.Column(db.Boolean, default=False)
     require_input = db.Column(db.Boolean, default=False)
 
+    forbidden_imports = db.Column(db.String(255), default="")  # e.g. "itertools, collections"
+    require_recursion = db.Column(db.Boolean, default=False)
+    forbid_recursion = db.Column(db.Boolean, default=False)
+    forbid_comprehensions = db.Column(db.Boolean, default=False)
+
+    # --- Performance benchmark (run after the tests pass) ---
+    bench_enabled = db.Column(db.Boolean, default=False)
+    bench_function = db.Column(db.String(64), nullable=True)  # defaults to function_name
+    bench_inputs = db.Column(db.Text, default="")  # Python expression -> list of inputs
+    bench_repeats = db.Column(db.Integer, default=7)
+    bench_reference_ms = db.Column(db.Float, nullable=True)  # median must not exceed this
+
 class Submission(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
@@ -98,6 +111,12 @@ class Submission(db.Model):
     status = db.Column(db.String(30), default="PENDING")
 
     runtime_ms = db.Column(db.Integer, nullable=True)
+    # Measured on the grading process (rusage); empty for the Docker grader
+    cpu_ms = db.Column(db.Integer, nullable=True)
+    peak_rss_kb = db.Column(db.Integer, nullable=True)
+    # Benchmark stats (exercises with bench_enabled), startup excluded
+    bench_median_ms = db.Column(db.Float, nullable=True)
+    bench_p95_ms = db.Column(db.Float, nullable=True)
     output = db.Column(db.Text, default="")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -106,23 +125,142 @@ class Submission(db.Model):
     review_note = db.Column(db.Text, default="")
     reviewed_at = db.Column(db.DateTime, nullable=True)
 
+class GradingJob(db.Model):
+    """Durable grading work item, claimed by `python -m app.grader_worker`."""
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey("submission.id"), nullable=False, index=True)
+    submission = db.relationship("Submission")
+
+    # QUEUED / RUNNING / DONE / FAILED
+    status = db.Column(db.String(20), default="QUEUED", nullable=False, index=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    worker_id = db.Column(db.String(64), nullable=True)
+    lease_until = db.Column(db.DateTime, nullable=True, index=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, default="")
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class RegradeJob(db.Model):
+    """Bulk regrade of an exercise's submissions after its tests changed.
+
+    Submissions are processed in id order up to `max_submission_id`;
+    `cursor_id` is the last one written back, so a job resumes where it
+    stopped. Run by `python -m app.regrade` (or a web-process thread).
+    """
+    __tablename__ = "regrade_job"
+    id = db.Column(db.Integer, primary_key=True)
+    exercise_id = db.Column(db.Integer, db.ForeignKey("exercise.id"), nullable=False, index=True)
+    exercise = db.relationship("Exercise")
+    tests_sha = db.Column(db.String(64), nullable=False)  # tests_py the job grades against
+
+    # QUEUED / RUNNING / DONE / CANCELLED / FAILED
+    status = db.Column(db.String(20), default="QUEUED", nullable=False, index=True)
+    max_submission_id = db.Column(db.Integer, nullable=False, default=0)
+    cursor_id = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    done = db.Column(db.Integer, nullable=False, default=0)
+    changed = db.Column(db.Integer, nullable=False, default=0)  # verdict differs from before
+    rate_per_sec = db.Column(db.Float, nullable=True)  # throughput of the current/last run
+    worker_id = db.Column(db.String(64), nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, default="")
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class OutboundEmail(db.Model):
+    """Email handed to the outbox; sent and retried by services/outbox.py."""
+    __tablename__ = "outbound_email"
+    __table_args__ = (db.Index("ix_outbound_email_due", "status", "next_attempt_at"),)
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    html = db.Column(db.Text, nullable=True)
+
+    # QUEUED / SENDING / SENT / FAILED
+    status = db.Column(db.String(20), default="QUEUED", nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=True)  # not worth sending after this (e.g. OTP codes)
+    worker_id = db.Column(db.String(64), nullable=True)
+    lease_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, default="")
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+class BenchmarkBest(db.Model):
+    """Each student's fastest passing benchmark per exercise (leaderboard index)."""
+    __tablename__ = "benchmark_best"
+    __table_args__ = (
+        db.UniqueConstraint("exercise_id", "student_id", name="uq_benchmark_best_student"),
+        db.Index("ix_benchmark_best_rank", "exercise_id", "median_ms"),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    exercise_id = db.Column(db.Integer, db.ForeignKey("exercise.id"), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    student = db.relationship("User")
+    submission_id = db.Column(db.Integer, db.ForeignKey("submission.id"), nullable=False)
+
+    median_ms = db.Column(db.Float, nullable=False)
+    p95_ms = db.Column(db.Float, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Progress(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey("user.id"), unique=True, nullable=False)
     student = db.relationship("User")
     highest_exercise_id = db.Column(db.Integer, default=0)
+    highest_ordinal = db.Column(db.Integer, default=0)  # its 1-based position in the sequence
+
+def conversation_key(user_a: int, user_b: int) -> str:
+    """Same key for both directions of a conversation: "<lower id>:<higher id>"."""
+    return f"{min(user_a, user_b)}:{max(user_a, user_b)}"
+
+def _message_conversation_key(ctx):
+    params = ctx.get_current_parameters()
+    return conversation_key(params["sender_id"], params["receiver_id"])
 
 class Message(db.Model):
+    # History pages are index range scans: conversation_key = ? AND id < ?
+    __table_args__ = (db.Index("ix_message_conversation", "conversation_key", "id"),)
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     receiver_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     sender = db.relationship("User", foreign_keys=[sender_id])
     receiver = db.relationship("User", foreign_keys=[receiver_id])
+    conversation_key = db.Column(db.String(32), nullable=True, default=_message_conversation_key)
 
     text = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     seen = db.Column(db.Boolean, default=False)
 
+class ConversationSummary(db.Model):
+    """One participant's view of a conversation: its last message and how
+    many messages they have not read. Two rows per conversation, written
+    with each message (services/conversations.py); the inbox reads only these."""
+    __tablename__ = "conversation_summary"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "other_id", name="uq_conversation_summary_pair"),
+        db.Index("ix_conversation_summary_inbox", "user_id", "last_message_id"),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    other_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    other = db.relationship("User", foreign_keys=[other_id])
+    conversation_key = db.Column(db.String(32), nullable=False)
+
+    last_message_id = db.Column(db.Integer, nullable=False)
+    last_sender_id = db.Column(db.Integer, nullable=False)
+    last_text = db.Column(db.String(200), nullable=False, default="")  # preview, truncated
+    last_at = db.Column(db.DateTime, nullable=False)
+    unread = db.Column(db.Integer, nullable=False, default=0)
+
 class LabProject(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
@@ -0,0 +1,90 @@
+"""Bulk regrade runner.
+
+Usage:
+    python -m app.regrade --exercise ID [--workers N] [--batch N]
+    python -m app.regrade --job ID      # resume a stopped/failed job
+    python -m app.regrade [--poll SEC]  # serve queued jobs (GRADING_BACKEND = "db")
+
+Regrades an exercise's submissions against its current tests (see
+app/services/regrade.py), printing progress and throughput per batch.
+SIGTERM / SIGINT finish the current batch and requeue the job so it can be
+resumed; a second signal exits immediately.
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+
+from . import create_app
+from .extensions import db
+from .models import Exercise, RegradeJob
+from .services.regrade import next_claimable, resume_regrade, run_regrade, start_regrade
+
+
+def _log(msg: str) -> None:
+    print(msg, file=sys.stderr, flush=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="EduPlatform bulk regrade")
+    parser.add_argument("--exercise", type=int, help="start a new regrade of this exercise")
+    parser.add_argument("--job", type=int, help="resume this regrade job")
+    parser.add_argument("--workers", type=int, default=None, help="grading processes (default REGRADE_WORKERS)")
+    parser.add_argument("--batch", type=int, default=None, help="submissions per batch (default REGRADE_BATCH_SIZE)")
+    parser.add_argument("--poll", type=float, default=5.0, help="seconds between polls when serving")
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    stop = threading.Event()
+
+    def _on_signal(signum, _frame):
+        if stop.is_set():
+            _log("Forced exit.")
+            os._exit(1)
+        _log("Finishing the current batch (signal again to force)...")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _on_signal)
+    signal.signal(signal.SIGINT, _on_signal)
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:regrade"
+    opts = dict(workers=args.workers, batch_size=args.batch, stop=stop, log=_log)
+
+    with app.app_context():
+        try:
+            if args.exercise or args.job:
+                if args.exercise:
+                    ex = db.session.get(Exercise, args.exercise)
+                    if ex is None:
+                        _log(f"No exercise {args.exercise}.")
+                        return 2
+                    job_id = start_regrade(ex).id
+                else:
+                    job_id = args.job
+                    if db.session.get(RegradeJob, job_id) is None:
+                        _log(f"No regrade job {job_id}.")
+                        return 2
+                    resume_regrade(job_id)
+                status = run_regrade(job_id, worker_id, **opts)
+                _log(f"job {job_id}: {status or 'not claimable (running elsewhere or finished)'}")
+                return 0 if status in ("DONE", "QUEUED") else 1
+
+            _log(f"Regrade runner {worker_id} waiting for jobs.")
+            while not stop.is_set():
+                job_id = next_claimable()
+                if job_id is None:
+                    stop.wait(args.poll)
+                    continue
+                status = run_regrade(job_id, worker_id, **opts)
+                if status:
+                    _log(f"job {job_id}: {status}")
+            return 0
+        finally:
+            db.session.remove()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""Search index maintenance.
+
+Usage:
+    python -m app.search_index            # print rows indexed per table
+    python -m app.search_index --rebuild  # refill the index from the tables
+
+The index is created and kept up to date by triggers (see
+app/services/search.py); a rebuild is only needed if rows were written
+without them, e.g. a database restored from an older backup.
+"""
+
+import argparse
+import sys
+
+from . import create_app
+from .services.search import ensure_search_index, index_counts, rebuild_search_index
+
+
+def _log(msg: str) -> None:
+    print(msg, file=sys.stderr, flush=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="EduPlatform search index")
+    parser.add_argument("--rebuild", action="store_true", help="refill the index from the tables")
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        if not ensure_search_index():
+            _log("Full-text search is not available on this database (LIKE matching is used).")
+            return 1
+        counts = rebuild_search_index() if args.rebuild else index_counts()
+        _log(("Rebuilt: " if args.rebuild else "Indexed: ") + ", ".join(f"{k} {v}" for k, v in counts.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
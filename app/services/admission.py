@@ -0,0 +1,222 @@
+"""Admission control for running student code.
+
+Every child that executes student code (Run, grading, benchmarks) needs an
+execution slot. There are EXEC_SLOTS of them (default: the CPU count) per
+host, shared by all gunicorn workers, grader workers and regrade pool
+processes: a slot is an flock() on one of the files `slot-<n>.lock` in
+EXEC_SLOT_DIR. The kernel drops the lock when the holder exits, so a
+crashed process cannot leak a slot.
+
+Interactive runs are also limited to EXEC_PER_USER in flight per student
+(same mechanism, `user-<id>-<n>.lock`), and may wait at most
+EXEC_QUEUE_TIMEOUT_SEC for a slot, with at most EXEC_QUEUE_MAX of them
+waiting per process. Past any of those limits `acquire` raises `Busy` and
+the endpoint answers 429 straight away. Background grading waits for a
+slot as long as it takes.
+
+Where fcntl is unavailable (Windows) admission control is off.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+from flask import current_app
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class Busy(Exception):
+    """No capacity right now; `retry_after` is a hint in seconds."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """Held slot(s); release() is idempotent. Also a context manager."""
+
+    def __init__(self, fds=()):
+        self._fds = list(fds)
+
+    def release(self) -> None:
+        fds, self._fds = self._fds, []
+        for fd in fds:
+            os.close(fd)  # closing the descriptor drops its flock
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Admission:
+    def __init__(self, directory: str, slots: int, per_user: int, queue_max: int):
+        self.directory = directory
+        self.slots = max(1, slots)
+        self.per_user = max(1, per_user)
+        self.queue_max = max(0, queue_max)
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_ms_total = 0
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def _try_lock(path: str) -> Optional[int]:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except OSError:
+            os.close(fd)
+            return None
+
+    def _try_slot(self) -> Optional[int]:
+        # Random start so processes do not all contend for slot-0.
+        start = random.randrange(self.slots)
+        for i in range(self.slots):
+            fd = self._try_lock(self._path(f"slot-{(start + i) % self.slots}.lock"))
+            if fd is not None:
+                return fd
+        return None
+
+    def _try_user(self, user_id: int) -> Optional[int]:
+        for i in range(self.per_user):
+            fd = self._try_lock(self._path(f"user-{user_id}-{i}.lock"))
+            if fd is not None:
+                return fd
+        return None
+
+    def acquire(self, user_id: Optional[int] = None, timeout: Optional[float] = None) -> Ticket:
+        """Take a slot (and a per-user slot when `user_id` is given).
+
+        `timeout` None waits indefinitely and bypasses the queue bound (for
+        background grading). Raises Busy otherwise.
+        """
+        fds = []
+        if user_id is not None:
+            fd = self._try_user(user_id)
+            if fd is None:
+                self._count(rejected=1)
+                raise Busy(f"You already have {self.per_user} program(s) running. Wait for them to finish.")
+            fds.append(fd)
+
+        fd = self._try_slot()
+        if fd is None:
+            try:
+                fd = self._wait_for_slot(timeout)
+            except Busy:
+                Ticket(fds).release()
+                raise
+        fds.append(fd)
+        self._count(admitted=1)
+        return Ticket(fds)
+
+    def _wait_for_slot(self, timeout: Optional[float]) -> int:
+        with self._lock:
+            if timeout is not None and self.waiting >= self.queue_max:
+                self.rejected += 1
+                raise Busy("The server is busy running other programs. Try again in a moment.")
+            self.waiting += 1
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        delay = 0.01
+        try:
+            while True:
+                fd = self._try_slot()
+                if fd is not None:
+                    self._count(wait_ms=int((time.monotonic() - started) * 1000))
+                    return fd
+                if deadline is not None and time.monotonic() >= deadline:
+                    self._count(rejected=1)
+                    raise Busy("The server is busy running other programs. Try again in a moment.")
+                time.sleep(delay)
+                delay = min(delay * 2, 0.1)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+    def _count(self, admitted: int = 0, rejected: int = 0, wait_ms: int = 0) -> None:
+        with self._lock:
+            self.admitted += admitted
+            self.rejected += rejected
+            self.wait_ms_total += wait_ms
+
+    def in_use(self) -> int:
+        """Slots held right now, by any process on this host."""
+        busy = 0
+        for i in range(self.slots):
+            fd = self._try_lock(self._path(f"slot-{i}.lock"))
+            if fd is None:
+                busy += 1
+            else:
+                os.close(fd)
+        return busy
+
+    def stats(self) -> dict:
+        with self._lock:
+            local = {
+                "waiting_here": self.waiting,
+                "admitted_here": self.admitted,
+                "rejected_here": self.rejected,
+                "avg_wait_ms": int(self.wait_ms_total / self.admitted) if self.admitted else 0,
+            }
+        return {"enabled": True, "slots": self.slots, "in_use": self.in_use(),
+                "per_user": self.per_user, "queue_max": self.queue_max, **local}
+
+
+_admission: Optional[Admission] = None
+_admission_pid: Optional[int] = None
+_admission_lock = threading.Lock()
+
+
+def get_admission() -> Optional[Admission]:
+    """This process's Admission, or None where flock is unavailable."""
+    global _admission, _admission_pid
+    if fcntl is None:
+        return None
+    with _admission_lock:
+        if _admission is None or _admission_pid != os.getpid():
+            cfg = current_app.config
+            _admission = Admission(
+                cfg.get("EXEC_SLOT_DIR", "instance/exec-slots"),
+                cfg.get("EXEC_SLOTS", 0) or os.cpu_count() or 1,
+                cfg.get("EXEC_PER_USER", 2),
+                cfg.get("EXEC_QUEUE_MAX", 8),
+            )
+            _admission_pid = os.getpid()
+        return _admission
+
+
+def admit_run(user_id: int) -> Ticket:
+    """Slot for an interactive run; raises Busy rather than queueing long."""
+    adm = get_admission()
+    if adm is None:
+        return Ticket()
+    return adm.acquire(user_id, timeout=current_app.config.get("EXEC_QUEUE_TIMEOUT_SEC", 5))
+
+
+def execution_slot() -> Ticket:
+    """Slot for background work (grading, benchmarks); waits as long as needed."""
+    adm = get_admission()
+    return adm.acquire() if adm is not None else Ticket()
+
+
+def admission_stats() -> dict:
+    adm = get_admission()
+    return adm.stats() if adm is not None else {"enabled": False}
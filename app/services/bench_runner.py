@@ -0,0 +1,86 @@
+"""Benchmark harness for performance-graded exercises.
+
+Run as a standalone script inside the job directory, after the tests have
+passed. It reads and deletes `bench.json`:
+
+    {"function": "solve", "inputs": "<python expression>", "repeats": 7,
+     "nonce": "..."}
+
+`inputs` is the exercise author's expression for a list of inputs (a tuple
+is spread as positional arguments, anything else is passed as the single
+argument). It is evaluated before the solution is imported. After one
+warm-up pass, each of `repeats` passes calls the function once per input
+(on a fresh deep copy, made outside the timed region) and records the
+summed call time, so interpreter startup and imports are not measured.
+
+Prints one line `BENCH <nonce> <json>` with the per-pass samples in ms.
+Exit codes: 0 ok, 1 the solution failed, 2 bad benchmark setup.
+"""
+
+import copy
+import json
+import os
+import sys
+import time
+
+CONFIG_FILE = "bench.json"
+
+
+def _fail(code: int, msg: str) -> int:
+    sys.stderr.write(msg.rstrip() + "\n")
+    return code
+
+
+def run(cwd: str) -> int:
+    # Bind everything the measurement depends on before student code runs.
+    timer = time.perf_counter_ns
+    deepcopy = copy.deepcopy
+    out_fd = os.dup(1)
+
+    try:
+        with open(os.path.join(cwd, CONFIG_FILE), encoding="utf-8") as f:
+            cfg = json.load(f)
+        os.remove(os.path.join(cwd, CONFIG_FILE))
+        inputs = list(eval(cfg["inputs"], {"__builtins__": __builtins__}))  # noqa: S307 - author-defined
+        repeats = max(1, int(cfg.get("repeats", 7)))
+        nonce = str(cfg["nonce"])
+        name = cfg["function"]
+    except Exception as e:  # noqa: BLE001
+        return _fail(2, f"Benchmark setup error: {e.__class__.__name__}: {e}")
+    if not inputs:
+        return _fail(2, "Benchmark setup error: no inputs")
+    calls = [a if isinstance(a, tuple) else (a,) for a in inputs]
+
+    sys.path.insert(0, cwd)
+    sys.dont_write_bytecode = True
+    devnull = open(os.devnull, "w")
+    sys.stdout = devnull
+    try:
+        import solution  # noqa: F401
+
+        fn = getattr(solution, name, None)
+        if not callable(fn):
+            return _fail(1, f"Benchmark: solution.py has no function {name}()")
+
+        samples = []
+        for i in range(repeats + 1):
+            args_list = deepcopy(calls)
+            total = 0
+            for args in args_list:
+                t0 = timer()
+                fn(*args)
+                total += timer() - t0
+            if i:  # pass 0 is the warm-up
+                samples.append(total / 1e6)
+    except BaseException as e:  # noqa: BLE001 - report anything the solution raises
+        sys.stdout = sys.__stdout__
+        return _fail(1, f"Benchmark: the solution raised {e.__class__.__name__}: {e}")
+    finally:
+        sys.stdout = sys.__stdout__
+
+    os.write(out_fd, f"BENCH {nonce} {json.dumps(samples)}\n".encode())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run(os.getcwd()))
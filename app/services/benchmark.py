@@ -0,0 +1,94 @@
+"""Timed benchmark runs for performance-graded exercises.
+
+`benchmark_python` runs bench_runner.py against a solution that already
+passed the tests, under the same rlimits as grading (in the Docker
+container pool when USE_DOCKER_GRADER is on), and turns the per-pass
+samples into median / p95.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import secrets
+import statistics
+import subprocess
+import sys
+
+from flask import current_app
+
+from .admission import execution_slot
+from .bench_runner import CONFIG_FILE
+from .docker_pool import get_container_pool
+from .lite_engine import RUNNER_SCRIPT
+from .sandbox import run_limited
+from .workspace import workspace
+
+BENCH_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_runner.py")
+
+
+def percentile(samples: list, pct: float) -> float:
+    """Nearest-rank percentile of `samples`."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _parse(output: str, nonce: str):
+    prefix = f"BENCH {nonce} "
+    for line in output.splitlines():
+        if line.startswith(prefix):
+            return [float(x) for x in json.loads(line[len(prefix):])]
+    return None
+
+
+def benchmark_python(code_py: str, function: str, inputs_py: str, repeats: int,
+                     cpu_ms: int = None, memory_mb: int = None) -> dict:
+    """Returns {"status": "OK"|"FAILED"|"ERROR", "median_ms", "p95_ms", "samples_ms", "output"}."""
+    cfg = current_app.config
+    repeats = max(1, min(int(repeats or 1), cfg.get("BENCH_MAX_REPEATS", 50)))
+    nonce = secrets.token_hex(8)
+    bench_cfg = json.dumps({"function": function, "inputs": inputs_py, "repeats": repeats, "nonce": nonce})
+    timeout = cfg.get("BENCH_TIMEOUT_SEC", 20)
+
+    try:
+        with execution_slot():
+            if cfg.get("USE_DOCKER_GRADER", False):
+                with open(BENCH_SCRIPT, encoding="utf-8") as f:
+                    runner = f.read()
+                files = {"solution.py": code_py, "bench_runner.py": runner, CONFIG_FILE: bench_cfg}
+                pool = get_container_pool(cfg, RUNNER_SCRIPT)
+                reply = pool.run(files, ["python", "bench_runner.py"], timeout)
+                if reply.get("timeout"):
+                    return {"status": "FAILED", "output": "Benchmark: TIMEOUT"}
+                returncode, output = reply["returncode"], reply.get("output") or ""
+            else:
+                with workspace() as ws:
+                    ws.write("solution.py", code_py)
+                    ws.write(CONFIG_FILE, bench_cfg)
+                    p = run_limited(
+                        [sys.executable, "-I", BENCH_SCRIPT], cwd=ws.path, timeout=timeout,
+                        cpu_ms=cpu_ms, memory_mb=memory_mb,
+                        max_output=cfg.get("GRADER_OUTPUT_MAX_BYTES"), keep_output=cfg.get("GRADER_OUTPUT_KEEP_BYTES"),
+                    )
+                if p["cpu_exceeded"]:
+                    return {"status": "FAILED", "output": "Benchmark: CPU time limit exceeded"}
+                returncode, output = p["returncode"], p["stdout"] + "\n" + p["stderr"]
+    except subprocess.TimeoutExpired:
+        return {"status": "FAILED", "output": "Benchmark: TIMEOUT"}
+    except Exception as e:
+        return {"status": "ERROR", "output": f"Benchmark failed: {e}"}
+
+    samples = _parse(output, nonce) if returncode == 0 else None
+    if not samples:
+        # exit code 2 = the exercise's benchmark setup is broken, not the solution
+        status = "ERROR" if returncode == 2 else "FAILED"
+        return {"status": status, "output": output.strip() or f"Benchmark exited with code {returncode}"}
+    return {
+        "status": "OK",
+        "median_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(percentile(samples, 95), 4),
+        "samples_ms": samples,
+        "output": "",
+    }
@@ -0,0 +1,148 @@
+"""New-message notifications for open chat pages (long-poll).
+
+Each process has one `ChatHub`. A chat page asks for messages after the
+last one it shows and, when there are none, its request waits in the hub
+until its conversation gets a newer message (or the wait times out).
+
+Messages come in two ways:
+- `publish`, called by chat.send, wakes waiters in the sending process at
+  once;
+- messages sent through other gunicorn workers are found by one poller
+  thread per process. It reads new (id, conversation_key) rows above a
+  high-water mark every CHAT_POLL_SEC, starting from SELECT MAX(id).
+
+The poller only runs while a request is waiting, so an idle site makes no
+queries. Each waiting request holds a worker thread, so at most
+CHAT_MAX_WAITERS wait per process. Past that the request returns at once
+and the page polls again after `retry_ms`.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from flask import current_app
+
+from ..extensions import db
+from ..models import Message
+
+_KEYS_KEPT = 10_000  # newest-id entries remembered (most recently active conversations)
+_POLL_BATCH = 1000
+
+
+class ChatHub:
+    def __init__(self, app, poll_sec: float = 1.0, max_waiters: int = 4):
+        self.app = app
+        self.poll_sec = poll_sec
+        self.max_waiters = max(0, max_waiters)
+        self._cond = threading.Condition()
+        self._latest: "OrderedDict[str, int]" = OrderedDict()  # conversation_key -> newest id seen
+        # Highest message id the poller has read. Read now, not in the thread:
+        # a message committed after a request's own check must be above it.
+        with app.app_context():
+            self._hwm: int = db.session.query(db.func.max(Message.id)).scalar() or 0
+        self._waiters = 0
+        self.wakeups = self.timeouts = self.rejected = self.polls = 0
+        self._thread = threading.Thread(target=self._poll_loop, name="chat-hub", daemon=True)
+        self._thread.start()
+
+    def _note(self, key: str, message_id: int) -> None:
+        # caller holds self._cond
+        if message_id > self._latest.get(key, 0):
+            self._latest[key] = message_id
+            self._latest.move_to_end(key)
+            while len(self._latest) > _KEYS_KEPT:
+                self._latest.popitem(last=False)
+
+    def publish(self, key: str, message_id: int) -> None:
+        with self._cond:
+            self._note(key, message_id)
+            self._cond.notify_all()
+
+    def wait(self, key: str, after_id: int, timeout: float) -> Optional[bool]:
+        """Block until `key` has a message newer than `after_id`.
+
+        True if one arrived, False on timeout, None if too many requests are
+        already waiting in this process.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if self._waiters >= self.max_waiters:
+                self.rejected += 1
+                return None
+            self._waiters += 1
+            self._cond.notify_all()  # start the poller if it was idle
+            try:
+                while self._latest.get(key, 0) <= after_id:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        return False
+                    self._cond.wait(remaining)
+                self.wakeups += 1
+                return True
+            finally:
+                self._waiters -= 1
+
+    def _read_new(self) -> list:
+        m = Message.__table__
+        with self.app.app_context():
+            with db.engine.connect() as conn:
+                return conn.execute(
+                    db.select(m.c.id, m.c.conversation_key)
+                    .where(m.c.id > self._hwm)
+                    .order_by(m.c.id.asc())
+                    .limit(_POLL_BATCH)
+                ).all()
+
+    def _poll_loop(self) -> None:
+        while True:
+            with self._cond:
+                while self._waiters == 0:
+                    self._cond.wait()  # idle: no queries while nobody waits
+            try:
+                rows = self._read_new()
+            except Exception:
+                self.app.logger.exception("chat hub poll failed")
+                rows = []
+            with self._cond:
+                self.polls += 1
+                for message_id, key in rows:
+                    if key is not None:
+                        self._note(key, message_id)
+                    self._hwm = max(self._hwm, message_id)
+                if rows:
+                    self._cond.notify_all()
+            if len(rows) < _POLL_BATCH:
+                time.sleep(self.poll_sec)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "waiting": self._waiters, "max_waiters": self.max_waiters, "wakeups": self.wakeups,
+                "timeouts": self.timeouts, "rejected": self.rejected, "polls": self.polls,
+            }
+
+
+_hub: Optional[ChatHub] = None
+_hub_pid: Optional[int] = None
+_hub_lock = threading.Lock()
+
+
+def get_hub() -> ChatHub:
+    """This process's chat hub, started on first use (or after a fork)."""
+    global _hub, _hub_pid
+    with _hub_lock:
+        if _hub is None or _hub_pid != os.getpid():
+            cfg = current_app.config
+            _hub = ChatHub(
+                current_app._get_current_object(),
+                poll_sec=cfg.get("CHAT_POLL_SEC", 1.0),
+                max_waiters=cfg.get("CHAT_MAX_WAITERS", 4),
+            )
+            _hub_pid = os.getpid()
+        return _hub
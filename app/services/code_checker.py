@@ -1,66 +1,200 @@
+"""Code-structure rules checked before a submission is graded.
+
+An exercise's rules are compiled once into a `RuleSet`: a list of checks
+("require" or "forbid" a feature of the code, with the message shown to the
+student) and a dispatch table from AST node type to the detectors that
+report those features. Checking a submission is a single walk over its
+tree that only looks at node types some rule cares about and stops as soon
+as every required/forbidden feature has been seen.
+
+To add a rule, add a detector to _DETECTORS (if the feature is new) and a
+check to `exercise_checks`.
+
+Parsed ASTs are cached by code hash (`parse_code`), so the rule check and
+the grade cache's normalization share one parse per submission.
+"""
+
+from __future__ import annotations
 
 import ast
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+_AST_CACHE_ENTRIES = 256
+_ast_cache: "OrderedDict[bytes, ast.Module]" = OrderedDict()
+_ast_lock = threading.Lock()
+
+
+def parse_code(code: str) -> ast.Module:
+    """ast.parse with a per-process LRU keyed on the sha256 of `code`.
+
+    The tree is shared: callers must not modify it.
+    """
+    key = hashlib.sha256(code.encode("utf-8", "surrogatepass")).digest()
+    with _ast_lock:
+        tree = _ast_cache.get(key)
+        if tree is not None:
+            _ast_cache.move_to_end(key)
+            return tree
+    tree = ast.parse(code)  # SyntaxError / ValueError propagate, uncached
+    with _ast_lock:
+        _ast_cache[key] = tree
+        while len(_ast_cache) > _AST_CACHE_ENTRIES:
+            _ast_cache.popitem(last=False)
+    return tree
+
+
+# --- feature detectors --------------------------------------------------------
+# A feature is "kind" or "kind:param". Each detector kind maps to the node
+# types it inspects and a factory(param) -> handler(node) yielding features.
+
+def _if(node):
+    yield "if"
+    if node.orelse:
+        yield "elif" if isinstance(node.orelse[0], ast.If) else "else"
+
+
+def _call(node):
+    name = getattr(node.func, "id", "")
+    if name:
+        yield f"call:{name}"
+
+
+def _import(node):
+    if isinstance(node, ast.ImportFrom):
+        if node.module and not node.level:
+            yield f"import:{node.module.split('.')[0]}"
+        return
+    for alias in node.names:
+        yield f"import:{alias.name.split('.')[0]}"
+
+
+def _def_other(name):
+    def handler(node):
+        yield "def"
+        if node.name != name:
+            yield f"def_other:{name}"
+    return handler
+
+
+def _recursion(node):
+    for sub in ast.walk(node):
+        if isinstance(sub, ast.Call) and getattr(sub.func, "id", None) == node.name:
+            yield "recursion"
+            return
+
+
+_FUNCS = (ast.FunctionDef,)
+_COMPREHENSIONS = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+
+_DETECTORS = {
+    "if": ((ast.If,), lambda _: _if),
+    "else": ((ast.If,), lambda _: _if),
+    "elif": ((ast.If,), lambda _: _if),
+    "for": ((ast.For,), lambda _: lambda node: ("for",)),
+    "while": ((ast.While,), lambda _: lambda node: ("while",)),
+    "def": (_FUNCS, lambda _: lambda node: ("def",)),
+    "def_other": (_FUNCS, _def_other),
+    "call": ((ast.Call,), lambda _: _call),
+    "import": ((ast.Import, ast.ImportFrom), lambda _: _import),
+    "recursion": ((ast.FunctionDef, ast.AsyncFunctionDef), lambda _: _recursion),
+    "comprehension": (_COMPREHENSIONS, lambda _: lambda node: ("comprehension",)),
+}
+
+
+def exercise_checks(ex) -> tuple:
+    """(kind, feature, message) for every rule `ex` enables, in report order."""
+    checks = []
+
+    def add(on, kind, feature, message):
+        if on:
+            checks.append((kind, feature, message))
+
+    add(ex.require_if, "require", "if", "You must use if.")
+    add(ex.require_else, "require", "else", "You must use else.")
+    add(not ex.allow_elif, "forbid", "elif", "elif not allowed.")
+
+    add(ex.require_for, "require", "for", "for loop required.")
+    add(ex.require_while, "require", "while", "while loop required.")
+    add(ex.forbid_for, "forbid", "for", "for loop forbidden.")
+    add(ex.forbid_while, "forbid", "while", "while loop forbidden.")
+
+    add(ex.require_function, "require", "def", "Function required.")
+    if ex.function_name:
+        add(True, "require", "def", f"Function '{ex.function_name}' required.")
+        add(True, "forbid", f"def_other:{ex.function_name}", "Function name must be " + ex.function_name)
+
+    add(ex.require_print, "require", "call:print", "print() required.")
+    add(ex.forbid_print, "forbid", "call:print", "print() forbidden.")
+    add(ex.require_input, "require", "call:input", "input() required.")
+
+    for module in parse_module_list(ex.forbidden_imports):
+        add(True, "forbid", f"import:{module}", f"import {module} not allowed.")
+    add(ex.require_recursion, "require", "recursion", "Recursive function required.")
+    add(ex.forbid_recursion, "forbid", "recursion", "Recursion forbidden.")
+    add(ex.forbid_comprehensions, "forbid", "comprehension", "Comprehensions forbidden.")
+    return tuple(checks)
+
+
+def parse_module_list(text) -> list:
+    """'os, sys  subprocess' -> ['os', 'sys', 'subprocess'] (top-level names)."""
+    return [m.split(".")[0] for m in (text or "").replace(",", " ").split() if m]
+
+
+class RuleSet:
+    """Compiled rules of one exercise; `check(tree)` returns the error messages."""
+
+    def __init__(self, checks: tuple):
+        self.checks = checks
+        self.needed = frozenset(feature for _, feature, _ in checks)
+        handlers: dict = {}
+        for feature in self.needed:
+            kind, _, param = feature.partition(":")
+            node_types, factory = _DETECTORS[kind]
+            handler = factory(param)
+            for t in node_types:
+                if handler not in handlers.setdefault(t, []):
+                    handlers[t].append(handler)
+        self.handlers = {t: tuple(hs) for t, hs in handlers.items()}
+
+    def features(self, tree) -> set:
+        """The needed features present in `tree`; stops once all are found."""
+        needed, handlers = self.needed, self.handlers
+        found = set()
+        if not needed:
+            return found
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            hs = handlers.get(type(node))
+            if hs:
+                for handler in hs:
+                    for feature in handler(node):
+                        if feature in needed:
+                            found.add(feature)
+                if len(found) == len(needed):
+                    break  # every rule is decided
+            stack.extend(ast.iter_child_nodes(node))
+        return found
+
+    def check(self, tree) -> list:
+        found = self.features(tree)
+        return [msg for kind, feature, msg in self.checks if (feature in found) == (kind == "forbid")]
+
+
+@lru_cache(maxsize=512)
+def _compile(checks: tuple) -> RuleSet:
+    return RuleSet(checks)
+
+
+def compile_rules(ex) -> RuleSet:
+    """The exercise's RuleSet, compiled once per distinct set of rules."""
+    return _compile(exercise_checks(ex))
+
 
 def check_code(code, exercise):
-    tree = ast.parse(code)
-
-    flags = {
-        "if": False, "else": False, "elif": False,
-        "for": False, "while": False,
-        "func": False, "print": False, "input": False
-    }
-
-    for node in ast.walk(tree):
-        if isinstance(node, ast.If):
-            flags["if"] = True
-            if node.orelse:
-                if isinstance(node.orelse[0], ast.If):
-                    flags["elif"] = True
-                else:
-                    flags["else"] = True
-        if isinstance(node, ast.For):
-            flags["for"] = True
-        if isinstance(node, ast.While):
-            flags["while"] = True
-        if isinstance(node, ast.FunctionDef):
-            flags["func"] = True
-            if exercise.function_name and node.name != exercise.function_name:
-                return ["Function name must be " + exercise.function_name]
-        if isinstance(node, ast.Call):
-            if getattr(node.func, "id", "") == "print":
-                flags["print"] = True
-            if getattr(node.func, "id", "") == "input":
-                flags["input"] = True
-
-    errors = []
-
-    if exercise.require_if and not flags["if"]:
-        errors.append("You must use if.")
-    if exercise.require_else and not flags["else"]:
-        errors.append("You must use else.")
-    if not exercise.allow_elif and flags["elif"]:
-        errors.append("elif not allowed.")
-
-    if exercise.require_for and not flags["for"]:
-        errors.append("for loop required.")
-    if exercise.require_while and not flags["while"]:
-        errors.append("while loop required.")
-    if exercise.forbid_for and flags["for"]:
-        errors.append("for loop forbidden.")
-    if exercise.forbid_while and flags["while"]:
-        errors.append("while loop forbidden.")
-
-    if exercise.require_function and not flags["func"]:
-        errors.append("Function required.")
-    if exercise.function_name and not flags["func"]:
-        errors.append(f"Function '{exercise.function_name}' required.")
-
-    if exercise.require_print and not flags["print"]:
-        errors.append("print() required.")
-    if exercise.forbid_print and flags["print"]:
-        errors.append("print() forbidden.")
-
-    if exercise.require_input and not flags["input"]:
-        errors.append("input() required.")
-
-    return errors
+    # Parse even without rules: a syntax error is reported here, before grading.
+    tree = parse_code(code)
+    return compile_rules(exercise).check(tree)
@@ -0,0 +1,166 @@
+"""Chat history between two users, one page at a time.
+
+Pages are keyset-paginated on Message.id inside the conversation's
+`conversation_key`, served by the (conversation_key, id) index: a page
+costs one index seek plus `limit` rows however long the thread is.
+`history_page` walks back from the newest message; `messages_after`
+returns what arrived since the last message a page shows.
+
+The inbox reads ConversationSummary only: one row per participant holding
+the last message and that participant's unread count. `record_message`
+updates both rows in the transaction that saves a message and
+`mark_read` clears the reader's count together with Message.seen, so the
+summaries never disagree with the messages.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from ..extensions import db
+from ..models import ConversationSummary, Message, User, conversation_key
+
+_PREVIEW_CHARS = 200
+
+
+def history_page(user_id: int, other_id: int, before_id: Optional[int] = None, limit: int = 50):
+    """Up to `limit` messages older than `before_id` (the newest when None),
+    oldest first, and the cursor for the page before them (None at the
+    start of the conversation)."""
+    q = Message.query.filter(Message.conversation_key == conversation_key(user_id, other_id))
+    if before_id is not None:
+        q = q.filter(Message.id < before_id)
+    rows = q.order_by(Message.id.desc()).limit(limit + 1).all()
+    older = rows[limit - 1].id if len(rows) > limit else None
+    page = rows[:limit]
+    page.reverse()
+    return page, older
+
+
+def messages_after(user_id: int, other_id: int, after_id: int, limit: int = 50) -> list:
+    """Up to `limit` messages newer than `after_id`, oldest first."""
+    return (
+        Message.query
+        .filter(Message.conversation_key == conversation_key(user_id, other_id), Message.id > after_id)
+        .order_by(Message.id.asc())
+        .limit(limit)
+        .all()
+    )
+
+
+def message_json(m: Message, me_id: int, names: dict) -> dict:
+    return {
+        "id": m.id,
+        "mine": m.sender_id == me_id,
+        "sender": names.get(m.sender_id, ""),
+        "text": m.text,
+        "created_at": m.created_at.isoformat(sep=" ") if m.created_at else "",
+    }
+
+
+def record_message(m: Message) -> None:
+    """Update both participants' summaries for the new message `m`.
+
+    Call before the commit that saves `m`. SQLite runs one write transaction
+    at a time, so the message insert already holds the write lock here
+    and the update-or-insert below cannot race another sender.
+    """
+    db.session.flush()  # id and created_at
+    values = {
+        "conversation_key": m.conversation_key,
+        "last_message_id": m.id,
+        "last_sender_id": m.sender_id,
+        "last_text": m.text[:_PREVIEW_CHARS],
+        "last_at": m.created_at,
+    }
+    rows = {(m.sender_id, m.receiver_id): 0}
+    rows.setdefault((m.receiver_id, m.sender_id), 1)  # the receiver has one more unread
+    for (user_id, other_id), unread in rows.items():
+        moved = db.session.execute(
+            db.update(ConversationSummary)
+            .where(ConversationSummary.user_id == user_id, ConversationSummary.other_id == other_id)
+            .values(unread=ConversationSummary.unread + unread, **values)
+        ).rowcount
+        if not moved:
+            db.session.add(ConversationSummary(user_id=user_id, other_id=other_id, unread=unread, **values))
+
+
+def mark_read(user_id: int, other_id: int) -> int:
+    """Mark the conversation read for `user_id`; returns how many were unread.
+
+    Reads first so viewing a read conversation does not take the write lock.
+    """
+    unread = (
+        db.session.query(ConversationSummary.unread)
+        .filter(ConversationSummary.user_id == user_id, ConversationSummary.other_id == other_id)
+        .scalar()
+    )
+    if not unread:
+        return 0
+    db.session.execute(
+        db.update(ConversationSummary)
+        .where(ConversationSummary.user_id == user_id, ConversationSummary.other_id == other_id)
+        .values(unread=0)
+    )
+    db.session.execute(
+        db.update(Message)
+        .where(
+            Message.conversation_key == conversation_key(user_id, other_id),
+            Message.receiver_id == user_id,
+            Message.seen.is_(False),
+        )
+        .values(seen=True)
+    )
+    db.session.commit()
+    return unread
+
+
+def inbox_page(user_id: int, before_id: Optional[int] = None, limit: int = 30):
+    """The user's conversations, most recent first, as (summary, other
+    username) pairs, and the cursor for the next page (None at the end).
+    One range scan of ix_conversation_summary_inbox."""
+    q = (
+        db.session.query(ConversationSummary, User.username)
+        .join(User, User.id == ConversationSummary.other_id)
+        .filter(ConversationSummary.user_id == user_id)
+    )
+    if before_id is not None:
+        q = q.filter(ConversationSummary.last_message_id < before_id)
+    rows = q.order_by(ConversationSummary.last_message_id.desc()).limit(limit + 1).all()
+    more = rows[limit - 1][0].last_message_id if len(rows) > limit else None
+    return rows[:limit], more
+
+
+def inbox_json(summary: ConversationSummary, username: str) -> dict:
+    return {
+        "other_id": summary.other_id,
+        "other": username,
+        "last_message_id": summary.last_message_id,
+        "last_text": summary.last_text,
+        "last_mine": summary.last_sender_id == summary.user_id,
+        "last_at": summary.last_at.isoformat(sep=" "),
+        "unread": summary.unread,
+    }
+
+
+def build_conversation_summaries() -> int:
+    """Create the summaries for messages sent before the table existed.
+
+    Runs at startup and does nothing once any summary exists. Unread counts
+    start at 0: Message.seen was never maintained before, so it cannot
+    tell which old messages were read. Returns the number of rows created.
+    """
+    if db.session.query(ConversationSummary.id).first() is not None:
+        return 0
+    last_ids = db.select(db.func.max(Message.id)).group_by(Message.conversation_key)
+    created = 0
+    for m in Message.query.filter(Message.id.in_(last_ids)).all():
+        for user_id, other_id in {(m.sender_id, m.receiver_id), (m.receiver_id, m.sender_id)}:
+            db.session.add(ConversationSummary(
+                user_id=user_id, other_id=other_id, conversation_key=m.conversation_key,
+                last_message_id=m.id, last_sender_id=m.sender_id, last_text=m.text[:_PREVIEW_CHARS],
+                last_at=m.created_at, unread=0,
+            ))
+            created += 1
+    db.session.commit()
+    return created
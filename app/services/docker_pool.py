@@ -0,0 +1,278 @@
+"""Pool of long-lived runner containers for the Docker grader.
+
+`docker run --rm` per submission pays container creation and teardown every
+time. Instead we start `size` network-less, resource-capped containers that
+just `sleep`, each with its own host directory mounted at /work. A job
+writes its files into that directory and runs the tests with `docker exec`.
+Everything else is read-only: the root filesystem, and the lite runner,
+which is mounted from outside /work so a submission cannot rewrite it.
+
+After every job the directory and /tmp are emptied and stray processes are
+killed; if any of that fails, or after `max_jobs` jobs, a timeout, or a
+failed health check (`docker inspect`), the container is replaced.
+
+The docker executable is configurable (DOCKER_BIN) so the pool can be
+exercised against a stand-in such as benchmarks/fake_docker.py.
+"""
+
+from __future__ import annotations
+
+import atexit
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from typing import Optional
+
+from .sandbox import run_limited
+
+# Where `runner_script` is mounted (read-only) inside every container.
+RUNNER_MOUNT = "/opt/grader/lite_runner.py"
+
+# `docker exec` exit codes that mean the container (not the tests) failed.
+_DOCKER_ERRORS = {125, 126, 127}
+
+
+class _Container:
+    def __init__(self, name: str, workdir: str):
+        self.name = name
+        self.workdir = workdir
+        self.jobs = 0
+        self.checked_at = time.monotonic()
+
+
+class ContainerPool:
+    def __init__(
+        self,
+        image: str,
+        size: int = 2,
+        max_jobs: int = 100,
+        root_dir: str = "instance/docker-work",
+        docker_bin: str = "docker",
+        runner_script: Optional[str] = None,
+        cpus: str = "1",
+        memory: str = "256m",
+        health_interval: float = 30.0,
+        max_output: Optional[int] = None,
+        keep_output: Optional[int] = None,
+    ):
+        self.image = image
+        self.size = max(1, size)
+        self.max_jobs = max(1, max_jobs)
+        self.root_dir = os.path.abspath(root_dir)
+        self.docker_bin = docker_bin
+        self.runner_script = os.path.abspath(runner_script) if runner_script else None
+        self.cpus = cpus
+        self.memory = memory
+        self.health_interval = health_interval
+        self.max_output = max_output
+        self.keep_output = keep_output
+        self._idle: "queue.Queue[_Container]" = queue.Queue()
+        self._all: list[_Container] = []
+        self._lock = threading.Lock()
+        self.replaced = 0
+
+        os.makedirs(self.root_dir, exist_ok=True)
+        for _ in range(self.size):
+            self._idle.put(self._start())
+
+    # --- container lifecycle -------------------------------------------------
+
+    def _docker(self, *args: str, timeout: float = 30) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            [self.docker_bin, *args], capture_output=True, text=True, timeout=timeout
+        )
+
+    def _start(self) -> _Container:
+        name = f"edu-grader-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        workdir = os.path.join(self.root_dir, name)
+        os.makedirs(workdir, exist_ok=True)
+        cmd = [
+            "run", "-d", "--name", name,
+            "--network=none",
+            "--read-only", "--tmpfs", "/tmp:size=16m",
+            f"--cpus={self.cpus}", f"--memory={self.memory}",
+            "--pids-limit=64",
+            "-e", "PYTHONDONTWRITEBYTECODE=1",
+            "-v", f"{workdir}:/work",
+            "-w", "/work",
+        ]
+        if self.runner_script:
+            cmd += ["-v", f"{self.runner_script}:{RUNNER_MOUNT}:ro"]
+        if hasattr(os, "getuid"):
+            # Files the tests create must stay deletable by the web process.
+            cmd += ["--user", f"{os.getuid()}:{os.getgid()}"]
+        cmd += [self.image, "sleep", "infinity"]
+
+        p = self._docker(*cmd)
+        if p.returncode != 0:
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise RuntimeError(f"could not start runner container: {p.stderr.strip()}")
+        c = _Container(name, workdir)
+        with self._lock:
+            self._all.append(c)
+        return c
+
+    def _remove(self, c: _Container) -> None:
+        with self._lock:
+            if c in self._all:
+                self._all.remove(c)
+        try:
+            self._docker("rm", "-f", c.name)
+        except Exception:
+            pass
+        shutil.rmtree(c.workdir, ignore_errors=True)
+
+    def _replace(self, c: _Container) -> None:
+        self._remove(c)
+        self.replaced += 1
+        try:
+            self._idle.put(self._start())
+        except Exception:
+            # Keep the pool usable; a later checkout will try to grow it back.
+            pass
+
+    def _healthy(self, c: _Container) -> bool:
+        try:
+            p = self._docker("inspect", "-f", "{{.State.Running}}", c.name, timeout=10)
+        except Exception:
+            return False
+        c.checked_at = time.monotonic()
+        return p.returncode == 0 and p.stdout.strip() == "true"
+
+    def _reset(self, c: _Container) -> bool:
+        """Empty the work dir and kill leftovers. Returns False if it failed.
+
+        Anything the job leaves behind (e.g. an unreadable `solution/`
+        package) would be imported by the next job, so a partial cleanup
+        means the container must be replaced rather than reused.
+        """
+        try:
+            for entry in os.listdir(c.workdir):
+                path = os.path.join(c.workdir, entry)
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            if os.listdir(c.workdir):
+                return False
+        except OSError:
+            return False
+        try:
+            # Kill everything except PID 1 (`sleep`) left behind by the job,
+            # then clear the tmpfs.
+            p = self._docker(
+                "exec", c.name, "sh", "-c",
+                "kill -9 -1 2>/dev/null; rm -rf /tmp/* /tmp/.[!.]* /tmp/..?*",
+                timeout=10,
+            )
+        except Exception:
+            return False
+        return p.returncode == 0
+
+    def _checkout(self, timeout: float) -> _Container:
+        with self._lock:
+            missing = self.size - len(self._all)
+        for _ in range(max(0, missing)):
+            try:
+                self._idle.put(self._start())
+            except Exception:
+                break
+
+        try:
+            c = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError("no runner container available")
+        if time.monotonic() - c.checked_at > self.health_interval and not self._healthy(c):
+            self._replace(c)
+            c = self._idle.get(timeout=timeout)
+        return c
+
+    # --- public API ----------------------------------------------------------
+
+    def run(self, files: dict, test_cmd: list, timeout: float) -> dict:
+        """Copy `files` ({name: str|bytes}) into a container and run `test_cmd`.
+
+        Returns {"returncode", "timeout", "truncated", "output"}; output past
+        `max_output` bytes stops the exec (the reset then kills the tests).
+        """
+        c = self._checkout(timeout + 10)
+        c.jobs += 1
+        keep = False
+        try:
+            for name, content in files.items():
+                path = os.path.join(c.workdir, name)
+                data = content.encode("utf-8") if isinstance(content, str) else content
+                with open(path, "wb") as f:
+                    f.write(data)
+
+            try:
+                p = run_limited(
+                    [self.docker_bin, "exec", "-w", "/work", c.name, *test_cmd], cwd=None, timeout=timeout,
+                    max_output=self.max_output, keep_output=self.keep_output,
+                )
+            except subprocess.TimeoutExpired:
+                return {"returncode": -1, "timeout": True, "truncated": False, "output": "TIMEOUT"}
+
+            if p["returncode"] in _DOCKER_ERRORS and not self._healthy(c):
+                raise RuntimeError(f"runner container failed: {p['stderr'].strip()}")
+
+            keep = c.jobs < self.max_jobs and self._reset(c)
+            return {
+                "returncode": p["returncode"],
+                "timeout": False,
+                "truncated": p["truncated"],
+                "output": p["stdout"] + "\n" + p["stderr"],
+            }
+        finally:
+            if keep:
+                self._idle.put(c)
+            else:
+                self._replace(c)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = len(self._all)
+        return {"containers": total, "idle": self._idle.qsize(), "replaced": self.replaced}
+
+    def shutdown(self) -> None:
+        with self._lock:
+            containers = list(self._all)
+        for c in containers:
+            self._remove(c)
+
+
+_pool: Optional[ContainerPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_container_pool(cfg, runner_script: Optional[str] = None) -> ContainerPool:
+    """Return this process's container pool, starting it on first use.
+
+    `runner_script` is mounted read-only at RUNNER_MOUNT in every container.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ContainerPool(
+                image=cfg.get("DOCKER_IMAGE", "edu_runner:latest"),
+                size=cfg.get("DOCKER_POOL_SIZE", 2),
+                max_jobs=cfg.get("DOCKER_POOL_MAX_JOBS", 100),
+                root_dir=cfg.get("DOCKER_POOL_DIR", "instance/docker-work"),
+                docker_bin=cfg.get("DOCKER_BIN", "docker"),
+                runner_script=runner_script,
+                max_output=cfg.get("GRADER_OUTPUT_MAX_BYTES"),
+                keep_output=cfg.get("GRADER_OUTPUT_KEEP_BYTES"),
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+@atexit.register
+def _shutdown_pool() -> None:
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.shutdown()
@@ -1,35 +1,32 @@
 import smtplib
+import time
 from email.message import EmailMessage
 from typing import Optional
 
 from flask import current_app
 
 
-def send_email(
-    to_email: str,
-    subject: str,
-    body: str,
-    html: Optional[str] = None,
-) -> Optional[str]:
-    """Send an email using SMTP.
-
-    - Always sends a plain-text body (for compatibility).
-    - If `html` is provided, also attaches an HTML alternative.
-
-    Returns:
-        None on success, otherwise an error string.
-    """
-    cfg = current_app.config
-    host = cfg.get("SMTP_HOST")
-    port = int(cfg.get("SMTP_PORT", 587))
+def smtp_settings(cfg) -> dict:
+    """SMTP connection settings from the app config."""
     user = cfg.get("SMTP_USER")
-    pw = cfg.get("SMTP_PASS")
-    from_email = cfg.get("SMTP_FROM") or user
-    use_tls = bool(cfg.get("SMTP_USE_TLS", True))
+    return {
+        "host": cfg.get("SMTP_HOST"),
+        "port": int(cfg.get("SMTP_PORT", 587)),
+        "user": user,
+        "password": cfg.get("SMTP_PASS"),
+        "from_email": cfg.get("SMTP_FROM") or user,
+        "use_tls": bool(cfg.get("SMTP_USE_TLS", True)),
+        "timeout": float(cfg.get("SMTP_TIMEOUT_SEC", 10)),
+    }
+
 
-    if not host or not from_email:
+def smtp_config_error(settings: dict) -> Optional[str]:
+    if not settings["host"] or not settings["from_email"]:
         return "SMTP is not configured (SMTP_HOST/SMTP_FROM)."
+    return None
 
+
+def build_message(from_email: str, to_email: str, subject: str, body: str, html: Optional[str] = None) -> EmailMessage:
     msg = EmailMessage()
     msg["From"] = from_email
     msg["To"] = to_email
@@ -41,16 +38,110 @@ def send_email(
     # Optional HTML alternative
     if html:
         msg.add_alternative(html, subtype="html")
+    return msg
 
-    try:
-        with smtplib.SMTP(host, port, timeout=10) as server:
+
+class SmtpConnection:
+    """One SMTP session (EHLO, STARTTLS, login) reused for many messages.
+
+    Connects on first send. A session idle for more than `check_after`
+    seconds is probed with NOOP before reuse, and a send that fails because
+    the server dropped a reused session is retried once on a fresh one.
+    """
+
+    def __init__(self, settings: dict, check_after: float = 5.0):
+        self.settings = settings
+        self.check_after = check_after
+        self.opened = 0  # connections made
+        self.sent = 0
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    @property
+    def connected(self) -> bool:
+        return self._server is not None
+
+    def idle_for(self) -> float:
+        return time.monotonic() - self._last_used if self._server is not None else 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        s = self.settings
+        server = smtplib.SMTP(s["host"], s["port"], timeout=s["timeout"])
+        try:
             server.ehlo()
-            if use_tls:
+            if s["use_tls"]:
                 server.starttls()
                 server.ehlo()
-            if user and pw:
-                server.login(user, pw)
-            server.send_message(msg)
+            if s["user"] and s["password"]:
+                server.login(s["user"], s["password"])
+        except Exception:
+            server.close()
+            raise
+        self.opened += 1
+        return server
+
+    def _alive(self) -> bool:
+        try:
+            return self._server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, msg: EmailMessage) -> None:
+        """Send one message; SMTP errors propagate (see outbox.py for retries)."""
+        reused = self._server is not None
+        if reused and self.idle_for() > self.check_after and not self._alive():
+            self.close()
+            reused = False
+        if self._server is None:
+            self._server = self._connect()
+        try:
+            self._server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            if not reused:
+                raise
+            self._server = self._connect()
+            self._server.send_message(msg)
+        self._last_used = time.monotonic()
+        self.sent += 1
+
+    def close(self) -> None:
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+
+def send_email(
+    to_email: str,
+    subject: str,
+    body: str,
+    html: Optional[str] = None,
+) -> Optional[str]:
+    """Send an email using SMTP, right now, on a connection of its own.
+
+    - Always sends a plain-text body (for compatibility).
+    - If `html` is provided, also attaches an HTML alternative.
+
+    Requests should use `outbox.queue_email` instead, which returns at once
+    and retries; this is for scripts and one-off checks of the settings.
+
+    Returns:
+        None on success, otherwise an error string.
+    """
+    settings = smtp_settings(current_app.config)
+    err = smtp_config_error(settings)
+    if err:
+        return err
+
+    conn = SmtpConnection(settings)
+    try:
+        conn.send(build_message(settings["from_email"], to_email, subject, body, html))
         return None
     except Exception as e:
         return f"Failed to send email: {e}"
+    finally:
+        conn.close()
@@ -1,73 +1,258 @@
+"""Exercise gating: a student may open the exercise after the last one passed.
+
+Progress stores the highest exercise passed together with its ordinal
+(1-based position in the sequence), so gating compares two integers.
+Ordinals are rewritten when the sequence changes (sync_progress_ordinals).
+
+The learning sequence (lesson.order -> exercise.order -> exercise.id) is
+kept per process as an index exercise_id -> position. It is rebuilt only
+when the sequence stamp changes: a file (SEQUENCE_STAMP_FILE) replaced
+after every commit that adds, deletes, reorders or moves a Lesson or
+Exercise, so all gunicorn workers on the host see the change with one
+stat() and gating checks need no query.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import uuid
+from typing import Optional
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
 from ..models import Progress, Exercise, Lesson
 from ..extensions import db
 
+# Columns whose change reorders the sequence.
+_SEQUENCE_COLUMNS = {Lesson: ("order",), Exercise: ("order", "lesson_id")}
 
-def _ordered_exercise_ids() -> list[int]:
-    """Return exercise IDs in the learning sequence.
 
-    Order: lesson.order -> exercise.order -> exercise.id (stable tie-breaker)
-    """
-    rows = (
-        Exercise.query
+class SequenceIndex:
+    def __init__(self, rows: list[tuple[int, int]]):
+        # rows: (exercise_id, lesson_id) in sequence order
+        self.ordered = [tuple(r) for r in rows]
+        self.positions = {ex_id: i for i, (ex_id, _) in enumerate(self.ordered)}
+        self.total = len(self.ordered)
+
+    def position(self, exercise_id: Optional[int]) -> int:
+        """0-based position in the sequence, or -1 if not in it."""
+        return self.positions.get(exercise_id, -1) if exercise_id else -1
+
+
+_index: Optional[SequenceIndex] = None
+_index_stamp = None
+_index_lock = threading.Lock()
+
+
+def _stamp_path() -> str:
+    return current_app.config.get("SEQUENCE_STAMP_FILE", "instance/exercise-sequence.stamp")
+
+
+def _read_stamp():
+    try:
+        st = os.stat(_stamp_path())
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns)
+
+
+def bump_sequence_stamp() -> None:
+    """Invalidate every process's sequence index."""
+    path = _stamp_path()
+    tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex}"
+    try:
+        with open(tmp, "w") as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp, path)  # new inode: a changed stamp even within one mtime tick
+    except OSError:
+        current_app.logger.exception("could not update the exercise sequence stamp %s", path)
+
+
+def _sequence_query():
+    # Order: lesson.order -> exercise.order -> exercise.id (stable tie-breaker)
+    return (
+        db.select(Exercise.id, Exercise.lesson_id)
         .join(Lesson, Exercise.lesson_id == Lesson.id)
         .order_by(Lesson.order.asc(), Exercise.order.asc(), Exercise.id.asc())
-        .with_entities(Exercise.id)
-        .all()
     )
-    return [r[0] for r in rows]
 
 
-def _index_of(exercise_ids: list[int], exercise_id: int) -> int:
-    try:
-        return exercise_ids.index(exercise_id)
-    except ValueError:
-        return -1
-
-def get_progress(student_id: int) -> Progress:
-    p = Progress.query.filter_by(student_id=student_id).first()
-    if not p:
-        p = Progress(student_id=student_id, highest_exercise_id=0)
-        db.session.add(p)
-        db.session.commit()
-    return p
+def _ordered_exercises() -> list:
+    """(exercise_id, lesson_id) rows in the learning sequence."""
+    return db.session.execute(_sequence_query()).all()
 
-def can_open_exercise(student_id: int, exercise_id: int) -> bool:
-    p = get_progress(student_id)
 
-    ordered = _ordered_exercise_ids()
-    if not ordered:
-        return False
+def sequence_index() -> SequenceIndex:
+    global _index, _index_stamp
+    # Read the stamp before querying: a change committed during the rebuild
+    # leaves a newer stamp behind and triggers another rebuild.
+    stamp = _read_stamp()
+    if stamp is None:
+        bump_sequence_stamp()  # first use on this host
+        stamp = _read_stamp()
+    with _index_lock:
+        if _index is None or stamp is None or stamp != _index_stamp:
+            _index = SequenceIndex(_ordered_exercises())
+            _index_stamp = stamp
+        return _index
 
-    target_idx = _index_of(ordered, exercise_id)
-    if target_idx == -1:
-        return False
 
-    passed_idx = _index_of(ordered, p.highest_exercise_id) if p.highest_exercise_id else -1
-    return target_idx <= (passed_idx + 1)
+@event.listens_for(Session, "after_flush")
+def _note_sequence_change(session, _flush_context):
+    if session.info.get("sequence_changed"):
+        return
+    for obj in session.new | session.deleted:
+        if isinstance(obj, (Lesson, Exercise)):
+            session.info["sequence_changed"] = True
+            return
+    for obj in session.dirty:
+        cols = _SEQUENCE_COLUMNS.get(type(obj))
+        if cols and any(db.inspect(obj).attrs[c].history.has_changes() for c in cols):
+            session.info["sequence_changed"] = True
+            return
 
-def mark_passed(student_id: int, exercise_id: int) -> None:
-    p = get_progress(student_id)
 
-    ordered = _ordered_exercise_ids()
-    if not ordered:
-        return
+@event.listens_for(Session, "after_commit")
+def _publish_sequence_change(session):
+    if session.info.pop("sequence_changed", False):
+        bump_sequence_stamp()
+        try:
+            sync_progress_ordinals()
+        except Exception:
+            # The change itself is committed; the next startup resyncs.
+            current_app.logger.exception("could not resync progress ordinals")
 
-    new_idx = _index_of(ordered, exercise_id)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_sequence_change(session, _previous_transaction):
+    session.info.pop("sequence_changed", None)
+
+
+def sync_progress_ordinals() -> int:
+    """Recompute Progress.highest_ordinal from the current sequence.
+
+    Runs at startup and after a commit that changed the sequence; only rows
+    whose ordinal differs are written. Returns how many.
+    """
+    t = Progress.__table__
+    # Own connection: this also runs in after_commit, where the session
+    # cannot be used.
+    with db.engine.begin() as conn:
+        seq = SequenceIndex(conn.execute(_sequence_query()).all())
+        rows = conn.execute(db.select(t.c.id, t.c.highest_exercise_id, t.c.highest_ordinal)).all()
+        changes = [
+            {"b_id": r.id, "ordinal": seq.position(r.highest_exercise_id) + 1}
+            for r in rows
+            if r.highest_ordinal != seq.position(r.highest_exercise_id) + 1
+        ]
+        if changes:
+            conn.execute(
+                db.update(t).where(t.c.id == db.bindparam("b_id")).values(highest_ordinal=db.bindparam("ordinal")),
+                changes,
+            )
+    return len(changes)
+
+
+def _passed_count(seq: SequenceIndex, highest_exercise_id, highest_ordinal) -> int:
+    # Rows from before the ordinal column have no ordinal until the next sync.
+    if highest_ordinal is None:
+        return seq.position(highest_exercise_id) + 1
+    return highest_ordinal
+
+
+def passed_ordinal(student_id: int) -> int:
+    """How far the student got: the 1-based ordinal of the highest exercise
+    passed, 0 for none. Read-only (no Progress row is created)."""
+    row = (
+        db.session.query(Progress.highest_exercise_id, Progress.highest_ordinal)
+        .filter(Progress.student_id == student_id)
+        .first()
+    )
+    return _passed_count(sequence_index(), *row) if row else 0
+
+def can_open_exercise(student_id: int, exercise_id: int) -> bool:
+    target_idx = sequence_index().position(exercise_id)
+    if target_idx == -1:
+        return False
+    return target_idx <= passed_ordinal(student_id)
+
+def mark_passed(student_id: int, exercise_id: int) -> None:
+    new_idx = sequence_index().position(exercise_id)
     if new_idx == -1:
         return
 
-    cur_idx = _index_of(ordered, p.highest_exercise_id) if p.highest_exercise_id else -1
-    if new_idx > cur_idx:
-        p.highest_exercise_id = exercise_id
-        db.session.commit()
+    # Compare-and-set, so concurrent approvals cannot move progress backwards.
+    ordinal = new_idx + 1
+    values = {"highest_exercise_id": exercise_id, "highest_ordinal": ordinal}
+    moved = db.session.execute(
+        db.update(Progress)
+        .where(Progress.student_id == student_id)
+        .where(db.or_(Progress.highest_ordinal.is_(None), Progress.highest_ordinal < ordinal))
+        .values(**values)
+    ).rowcount
+    if not moved and not db.session.query(Progress.id).filter_by(student_id=student_id).first():
+        db.session.add(Progress(student_id=student_id, **values))
+    db.session.commit()
 
 
 def progress_stats(student_id: int) -> tuple[int, int]:
     """(passed_count, total_count) in the ordered sequence."""
-    p = get_progress(student_id)
-    ordered = _ordered_exercise_ids()
-    total = len(ordered)
+    total = sequence_index().total
     if total == 0:
         return (0, 0)
-    passed_idx = _index_of(ordered, p.highest_exercise_id) if p.highest_exercise_id else -1
-    return (max(passed_idx + 1, 0), total)
+    return (min(passed_ordinal(student_id), total), total)
+
+
+def progress_for_students(student_ids) -> dict[int, tuple[int, int]]:
+    """{student_id: (passed_count, total_count)} for many students in one query."""
+    seq = sequence_index()
+    out = {sid: (0, seq.total) for sid in student_ids}
+    if not out or seq.total == 0:
+        return out
+    rows = (
+        db.session.query(Progress.student_id, Progress.highest_exercise_id, Progress.highest_ordinal)
+        .filter(Progress.student_id.in_(list(out)))
+        .all()
+    )
+    for sid, highest_id, ordinal in rows:
+        out[sid] = (min(_passed_count(seq, highest_id, ordinal), seq.total), seq.total)
+    return out
+
+
+PASSED, OPEN, LOCKED = "passed", "open", "locked"
+
+
+def exercise_states(student_id: int) -> dict[int, str]:
+    """{exercise_id: PASSED | OPEN | LOCKED} for the whole sequence.
+
+    Same rule as can_open_exercise: everything up to the highest exercise
+    passed counts as passed, the next one is open, the rest are locked.
+    """
+    seq = sequence_index()
+    ordinal = passed_ordinal(student_id)
+    return {
+        ex_id: PASSED if i < ordinal else OPEN if i == ordinal else LOCKED
+        for i, (ex_id, _) in enumerate(seq.ordered)
+    }
+
+
+def lesson_states(student_id: int) -> dict[int, dict]:
+    """{lesson_id: {"passed", "total", "state"}}; state is PASSED when every
+    exercise is passed, OPEN when one can be opened, else LOCKED."""
+    seq = sequence_index()
+    ordinal = passed_ordinal(student_id)
+    out: dict[int, dict] = {}
+    for i, (_, lesson_id) in enumerate(seq.ordered):
+        st = out.setdefault(lesson_id, {"passed": 0, "total": 0, "state": LOCKED})
+        st["total"] += 1
+        if i < ordinal:
+            st["passed"] += 1
+        elif i == ordinal:
+            st["state"] = OPEN
+    for st in out.values():
+        if st["passed"] == st["total"]:
+            st["state"] = PASSED
+    return out
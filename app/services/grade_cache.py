@@ -0,0 +1,115 @@
+"""Content-addressed cache of grading results.
+
+Keyed on (engine + limits, tests_py, normalized solution). The solution is
+normalized to its AST dump, so comment, blank-line and formatting changes
+map to the same key. The tests hash is part of the key, so editing an
+exercise's tests_py makes old entries unreachable; they age out of the LRU.
+
+A FAILED report quotes solution.py line numbers and source lines, which
+differ between formatting variants, so it is only reused for the exact
+same source. PASSED reports carry no such details and are shared.
+
+Per-process LRU, bounded by entry count and by total output size.
+"""
+
+from __future__ import annotations
+
+import ast
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from .code_checker import parse_code
+
+# Only deterministic verdicts are cached; timeouts, CPU-limit overruns and
+# grader errors depend on machine load and must be retried.
+_CACHEABLE = {"PASSED", "FAILED"}
+_VOLATILE_OUTPUT = ("TIMEOUT", "TIME LIMIT EXCEEDED")
+
+
+def normalize_code(code_py: str) -> str:
+    try:
+        return ast.dump(parse_code(code_py))
+    except (SyntaxError, ValueError):
+        return "\n".join(line.rstrip() for line in code_py.strip().splitlines())
+
+
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def tests_hash(tests_py: str) -> str:
+    return _sha(tests_py)
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[tuple[str, str, str], tuple[str, dict]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(code_py: str, tests_py: str, engine: str = "pytest", limits: tuple = ()) -> tuple[str, str, str]:
+        variant = ":".join([engine, *(str(x) for x in limits)])
+        return (variant, tests_hash(tests_py), _sha(normalize_code(code_py)))
+
+    @staticmethod
+    def _size(result: dict) -> int:
+        return len(result.get("output") or "") + 64
+
+    def get(self, code_py: str, tests_py: str, engine: str = "pytest", limits: tuple = ()) -> Optional[dict]:
+        k = self.key(code_py, tests_py, engine, limits)
+        with self._lock:
+            entry = self._data.get(k)
+            if entry is None or (entry[1]["status"] != "PASSED" and entry[0] != _sha(code_py)):
+                self.misses += 1
+                return None
+            result = entry[1]
+            self._data.move_to_end(k)
+            self.hits += 1
+            return dict(result)
+
+    def put(self, code_py: str, tests_py: str, result: dict, engine: str = "pytest", limits: tuple = ()) -> None:
+        if result.get("status") not in _CACHEABLE or (result.get("output") or "").startswith(_VOLATILE_OUTPUT):
+            return
+        size = self._size(result)
+        if size > self.max_bytes:
+            return
+        k = self.key(code_py, tests_py, engine, limits)
+        with self._lock:
+            old = self._data.pop(k, None)
+            if old is not None:
+                self._bytes -= self._size(old[1])
+            self._data[k] = (_sha(code_py), dict(result))
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._bytes -= self._size(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache(max_entries: int, max_bytes: int) -> ResultCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(max_entries, max_bytes)
+        return _cache
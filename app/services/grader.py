@@ -1,36 +1,175 @@
-import os, sys, tempfile, subprocess, time
+import os, sys, shutil, subprocess, time
 from flask import current_app
+from .admission import execution_slot
+from .grade_cache import get_cache
+from .docker_pool import RUNNER_MOUNT, get_container_pool
+from .grader_pool import get_pool, pool_supported
+from .lite_engine import RUNNER_SCRIPT, compile_tests, lite_compatible
+from .lite_runner import TESTS_BYTECODE
+from .sandbox import cpu_limit_sec, run_limited
+from .workspace import tests_key, workspace
 
-def grade_python(code_py: str, tests_py: str):
+TIME_LIMIT_EXCEEDED = "TIME LIMIT EXCEEDED"
+MEMORY_LIMIT_EXCEEDED = "MEMORY LIMIT EXCEEDED"
+OUTPUT_LIMIT_EXCEEDED = "OUTPUT LIMIT EXCEEDED"
+
+def grade_python(code_py: str, tests_py: str, time_limit_ms: int = None, memory_limit_mb: int = None):
+    """Run `tests_py` against `code_py`.
+
+    `time_limit_ms` is the exercise's CPU budget for the tests; the child also
+    gets GRADER_CPU_OVERHEAD_MS for interpreter/pytest startup. The result has
+    "cpu_ms" / "peak_rss_kb" from the grading process when they can be measured.
+    """
+    cfg = current_app.config
+    engine = _engine_for(tests_py)
+    cpu_ms = time_limit_ms + cfg.get("GRADER_CPU_OVERHEAD_MS", 1000) if time_limit_ms else None
+    memory_mb = memory_limit_mb or cfg.get("GRADER_MEMORY_LIMIT_MB", 256)
+    limits = (cpu_ms, memory_mb)
+
+    cache = None
+    if cfg.get("GRADE_CACHE_ENTRIES", 0) > 0:
+        cache = get_cache(cfg["GRADE_CACHE_ENTRIES"], cfg.get("GRADE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+        hit = cache.get(code_py, tests_py, engine, limits)
+        if hit is not None:
+            hit["cached"] = True
+            return hit
+
+    with execution_slot():
+        result = _grade_uncached(code_py, tests_py, engine, cpu_ms, memory_mb)
+    _check_limits(result, time_limit_ms, cpu_ms, memory_mb)
+    if cache is not None:
+        cache.put(code_py, tests_py, result, engine, limits)
+    return result
+
+def _grade_uncached(code_py: str, tests_py: str, engine: str, cpu_ms=None, memory_mb=None):
     if current_app.config.get("USE_DOCKER_GRADER", False):
-        return _grade_with_docker(code_py, tests_py)
-    return _grade_local(code_py, tests_py)
+        if current_app.config.get("DOCKER_POOL_SIZE", 0) > 0:
+            return _grade_docker_pooled(code_py, tests_py, engine, cpu_ms, memory_mb)
+        return _grade_with_docker(code_py, tests_py, engine, cpu_ms, memory_mb)
+    if current_app.config.get("GRADER_POOL_SIZE", 0) > 0 and pool_supported():
+        return _grade_pooled(code_py, tests_py, engine, cpu_ms, memory_mb)
+    return _grade_local(code_py, tests_py, engine, cpu_ms, memory_mb)
+
+def _check_limits(result: dict, time_limit_ms, cpu_ms, memory_mb) -> None:
+    # Turn a CPU / memory / output overrun into a clear FAILED verdict.
+    exceeded = result.pop("cpu_exceeded", False)
+    truncated = result.pop("truncated", False)
+    if result["status"] == "ERROR" or result.get("output") == "TIMEOUT":
+        return
+    if truncated:
+        result["status"] = "FAILED"
+        result["output"] = (
+            f"{OUTPUT_LIMIT_EXCEEDED}: the tests printed more than "
+            f"{current_app.config.get('GRADER_OUTPUT_MAX_BYTES')} bytes and were stopped\n\n"
+            + (result.get("output") or "")
+        )
+        return
+    used = result.get("cpu_ms")
+    if exceeded or (cpu_ms and used is not None and used > cpu_ms):
+        result["status"] = "FAILED"
+        detail = f"used {used} ms of CPU, " if used is not None else ""
+        result["output"] = (
+            f"{TIME_LIMIT_EXCEEDED}: {detail}limit {time_limit_ms} ms "
+            f"(+{cpu_ms - time_limit_ms} ms for the test harness)\n\n"
+            + (result.get("output") or "")
+        )
+    elif result["status"] == "FAILED" and "MemoryError" in (result.get("output") or ""):
+        result["output"] = f"{MEMORY_LIMIT_EXCEEDED} ({memory_mb} MB)\n\n" + result["output"]
+
+def _output_limits() -> dict:
+    cfg = current_app.config
+    return {"max_output": cfg.get("GRADER_OUTPUT_MAX_BYTES"), "keep_output": cfg.get("GRADER_OUTPUT_KEEP_BYTES")}
+
+def _engine_for(tests_py: str) -> str:
+    # "lite" skips pytest plugin loading/collection; tests that need real
+    # pytest features silently keep the pytest engine.
+    if current_app.config.get("GRADER_ENGINE", "pytest") == "lite" and lite_compatible(tests_py):
+        return "lite"
+    return "pytest"
+
+def _test_files(tests_py: str, engine: str) -> dict:
+    files = {"test_solution.py": tests_py}
+    if engine == "lite":
+        data = compile_tests(tests_py)
+        if data:
+            files[TESTS_BYTECODE] = data
+    return files
+
+def _job_workspace(tests_py: str, engine: str):
+    # Tests are staged once per exercise version and workspace; only
+    # solution.py is written per job.
+    return workspace(tests_key(tests_py, engine), _test_files(tests_py, engine))
+
+def _docker_limits(test_cmd: list, cpu_ms=None, memory_mb=None) -> list:
+    # rlimits for `docker exec` (the container's own caps are fixed at start).
+    prefix = []
+    if cpu_ms:
+        sec = cpu_limit_sec(cpu_ms)
+        prefix.append(f"--cpu={sec}:{sec + 1}")
+    if memory_mb:
+        prefix.append(f"--as={int(memory_mb) * 1024 * 1024}")
+    return ["prlimit", *prefix, "--", *test_cmd] if prefix else test_cmd
+
+def _grade_pooled(code_py: str, tests_py: str, engine: str = "pytest", cpu_ms=None, memory_mb=None):
+    # Same as _grade_local, but the tests run in a fork of a pre-warmed worker.
+    start = time.perf_counter()
+    with _job_workspace(tests_py, engine) as ws:
+        ws.write("solution.py", code_py)
+
+        try:
+            pool = get_pool(
+                current_app.config.get("GRADER_POOL_SIZE", 2),
+                current_app.config.get("GRADER_POOL_MAX_JOBS", 50),
+            )
+            reply = pool.run(
+                ws.path, current_app.config.get("GRADER_TIMEOUT_SEC", 6), engine,
+                cpu_ms=cpu_ms, memory_mb=memory_mb, **_output_limits(),
+            )
+            runtime_ms = int((time.perf_counter() - start) * 1000)
+            if reply.get("timeout"):
+                return {"status": "FAILED", "runtime_ms": runtime_ms, "output": "TIMEOUT"}
+            return {
+                "status": "PASSED" if reply["returncode"] == 0 else "FAILED",
+                "runtime_ms": runtime_ms,
+                "output": reply.get("output") or "",
+                "cpu_ms": reply.get("cpu_ms"),
+                "peak_rss_kb": reply.get("peak_rss_kb"),
+                "cpu_exceeded": reply.get("cpu_exceeded", False),
+                "truncated": reply.get("truncated", False),
+            }
+        except Exception as e:
+            runtime_ms = int((time.perf_counter() - start) * 1000)
+            return {"status": "ERROR", "runtime_ms": runtime_ms, "output": str(e)}
 
-def _grade_local(code_py: str, tests_py: str):
+def _grade_local(code_py: str, tests_py: str, engine: str = "pytest", cpu_ms=None, memory_mb=None):
     # NOTE: Local grading is for dev only (less safe).
     start = time.perf_counter()
-    with tempfile.TemporaryDirectory() as td:
-        sol = os.path.join(td, "solution.py")
-        tst = os.path.join(td, "test_solution.py")
-        with open(sol, "w", encoding="utf-8") as f:
-            f.write(code_py)
-        with open(tst, "w", encoding="utf-8") as f:
-            f.write(tests_py)
+    with _job_workspace(tests_py, engine) as ws:
+        ws.write("solution.py", code_py)
+        if engine == "lite":
+            cmd = [sys.executable, "-I", RUNNER_SCRIPT]
+        else:
+            cmd = [sys.executable, "-m", "pytest", "-q"]
 
         try:
-            p = subprocess.run(
-                [sys.executable, "-m", "pytest", "-q"],
-                cwd=td,
-                capture_output=True,
-                text=True,
+            p = run_limited(
+                cmd,
+                cwd=ws.path,
                 timeout=current_app.config.get("GRADER_TIMEOUT_SEC", 6),
+                cpu_ms=cpu_ms,
+                memory_mb=memory_mb,
+                **_output_limits(),
             )
             runtime_ms = int((time.perf_counter() - start) * 1000)
-            out = (p.stdout or "") + "\n" + (p.stderr or "")
+            out = p["stdout"] + "\n" + p["stderr"]
             return {
-                "status": "PASSED" if p.returncode == 0 else "FAILED",
+                "status": "PASSED" if p["returncode"] == 0 else "FAILED",
                 "runtime_ms": runtime_ms,
                 "output": out,
+                "cpu_ms": p["cpu_ms"],
+                "peak_rss_kb": p["peak_rss_kb"],
+                "cpu_exceeded": p["cpu_exceeded"],
+                "truncated": p["truncated"],
             }
         except subprocess.TimeoutExpired:
             runtime_ms = int((time.perf_counter() - start) * 1000)
@@ -39,35 +178,75 @@ def _grade_local(code_py: str, tests_py: str):
             runtime_ms = int((time.perf_counter() - start) * 1000)
             return {"status": "ERROR", "runtime_ms": runtime_ms, "output": str(e)}
 
-def _grade_with_docker(code_py: str, tests_py: str):
+def _grade_docker_pooled(code_py: str, tests_py: str, engine: str = "pytest", cpu_ms=None, memory_mb=None):
+    # Same as _grade_with_docker, but on a long-lived container from the pool.
+    # CPU time / peak RSS are not measured inside containers.
+    start = time.perf_counter()
+    files = {"solution.py": code_py, **_test_files(tests_py, engine)}
+    if engine == "lite":
+        test_cmd = ["python", RUNNER_MOUNT]
+    else:
+        test_cmd = ["pytest", "-q", "-p", "no:cacheprovider"]
+
+    try:
+        pool = get_container_pool(current_app.config, RUNNER_SCRIPT)
+        reply = pool.run(
+            files, _docker_limits(test_cmd, cpu_ms, memory_mb),
+            current_app.config.get("GRADER_TIMEOUT_SEC", 6),
+        )
+        runtime_ms = int((time.perf_counter() - start) * 1000)
+        if reply.get("timeout"):
+            return {"status": "FAILED", "runtime_ms": runtime_ms, "output": "TIMEOUT"}
+        return {
+            "status": "PASSED" if reply["returncode"] == 0 else "FAILED",
+            "runtime_ms": runtime_ms,
+            "output": reply.get("output") or "",
+            "cpu_exceeded": reply["returncode"] in (-24, 128 + 24),  # SIGXCPU
+            "truncated": reply.get("truncated", False),
+        }
+    except Exception as e:
+        runtime_ms = int((time.perf_counter() - start) * 1000)
+        return {"status": "ERROR", "runtime_ms": runtime_ms, "output": str(e)}
+
+def _grade_with_docker(code_py: str, tests_py: str, engine: str = "pytest", cpu_ms=None, memory_mb=None):
     start = time.perf_counter()
-    with tempfile.TemporaryDirectory() as td:
-        with open(os.path.join(td, "solution.py"), "w", encoding="utf-8") as f:
-            f.write(code_py)
-        with open(os.path.join(td, "test_solution.py"), "w", encoding="utf-8") as f:
-            f.write(tests_py)
+    with _job_workspace(tests_py, engine) as ws:
+        ws.write("solution.py", code_py)
+        mounts = ["-v", f"{ws.path}:/work"]
+        if engine == "lite":
+            # Mounted read-only so the submission cannot rewrite the harness.
+            mounts += ["-v", f"{RUNNER_SCRIPT}:{RUNNER_MOUNT}:ro"]
+            test_cmd = ["python", RUNNER_MOUNT]
+        else:
+            test_cmd = ["pytest", "-q"]
 
         image = current_app.config.get("DOCKER_IMAGE", "edu_runner:latest")
         timeout = current_app.config.get("GRADER_TIMEOUT_SEC", 6)
+        limits = [f"--memory={memory_mb or 256}m"]
+        if cpu_ms:
+            sec = cpu_limit_sec(cpu_ms)
+            limits.append(f"--ulimit=cpu={sec}:{sec + 1}")
 
         cmd = [
             "docker", "run", "--rm",
             "--network=none",
-            "--cpus=1", "--memory=256m",
-            "-v", f"{td}:/work",
+            "--cpus=1", *limits,
+            *mounts,
             "-w", "/work",
             image,
-            "pytest", "-q"
+            *test_cmd,
         ]
 
         try:
-            p = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+            p = run_limited(cmd, cwd=None, timeout=timeout, **_output_limits())
             runtime_ms = int((time.perf_counter() - start) * 1000)
-            out = (p.stdout or "") + "\n" + (p.stderr or "")
+            out = p["stdout"] + "\n" + p["stderr"]
             return {
-                "status": "PASSED" if p.returncode == 0 else "FAILED",
+                "status": "PASSED" if p["returncode"] == 0 else "FAILED",
                 "runtime_ms": runtime_ms,
                 "output": out,
+                "cpu_exceeded": p["returncode"] in (-24, 128 + 24),  # SIGXCPU
+                "truncated": p["truncated"],
             }
         except subprocess.TimeoutExpired:
             runtime_ms = int((time.perf_counter() - start) * 1000)
@@ -0,0 +1,183 @@
+"""Pool of pre-warmed grader processes.
+
+Starting `python -m pytest` costs a fresh interpreter plus the pytest import
+on every submission. Instead we keep a few `pool_worker.py` processes alive
+with pytest already imported; each job runs in a child forked from one of
+them, so state stays isolated while the fixed cost is paid once per worker.
+
+Workers are recycled after `max_jobs` jobs (or when they die), and the pool
+is created lazily per process so gunicorn workers each get their own.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import queue
+import select
+import subprocess
+import sys
+import threading
+from typing import Optional
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pool_worker.py")
+
+
+class PoolError(RuntimeError):
+    pass
+
+
+class _Worker:
+    def __init__(self):
+        self.jobs = 0
+        self.proc = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        )
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def request(self, job: dict, timeout: float) -> dict:
+        self.jobs += 1
+        self.proc.stdin.write(json.dumps(job) + "\n")
+        self.proc.stdin.flush()
+
+        # The worker enforces the job timeout itself; the extra margin only
+        # covers a cold worker that is still importing pytest.
+        ready, _, _ = select.select([self.proc.stdout], [], [], timeout + 10)
+        if not ready:
+            raise PoolError("grader worker did not answer")
+        line = self.proc.stdout.readline()
+        if not line:
+            raise PoolError("grader worker exited")
+        return json.loads(line)
+
+    def stop(self) -> None:
+        try:
+            self.proc.stdin.close()
+        except Exception:
+            pass
+        try:
+            self.proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+
+
+class GraderPool:
+    def __init__(self, size: int, max_jobs: int = 50):
+        self.size = max(1, size)
+        self.max_jobs = max(1, max_jobs)
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._all: list[_Worker] = []
+        self._lock = threading.Lock()
+        for _ in range(self.size):
+            self._spawn()
+
+    def _spawn(self) -> None:
+        w = _Worker()
+        with self._lock:
+            self._all.append(w)
+        self._idle.put(w)
+
+    def _retire(self, w: _Worker) -> None:
+        with self._lock:
+            if w in self._all:
+                self._all.remove(w)
+        w.stop()
+        try:
+            self._spawn()
+        except Exception:
+            # Keep going one worker short; the next checkout tries again.
+            pass
+
+    def _checkout(self, timeout: float) -> _Worker:
+        with self._lock:
+            missing = self.size - len(self._all)
+        for _ in range(max(0, missing)):
+            try:
+                self._spawn()
+            except Exception:
+                break
+
+        try:
+            w = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise PoolError("no grader worker available")
+        if not w.alive():
+            self._retire(w)
+            try:
+                w = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                raise PoolError("no grader worker available")
+        return w
+
+    def run(self, cwd: str, timeout: float, engine: str = "pytest", cpu_ms=None, memory_mb=None,
+            max_output=None, keep_output=None) -> dict:
+        """Run the tests in `cwd` on a warm worker (engine: "pytest" or "lite").
+
+        `cpu_ms` / `memory_mb` / `max_output` become rlimits in the forked
+        child; the reply keeps at most `keep_output` bytes of output.
+        Returns the worker reply: {"returncode", "timeout", "cpu_exceeded",
+        "truncated", "output", "cpu_ms", "peak_rss_kb"}.
+        Raises PoolError if the worker died mid-job.
+        """
+        w = self._checkout(timeout + 10)
+
+        try:
+            job = {
+                "cwd": cwd, "timeout": timeout, "engine": engine, "cpu_ms": cpu_ms, "memory_mb": memory_mb,
+                "max_output": max_output, "keep_output": keep_output,
+            }
+            reply = w.request(job, timeout)
+        except Exception:
+            self._retire(w)
+            raise
+
+        if reply.get("error"):
+            self._retire(w)
+            raise PoolError(reply["error"])
+
+        if w.jobs >= self.max_jobs:
+            self._retire(w)
+        else:
+            self._idle.put(w)
+        return reply
+
+    def shutdown(self) -> None:
+        with self._lock:
+            workers, self._all = self._all, []
+        for w in workers:
+            w.stop()
+
+
+_pool: Optional[GraderPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(size: int, max_jobs: int) -> GraderPool:
+    """Return this process's pool, creating it on first use (or after a fork)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = GraderPool(size, max_jobs)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def pool_supported() -> bool:
+    return hasattr(os, "fork")
+
+
+@atexit.register
+def _shutdown_pool() -> None:
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.shutdown()
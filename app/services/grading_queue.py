@@ -0,0 +1,205 @@
+"""Background grading queue.
+
+`submit` only saves a PENDING Submission and hands its id to this queue; a
+bounded set of daemon threads grades it outside the request, so a gunicorn
+worker is never blocked for GRADER_TIMEOUT_SEC. The queue is per process
+(like the grader pool) and exposes depth / wait-time numbers for admins.
+It lives in memory, so a restart drops whatever was queued; such rows are
+marked ERROR once they are older than GRADING_STALE_SEC (see
+`expire_stale_pending`).
+
+With GRADING_BACKEND = "db" submissions go to the durable `grading_job`
+table instead (see job_queue.py) and are graded by `python -m app.grader_worker`.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Optional
+
+from flask import current_app
+
+from ..extensions import db
+from ..models import Submission
+from .admission import admission_stats
+from .grade_cache import get_cache
+from .job_queue import enqueue_job, job_stats
+from .submissions import grade_submission
+from .workspace import get_workspaces
+
+
+class GradingQueue:
+    def __init__(self, app, workers: int = 2, maxsize: int = 100):
+        self.app = app
+        self._q: "queue.Queue[tuple[int, float]]" = queue.Queue(maxsize=maxsize)
+        self._done = threading.Condition()
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._processed = 0
+        self._waits = deque(maxlen=200)  # recent queue wait times (seconds)
+        self._threads = []
+        for i in range(max(1, workers)):
+            t = threading.Thread(target=self._loop, name=f"grader-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, submission_id: int) -> bool:
+        """Queue a submission for grading. Returns False if the queue is full."""
+        try:
+            self._q.put_nowait((submission_id, time.monotonic()))
+            return True
+        except queue.Full:
+            return False
+
+    def wait(self, timeout: float) -> None:
+        """Block until any job finishes (or `timeout` passes)."""
+        with self._done:
+            self._done.wait(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = list(self._waits)
+            busy, processed = self._busy, self._processed
+        return {
+            "depth": self._q.qsize(),
+            "capacity": self._q.maxsize,
+            "workers": len(self._threads),
+            "busy": busy,
+            "processed": processed,
+            "avg_wait_ms": int(sum(waits) / len(waits) * 1000) if waits else 0,
+            "max_wait_ms": int(max(waits) * 1000) if waits else 0,
+        }
+
+    def _loop(self) -> None:
+        while True:
+            submission_id, queued_at = self._q.get()
+            with self._lock:
+                self._busy += 1
+                self._waits.append(time.monotonic() - queued_at)
+            try:
+                with self.app.app_context():
+                    try:
+                        sub = db.session.get(Submission, submission_id)
+                        if sub is not None and sub.status == "PENDING":
+                            grade_submission(sub)
+                    except Exception as e:
+                        db.session.rollback()
+                        _mark_error(submission_id, e)
+                    finally:
+                        db.session.remove()
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                    self._processed += 1
+                with self._done:
+                    self._done.notify_all()
+
+
+STALE_MESSAGE = "Grading was interrupted (server restart). Please submit again."
+
+
+def _mark_error(submission_id: int, exc: Exception) -> None:
+    sub = db.session.get(Submission, submission_id)
+    if sub is not None:
+        sub.status = "ERROR"
+        sub.output = f"Grading failed: {exc}"
+        db.session.commit()
+
+
+_queue: Optional[GradingQueue] = None
+_queue_pid: Optional[int] = None
+_queue_lock = threading.Lock()
+
+
+def get_queue() -> GradingQueue:
+    """Return this process's grading queue, starting it on first use."""
+    global _queue, _queue_pid
+    with _queue_lock:
+        if _queue is None or _queue_pid != os.getpid():
+            cfg = current_app.config
+            _queue = GradingQueue(
+                current_app._get_current_object(),
+                workers=cfg.get("GRADING_WORKERS", 2),
+                maxsize=cfg.get("GRADING_QUEUE_MAX", 100),
+            )
+            _queue_pid = os.getpid()
+            try:
+                expire_stale_pending()
+            except Exception:
+                db.session.rollback()
+        return _queue
+
+
+def _use_db_backend() -> bool:
+    return current_app.config.get("GRADING_BACKEND", "thread") == "db"
+
+
+def expire_stale_pending(submission_id: Optional[int] = None) -> int:
+    """Mark PENDING submissions older than GRADING_STALE_SEC as ERROR.
+
+    Only for the thread backend, whose queue does not survive a restart
+    (the db backend retries and gives up on its own). Runs when a process
+    starts its queue and from the status endpoint for a single row.
+    Returns the number of rows changed.
+    """
+    if _use_db_backend():
+        return 0
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config.get("GRADING_STALE_SEC", 600))
+    stmt = db.update(Submission).where(
+        Submission.status == "PENDING", Submission.created_at < cutoff
+    )
+    if submission_id is not None:
+        stmt = stmt.where(Submission.id == submission_id)
+    res = db.session.execute(stmt.values(status="ERROR", runtime_ms=0, output=STALE_MESSAGE))
+    db.session.commit()
+    return res.rowcount
+
+
+def enqueue_submission(submission_id: int) -> bool:
+    if _use_db_backend():
+        enqueue_job(submission_id)
+        return True
+    return get_queue().submit(submission_id)
+
+
+def wait_for_submission(submission_id: int, timeout: float) -> Submission:
+    """Long-poll helper: return the submission once it leaves PENDING.
+
+    Wakes on local job completion, and re-checks the DB at least once a
+    second since another gunicorn worker may be the one grading it.
+    """
+    deadline = time.monotonic() + timeout
+    q = None if _use_db_backend() else get_queue()
+    while True:
+        db.session.rollback()  # end the read transaction so we see new commits
+        sub = db.session.get(Submission, submission_id)
+        remaining = deadline - time.monotonic()
+        if sub is None or sub.status != "PENDING" or remaining <= 0:
+            return sub
+        if q is None:
+            time.sleep(min(remaining, 0.5))
+        else:
+            q.wait(min(remaining, 1.0))
+
+
+def queue_stats() -> dict:
+    """Local queue numbers (or durable job counts) plus the DB-wide PENDING backlog."""
+    data = job_stats() if _use_db_backend() else get_queue().stats()
+    data["backend"] = "db" if _use_db_backend() else "thread"
+    cfg = current_app.config
+    if cfg.get("GRADE_CACHE_ENTRIES", 0) > 0:
+        data["cache"] = get_cache(cfg["GRADE_CACHE_ENTRIES"], cfg.get("GRADE_CACHE_MAX_BYTES", 32 * 1024 * 1024)).stats()
+    data["execution"] = admission_stats()
+    data["workspaces"] = get_workspaces().stats()
+    pending = Submission.query.filter_by(status="PENDING")
+    data["pending_total"] = pending.count()
+    oldest = pending.order_by(Submission.created_at.asc()).first()
+    data["oldest_pending_sec"] = (
+        int((datetime.utcnow() - oldest.created_at).total_seconds()) if oldest else 0
+    )
+    return data
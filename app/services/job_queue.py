@@ -0,0 +1,153 @@
+"""Durable grading job queue stored in the `grading_job` table.
+
+Workers claim a job by leasing it for `lease_sec` seconds and keep the lease
+alive with heartbeats. A job whose lease expires (worker crashed or was
+killed) becomes claimable again. Claiming is a compare-and-set UPDATE on the
+job id, so it behaves the same on SQLite and Postgres without row locks.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Optional
+
+from ..extensions import db
+from ..models import GradingJob, Submission
+from .submissions import grade_submission
+
+
+def _claimable(now: datetime):
+    return db.or_(
+        GradingJob.status == "QUEUED",
+        db.and_(GradingJob.status == "RUNNING", GradingJob.lease_until < now),
+    )
+
+
+def enqueue_job(submission_id: int) -> GradingJob:
+    job = GradingJob(submission_id=submission_id, status="QUEUED")
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def claim_job(worker_id: str, lease_sec: int, max_attempts: int = 3) -> Optional[GradingJob]:
+    """Lease the oldest claimable job for `worker_id`, or return None."""
+    for _ in range(5):
+        now = datetime.utcnow()
+        candidate = (
+            db.session.query(GradingJob.id, GradingJob.attempts)
+            .filter(_claimable(now))
+            .order_by(GradingJob.id.asc())
+            .first()
+        )
+        if candidate is None:
+            db.session.rollback()
+            return None
+
+        job_id, attempts = candidate
+        if attempts >= max_attempts:
+            _give_up(job_id, now)
+            continue
+
+        res = db.session.execute(
+            db.update(GradingJob)
+            .where(GradingJob.id == job_id, _claimable(now))
+            .values(
+                status="RUNNING",
+                worker_id=worker_id,
+                lease_until=now + timedelta(seconds=lease_sec),
+                heartbeat_at=now,
+                started_at=now,
+                attempts=GradingJob.attempts + 1,
+            )
+        )
+        db.session.commit()
+        if res.rowcount == 1:
+            return db.session.get(GradingJob, job_id)
+        # Another worker won the race; try the next candidate.
+    return None
+
+
+def heartbeat(job_id: int, worker_id: str, lease_sec: int) -> bool:
+    """Extend the lease. Returns False if this worker no longer owns the job."""
+    now = datetime.utcnow()
+    res = db.session.execute(
+        db.update(GradingJob)
+        .where(
+            GradingJob.id == job_id,
+            GradingJob.worker_id == worker_id,
+            GradingJob.status == "RUNNING",
+        )
+        .values(lease_until=now + timedelta(seconds=lease_sec), heartbeat_at=now)
+    )
+    db.session.commit()
+    return res.rowcount == 1
+
+
+def finish_job(job_id: int, worker_id: str, error: str = "", max_attempts: int = 3) -> None:
+    """Record the outcome of a claimed job.
+
+    A failed attempt puts the job back to QUEUED while it has attempts left;
+    the last one fails the job and marks its submission ERROR (see _give_up).
+    """
+    now = datetime.utcnow()
+    owned = db.and_(GradingJob.id == job_id, GradingJob.worker_id == worker_id)
+    if not error:
+        stmt = db.update(GradingJob).where(owned).values(
+            status="DONE", last_error="", lease_until=None, finished_at=now
+        )
+    else:
+        stmt = db.update(GradingJob).where(owned, GradingJob.attempts < max_attempts).values(
+            status="QUEUED", worker_id=None, last_error=error, lease_until=None
+        )
+    res = db.session.execute(stmt)
+    db.session.commit()
+
+    if error and res.rowcount == 0:
+        job = db.session.get(GradingJob, job_id)
+        if job is not None and job.worker_id == worker_id and job.status == "RUNNING":
+            job.last_error = error
+            _give_up(job_id, now)
+
+
+def _give_up(job_id: int, now: datetime) -> None:
+    job = db.session.get(GradingJob, job_id)
+    job.status = "FAILED"
+    job.finished_at = now
+    job.last_error = job.last_error or "Too many attempts."
+    sub = job.submission
+    if sub is not None and sub.status == "PENDING":
+        sub.status = "ERROR"
+        sub.output = "Grading failed after several attempts. Please submit again."
+    db.session.commit()
+
+
+def job_stats() -> dict:
+    now = datetime.utcnow()
+    counts = dict(
+        db.session.query(GradingJob.status, db.func.count(GradingJob.id))
+        .group_by(GradingJob.status)
+        .all()
+    )
+    oldest = (
+        db.session.query(db.func.min(GradingJob.created_at))
+        .filter(GradingJob.status == "QUEUED")
+        .scalar()
+    )
+    expired = GradingJob.query.filter(
+        GradingJob.status == "RUNNING", GradingJob.lease_until < now
+    ).count()
+    return {
+        "jobs_queued": counts.get("QUEUED", 0),
+        "jobs_running": counts.get("RUNNING", 0),
+        "jobs_failed": counts.get("FAILED", 0),
+        "jobs_expired_leases": expired,
+        "oldest_job_sec": int((now - oldest).total_seconds()) if oldest else 0,
+    }
+
+
+def process_job(job: GradingJob) -> None:
+    """Grade the job's submission (skipped if something already graded it)."""
+    sub = db.session.get(Submission, job.submission_id)
+    if sub is not None and sub.status == "PENDING":
+        grade_submission(sub)
@@ -0,0 +1,92 @@
+"""Fastest-solutions leaderboard for performance-graded exercises.
+
+`benchmark_best` keeps one row per (exercise, student) with that student's
+best passing median, maintained when a submission is graded or reviewed,
+so the leaderboard is an indexed top-N read instead of an aggregate over
+all submissions.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+
+from ..extensions import db
+from ..models import BenchmarkBest, Submission, User
+
+# Submissions that count: tests (and benchmark) passed, not rejected.
+RANKED_STATUSES = ("WAITING_APPROVAL", "APPROVED")
+
+
+def record_benchmark(sub: Submission) -> None:
+    """Update the student's entry if `sub` beats it. Caller commits."""
+    if sub.bench_median_ms is None or sub.status not in RANKED_STATUSES:
+        return
+    entry = BenchmarkBest.query.filter_by(exercise_id=sub.exercise_id, student_id=sub.student_id).first()
+    if entry is None:
+        entry = BenchmarkBest(exercise_id=sub.exercise_id, student_id=sub.student_id)
+        db.session.add(entry)
+    elif entry.median_ms <= sub.bench_median_ms:
+        return
+    entry.submission_id = sub.id
+    entry.median_ms = sub.bench_median_ms
+    entry.p95_ms = sub.bench_p95_ms
+    entry.updated_at = datetime.utcnow()
+
+
+def refresh_entry(student_id: int, exercise_id: int) -> None:
+    """Recompute one entry from submissions (e.g. after a rejection). Caller commits."""
+    best = (
+        Submission.query
+        .filter(
+            Submission.student_id == student_id,
+            Submission.exercise_id == exercise_id,
+            Submission.status.in_(RANKED_STATUSES),
+            Submission.bench_median_ms.isnot(None),
+        )
+        .order_by(Submission.bench_median_ms.asc())
+        .first()
+    )
+    entry = BenchmarkBest.query.filter_by(exercise_id=exercise_id, student_id=student_id).first()
+    if best is None:
+        if entry is not None:
+            db.session.delete(entry)
+        return
+    if entry is None:
+        entry = BenchmarkBest(exercise_id=exercise_id, student_id=student_id)
+        db.session.add(entry)
+    entry.submission_id = best.id
+    entry.median_ms = best.bench_median_ms
+    entry.p95_ms = best.bench_p95_ms
+    entry.updated_at = datetime.utcnow()
+
+
+def top_entries(exercise_id: int, limit: int = 10) -> list[dict]:
+    rows = (
+        db.session.query(BenchmarkBest, User.username)
+        .join(User, BenchmarkBest.student_id == User.id)
+        .filter(BenchmarkBest.exercise_id == exercise_id)
+        .order_by(BenchmarkBest.median_ms.asc(), BenchmarkBest.updated_at.asc())
+        .limit(limit)
+        .all()
+    )
+    return [
+        {
+            "rank": i,
+            "student_id": e.student_id,
+            "username": username,
+            "median_ms": e.median_ms,
+            "p95_ms": e.p95_ms,
+        }
+        for i, (e, username) in enumerate(rows, start=1)
+    ]
+
+
+def rank_of(exercise_id: int, student_id: int):
+    """(rank, entry) for one student, or (None, None) if not ranked."""
+    entry = BenchmarkBest.query.filter_by(exercise_id=exercise_id, student_id=student_id).first()
+    if entry is None:
+        return None, None
+    faster = BenchmarkBest.query.filter(
+        BenchmarkBest.exercise_id == exercise_id, BenchmarkBest.median_ms < entry.median_ms
+    ).count()
+    return faster + 1, entry
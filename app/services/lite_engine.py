@@ -0,0 +1,54 @@
+"""Web-side helpers for the "lite" grading engine (see lite_runner.py).
+
+Exercise tests are compiled once per tests_py version and the bytecode is
+kept in memory; workspaces stage it along with the test source (see
+workspace.py). Tests that need real pytest features (fixtures, classes,
+decorators, `import pytest`) keep using the pytest engine.
+"""
+
+from __future__ import annotations
+
+import ast
+import importlib.util
+import marshal
+import os
+from functools import lru_cache
+
+RUNNER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lite_runner.py")
+
+
+@lru_cache(maxsize=512)
+def lite_compatible(tests_py: str) -> bool:
+    try:
+        tree = ast.parse(tests_py)
+    except SyntaxError:
+        # Let the harness report the collection error like pytest would.
+        return True
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import) and any(a.name.split(".")[0] in ("pytest", "_pytest") for a in node.names):
+            return False
+        if isinstance(node, ast.ImportFrom) and (node.module or "").split(".")[0] in ("pytest", "_pytest"):
+            return False
+
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name.startswith("Test"):
+            return False
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test"):
+            args = node.args
+            if isinstance(node, ast.AsyncFunctionDef) or node.decorator_list:
+                return False
+            if args.args or args.posonlyargs or args.kwonlyargs or args.vararg or args.kwarg:
+                return False
+    return True
+
+
+@lru_cache(maxsize=512)
+def compile_tests(tests_py: str) -> bytes:
+    """MAGIC_NUMBER + marshalled code object for the exercise tests."""
+    try:
+        code = compile(tests_py, "test_solution.py", "exec", dont_inherit=True)
+    except SyntaxError:
+        return b""  # the runner recompiles from source and reports the error
+    return importlib.util.MAGIC_NUMBER + marshal.dumps(code)
+
@@ -0,0 +1,324 @@
+"""Outbound email queue stored in the `outbound_email` table.
+
+`queue_email` saves the message and returns at once; a sender thread per
+process delivers due messages in batches over one pooled SMTP connection
+(EHLO/STARTTLS/login once, closed after SMTP_IDLE_SEC without mail), so a
+request never waits on the relay.
+
+Delivery status is kept on the row: QUEUED -> SENDING -> SENT, or FAILED
+with `last_error`. Messages are claimed with a lease like grading jobs
+(job_queue.py), so senders in several processes never send one twice
+and a sender that died mid-batch leaves its messages to the next one.
+
+Failures:
+- a 5xx reply about the message (recipient/sender refused, data
+  rejected) fails it at once;
+- anything else (4xx, connection or login problems) retries with
+  exponential backoff, OUTBOX_RETRY_BASE_SEC doubling up to
+  OUTBOX_RETRY_MAX_SEC, for at most OUTBOX_MAX_ATTEMPTS attempts. A
+  connection problem also puts the rest of the batch back unattempted.
+- messages with `expires_at` (OTP codes) fail once they are past it.
+
+The SMTP server comes from SMTP_HOST/SMTP_PORT, so tests point it at a local
+stand-in server (SMTP_USE_TLS = 0) and call `deliver_pending()` to send
+the due messages synchronously.
+"""
+
+from __future__ import annotations
+
+import os
+import smtplib
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from flask import current_app
+
+from ..extensions import db
+from ..models import OutboundEmail
+from .emailer import SmtpConnection, build_message, smtp_config_error, smtp_settings
+
+
+def queue_email(
+    to_email: str,
+    subject: str,
+    body: str,
+    html: Optional[str] = None,
+    expires_in: Optional[int] = None,
+) -> OutboundEmail:
+    """Save a message for delivery and wake this process's sender.
+
+    `expires_in` (seconds): give up on the message after that long.
+    """
+    now = datetime.utcnow()
+    email = OutboundEmail(
+        to_email=to_email, subject=subject, body=body, html=html,
+        status="QUEUED", next_attempt_at=now,
+        expires_at=now + timedelta(seconds=expires_in) if expires_in else None,
+    )
+    db.session.add(email)
+    db.session.commit()
+    get_sender().wake()
+    return email
+
+
+def email_status(email_id: Optional[int]) -> Optional[OutboundEmail]:
+    return db.session.get(OutboundEmail, email_id) if email_id else None
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:outbox"
+
+
+def _claimable(now: datetime):
+    return db.or_(
+        db.and_(OutboundEmail.status == "QUEUED", OutboundEmail.next_attempt_at <= now),
+        db.and_(OutboundEmail.status == "SENDING", OutboundEmail.lease_until < now),
+    )
+
+
+def _claim(worker_id: str, limit: int, lease_sec: int) -> list:
+    now = datetime.utcnow()
+    ids = [
+        r[0] for r in db.session.query(OutboundEmail.id)
+        .filter(_claimable(now))
+        .order_by(OutboundEmail.id.asc())
+        .limit(limit)
+        .all()
+    ]
+    if not ids:
+        db.session.rollback()
+        return []
+    db.session.execute(
+        db.update(OutboundEmail)
+        .where(OutboundEmail.id.in_(ids), _claimable(now))
+        .values(
+            status="SENDING",
+            worker_id=worker_id,
+            lease_until=now + timedelta(seconds=lease_sec),
+            attempts=OutboundEmail.attempts + 1,
+        )
+    )
+    db.session.commit()
+    # Rows another sender won in between are not ours. Plain rows, not ORM
+    # objects: they must not expire when each outcome is committed.
+    e = OutboundEmail
+    return db.session.execute(
+        db.select(e.id, e.to_email, e.subject, e.body, e.html, e.attempts, e.expires_at)
+        .where(e.id.in_(ids), e.worker_id == worker_id, e.status == "SENDING")
+        .order_by(e.id.asc())
+    ).all()
+
+
+def _update_owned(email, owner: str, **values) -> None:
+    db.session.execute(
+        db.update(OutboundEmail)
+        .where(OutboundEmail.id == email.id, OutboundEmail.worker_id == owner, OutboundEmail.status == "SENDING")
+        .values(lease_until=None, **values)
+    )
+    db.session.commit()
+
+
+def _failure_kind(exc: Exception) -> str:
+    """Classify a send error: "permanent" (5xx about this message), "retry"
+    (4xx about it) or "connection" (unreachable, login, dropped session)."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in exc.recipients.values()]
+        return "permanent" if codes and all(c >= 500 for c in codes) else "retry"
+    if isinstance(exc, (smtplib.SMTPSenderRefused, smtplib.SMTPDataError)):
+        return "permanent" if exc.smtp_code >= 500 else "retry"
+    return "connection"
+
+
+def _retry_delay(cfg, attempts: int) -> float:
+    base = cfg.get("OUTBOX_RETRY_BASE_SEC", 5)
+    return min(cfg.get("OUTBOX_RETRY_MAX_SEC", 600), base * 2 ** max(0, attempts - 1))
+
+
+def _fail_or_retry(email, worker_id: str, error: str, permanent: bool, now: datetime) -> str:
+    cfg = current_app.config
+    retry_at = now + timedelta(seconds=_retry_delay(cfg, email.attempts))
+    if (
+        permanent
+        or email.attempts >= cfg.get("OUTBOX_MAX_ATTEMPTS", 6)
+        or (email.expires_at is not None and retry_at >= email.expires_at)
+    ):
+        _update_owned(email, worker_id, status="FAILED", last_error=error)
+        return "failed"
+    _update_owned(email, worker_id, status="QUEUED", worker_id=None, last_error=error, next_attempt_at=retry_at)
+    return "retried"
+
+
+def deliver_pending(
+    conn: Optional[SmtpConnection] = None,
+    worker_id: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> dict:
+    """Claim and send one batch of due messages over `conn`.
+
+    Without `conn` a connection is opened for this batch only. Returns
+    counts: claimed, sent, failed, retried and deferred (put back untried
+    after a connection problem).
+    """
+    cfg = current_app.config
+    counts = {"claimed": 0, "sent": 0, "failed": 0, "retried": 0, "deferred": 0}
+    settings = conn.settings if conn is not None else smtp_settings(cfg)
+    if smtp_config_error(settings):
+        return counts  # keep the messages queued until SMTP is configured
+
+    worker_id = worker_id or _worker_id()
+    batch = _claim(worker_id, limit or cfg.get("OUTBOX_BATCH_SIZE", 20), cfg.get("OUTBOX_LEASE_SEC", 300))
+    counts["claimed"] = len(batch)
+    own_conn = conn is None
+    if own_conn and batch:
+        conn = SmtpConnection(settings)
+    try:
+        for i, email in enumerate(batch):
+            now = datetime.utcnow()
+            if email.expires_at is not None and email.expires_at <= now:
+                _update_owned(email, worker_id, status="FAILED", last_error="Expired before it could be sent.")
+                counts["failed"] += 1
+                continue
+            try:
+                conn.send(build_message(settings["from_email"], email.to_email, email.subject, email.body, email.html))
+            except Exception as e:
+                kind = _failure_kind(e)
+                error = f"{type(e).__name__}: {e}"[:1000]
+                counts[_fail_or_retry(email, worker_id, error, kind == "permanent", now)] += 1
+                if kind == "connection":
+                    conn.close()
+                    _defer(batch[i + 1:], worker_id, now + timedelta(seconds=_retry_delay(cfg, 1)))
+                    counts["deferred"] = len(batch) - i - 1
+                    break
+            else:
+                _update_owned(email, worker_id, status="SENT", last_error="", sent_at=datetime.utcnow())
+                counts["sent"] += 1
+    finally:
+        if own_conn and conn is not None:
+            conn.close()
+    return counts
+
+
+def _defer(emails: list, worker_id: str, retry_at: datetime) -> None:
+    # Not attempted: give back the attempt the claim counted.
+    if not emails:
+        return
+    db.session.execute(
+        db.update(OutboundEmail)
+        .where(
+            OutboundEmail.id.in_([e.id for e in emails]),
+            OutboundEmail.worker_id == worker_id,
+            OutboundEmail.status == "SENDING",
+        )
+        .values(
+            status="QUEUED", worker_id=None, lease_until=None, next_attempt_at=retry_at,
+            attempts=OutboundEmail.attempts - 1,
+        )
+    )
+    db.session.commit()
+
+
+class OutboxSender:
+    """Daemon thread delivering due messages; keeps the SMTP connection open
+    between batches while mail keeps coming."""
+
+    def __init__(self, app):
+        self.app = app
+        self.worker_id = _worker_id()
+        self.conn = SmtpConnection(smtp_settings(app.config))
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self.batches = self.sent = self.failed = self.retried = 0
+        self._thread = threading.Thread(target=self._loop, name="outbox-sender", daemon=True)
+        self._thread.start()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches, "sent": self.sent, "failed": self.failed, "retried": self.retried,
+                "connections": self.conn.opened, "connected": self.conn.connected,
+            }
+
+    def _loop(self) -> None:
+        cfg = self.app.config
+        poll = cfg.get("OUTBOX_POLL_SEC", 5)
+        idle_max = cfg.get("SMTP_IDLE_SEC", 30)
+        batch_size = cfg.get("OUTBOX_BATCH_SIZE", 20)
+        while True:
+            counts = None
+            with self.app.app_context():
+                try:
+                    counts = deliver_pending(self.conn, self.worker_id, batch_size)
+                except Exception:
+                    db.session.rollback()
+                    self.conn.close()
+                    self.app.logger.exception("outbox delivery failed")
+                finally:
+                    db.session.remove()
+            if counts and counts["claimed"]:
+                with self._lock:
+                    self.batches += 1
+                    self.sent += counts["sent"]
+                    self.failed += counts["failed"]
+                    self.retried += counts["retried"]
+                if counts["claimed"] >= batch_size and not counts["deferred"]:
+                    continue  # more may be due
+            if self.conn.connected and self.conn.idle_for() >= idle_max:
+                self.conn.close()
+            self._wake.wait(min(poll, idle_max) if self.conn.connected else poll)
+            self._wake.clear()
+
+
+_sender: Optional[OutboxSender] = None
+_sender_pid: Optional[int] = None
+_sender_lock = threading.Lock()
+
+
+def get_sender() -> OutboxSender:
+    """This process's outbox sender, started on first use (or after a fork)."""
+    global _sender, _sender_pid
+    with _sender_lock:
+        if _sender is None or _sender_pid != os.getpid():
+            _sender = OutboxSender(current_app._get_current_object())
+            _sender_pid = os.getpid()
+        return _sender
+
+
+def resume_outbox() -> bool:
+    """Start this process's sender if messages are due (e.g. retries queued
+    before a restart). Returns True if it was woken."""
+    due = db.session.query(OutboundEmail.id).filter(_claimable(datetime.utcnow())).first()
+    if due is None:
+        return False
+    get_sender().wake()
+    return True
+
+
+def outbox_stats() -> dict:
+    now = datetime.utcnow()
+    counts = dict(
+        db.session.query(OutboundEmail.status, db.func.count(OutboundEmail.id))
+        .group_by(OutboundEmail.status)
+        .all()
+    )
+    oldest = (
+        db.session.query(db.func.min(OutboundEmail.created_at))
+        .filter(OutboundEmail.status.in_(("QUEUED", "SENDING")))
+        .scalar()
+    )
+    last_failed = (
+        OutboundEmail.query.filter_by(status="FAILED").order_by(OutboundEmail.id.desc()).first()
+    )
+    return {
+        "queued": counts.get("QUEUED", 0),
+        "sending": counts.get("SENDING", 0),
+        "sent": counts.get("SENT", 0),
+        "failed": counts.get("FAILED", 0),
+        "oldest_unsent_sec": int((now - oldest).total_seconds()) if oldest else 0,
+        "last_error": last_failed.last_error if last_failed else "",
+        "sender": _sender.stats() if _sender is not None and _sender_pid == os.getpid() else None,
+    }
@@ -0,0 +1,100 @@
+"""Warm grader worker process.
+
+Run as a standalone script by `grader_pool` (it does not import the Flask
+app). pytest is imported once at startup; every job is then run in a
+forked child so the student's modules never leak into the next job.
+
+Protocol: one JSON object per line on stdin, one JSON reply per line on
+stdout.
+
+    -> {"cwd": "/tmp/xyz", "timeout": 6, "engine": "pytest",
+        "cpu_ms": 1400, "memory_mb": 256,
+        "max_output": 1048576, "keep_output": 65536}
+    <- {"returncode": 0, "timeout": false, "cpu_exceeded": false,
+        "truncated": false, "output": "...", "cpu_ms": 35, "peak_rss_kb": 41230}
+
+The child's output goes to a temporary file capped at `max_output` bytes
+with RLIMIT_FSIZE (the child gets SIGXFSZ past it); only the head and tail
+of it are read back, so replies stay small.
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+import pytest  # noqa: F401  (imported for its warm-up cost)
+import _pytest.config  # noqa: F401
+
+import lite_runner  # same directory as this script
+import sandbox
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _run_child(cwd: str, out_fd: int, engine: str, cpu_ms=None, memory_mb=None, max_output=None) -> None:
+    # New process group so a timeout can kill anything the student spawned.
+    os.setsid()
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(out_fd, 1)
+    os.dup2(out_fd, 2)
+    os.chdir(cwd)
+    # sys.path[0] is this script's directory (app/services); drop it so the
+    # submission cannot import platform modules.
+    sys.path[:] = [cwd] + [p for p in sys.path if p != SCRIPT_DIR]
+    sys.dont_write_bytecode = True
+
+    rc = 3
+    try:
+        sandbox.set_limits(cpu_ms, memory_mb, max_output)
+        if engine == "lite":
+            rc = lite_runner.run(cwd)
+        else:
+            rc = int(pytest.main(["-q", "-p", "no:cacheprovider"]))
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(rc)
+
+
+def run_job(job: dict) -> dict:
+    with tempfile.TemporaryFile() as out:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            _run_child(
+                job["cwd"], out.fileno(), job.get("engine", "pytest"),
+                job.get("cpu_ms"), job.get("memory_mb"), job.get("max_output"),
+            )
+
+        status, timed_out, ru, peak = sandbox.wait_with_usage(pid, float(job.get("timeout", 6)))
+        output = sandbox.read_head_tail(out, job.get("keep_output"))
+        size = os.fstat(out.fileno()).st_size
+
+    return {
+        "returncode": os.waitstatus_to_exitcode(status),
+        "timeout": timed_out,
+        "cpu_exceeded": not timed_out and sandbox.cpu_exceeded(status),
+        "truncated": sandbox.output_exceeded(status) or bool(job.get("max_output") and size >= job["max_output"]),
+        "output": output,
+        **sandbox.usage(ru, peak),
+    }
+
+
+def main() -> None:
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            reply = run_job(json.loads(line))
+        except Exception as e:
+            reply = {"returncode": -1, "timeout": False, "output": "", "error": str(e)}
+        sys.stdout.write(json.dumps(reply) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
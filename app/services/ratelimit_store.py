@@ -0,0 +1,167 @@
+"""Rate-limit counters shared by every process on the host, in SQLite.
+
+Flask-Limiter's default storage is a dict per process: with N gunicorn
+workers a "10 per minute" limit really allowed 10 x N, and a restart reset
+every counter. This storage keeps the counters in their own SQLite file
+(WAL mode, separate from the app database so limiter writes never wait on
+app transactions), which every worker on the host opens:
+
+    RATELIMIT_STORAGE_URI = "sqlite-limits:///instance/ratelimits.db"
+    (four slashes for an absolute path, as with SQLAlchemy URLs)
+
+- fixed window: one UPSERT ... RETURNING per hit; a counter whose window
+  has ended restarts in the same statement;
+- sliding window counter: the current and previous window are read and the
+  current one incremented inside one BEGIN IMMEDIATE transaction, so two
+  workers cannot both take the last slot.
+
+Rows carry their expiry time: expired rows read as 0 and are deleted in a
+sweep at most every _PURGE_INTERVAL seconds per process. Each thread keeps
+its own connection (reopened after a fork). `benchmarks/bench_ratelimit.py`
+measures the per-check cost against the in-memory storage.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from math import floor
+
+from limits.storage import SlidingWindowCounterSupport, Storage
+from limits.storage.base import TimestampedSlidingWindow
+
+_PURGE_INTERVAL = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+_INCR = """
+INSERT INTO counters (key, value, expires_at) VALUES (:key, :amount, :expires_at)
+ON CONFLICT (key) DO UPDATE SET
+    value = CASE WHEN expires_at <= :now THEN excluded.value ELSE value + excluded.value END,
+    expires_at = CASE WHEN expires_at <= :now THEN excluded.expires_at ELSE expires_at END
+RETURNING value
+"""
+
+
+class SQLiteLimitStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    STORAGE_SCHEME = ["sqlite-limits"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, timeout: float = 5.0, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = uri.split("://", 1)[1] or "instance/ratelimits.db"
+        self.timeout = float(timeout)
+        self._local = threading.local()
+        self._purged_at = 0.0
+        self._conn()  # create the file and table now: fail at startup, not on a login
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _conn(self) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            local.conn, local.pid = conn, os.getpid()
+        return local.conn
+
+    def _maybe_purge(self, conn: sqlite3.Connection, now: float) -> None:
+        if now - self._purged_at < _PURGE_INTERVAL:
+            return
+        self._purged_at = now
+        conn.execute("DELETE FROM counters WHERE expires_at <= ?", (now,))
+
+    # --- fixed window -----------------------------------------------------
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        now = time.time()
+        conn = self._conn()
+        self._maybe_purge(conn, now)
+        # fetchall: step the statement to its end so the write commits now
+        rows = conn.execute(_INCR, {"key": key, "amount": amount, "expires_at": now + expiry, "now": now}).fetchall()
+        return rows[0][0]
+
+    def get(self, key: str) -> int:
+        row = self._conn().execute(
+            "SELECT value FROM counters WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT expires_at FROM counters WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return row[0] if row else now
+
+    def clear(self, key: str) -> None:
+        self._conn().execute("DELETE FROM counters WHERE key = ?", (key,))
+
+    def reset(self) -> int:
+        return self._conn().execute("DELETE FROM counters").rowcount
+
+    def check(self) -> bool:
+        try:
+            self._conn().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    # --- sliding window counter ------------------------------------------
+
+    def _window_info(self, conn, key: str, expiry: int, now: float) -> tuple[int, float, int, float]:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        counts = dict(conn.execute(
+            "SELECT key, value FROM counters WHERE key IN (?, ?) AND expires_at > ?",
+            (previous_key, current_key, now),
+        ).fetchall())
+        previous_count = counts.get(previous_key, 0)
+        current_count = counts.get(current_key, 0)
+        previous_ttl = 0.0 if previous_count == 0 else (1 - (((now - expiry) / expiry) % 1)) * expiry
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        now = time.time()
+        conn = self._conn()
+        self._maybe_purge(conn, now)
+        conn.execute("BEGIN IMMEDIATE")  # one writer at a time: read-check-increment is atomic
+        try:
+            previous_count, previous_ttl, current_count, _ = self._window_info(conn, key, expiry, now)
+            if floor(previous_count * previous_ttl / expiry + current_count) + amount > limit:
+                conn.execute("COMMIT")
+                return False
+            _, current_key = self.sliding_window_keys(key, expiry, now)
+            # The current window's counter is still needed as the next one's
+            # "previous": keep it for two windows.
+            conn.execute(
+                _INCR, {"key": current_key, "amount": amount, "expires_at": now + 2 * expiry, "now": now}
+            ).fetchall()
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_sliding_window(self, key: str, expiry: int) -> tuple[int, float, int, float]:
+        return self._window_info(self._conn(), key, expiry, time.time())
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self._conn().execute("DELETE FROM counters WHERE key IN (?, ?)", (previous_key, current_key))
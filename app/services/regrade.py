@@ -0,0 +1,360 @@
+"""Bulk regrade of an exercise's submissions after its tests change.
+
+A `RegradeJob` covers every submission of the exercise with an automated
+verdict (REGRADE_STATUSES) up to the newest id at the time the job was
+created; anything submitted later is already graded with the new tests.
+Teacher decisions (APPROVED / REJECTED) are left alone.
+
+The runner streams submissions in id order (keyset pagination on
+`cursor_id`, never OFFSET), grades each batch on a process pool and writes
+the batch back in one transaction together with the new cursor, so an
+interrupted job resumes after the last committed batch. A row that changed
+status in the meantime (e.g. a teacher approved it) is not overwritten.
+
+To keep live grading responsive the pool processes run niced, and the
+runner pauses between batches while more than REGRADE_MAX_LIVE_PENDING
+submissions are waiting to be graded.
+
+Ownership works like the grading job queue: a compare-and-set claim plus a
+heartbeat; a RUNNING job whose heartbeat is older than REGRADE_LEASE_SEC
+can be claimed by another runner.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Callable, Optional
+
+from flask import Flask, current_app
+
+from ..config import Config
+from ..extensions import db
+from ..models import Exercise, RegradeJob, Submission
+from .leaderboard import refresh_entry
+from .submissions import RESULT_FIELDS, evaluate_submission
+
+# Verdicts produced by the grader alone, which new tests may change.
+REGRADE_STATUSES = ("FAILED", "ERROR", "WAITING_APPROVAL")
+ACTIVE_STATUSES = ("QUEUED", "RUNNING")
+
+# Config forwarded to the pool processes (they build their own app).
+_WORKER_CONFIG_PREFIXES = ("GRADER_", "GRADE_", "BENCH_", "DOCKER_", "USE_DOCKER_", "EXEC_")
+
+
+def tests_sha(tests_py: str) -> str:
+    return hashlib.sha256((tests_py or "").encode("utf-8")).hexdigest()
+
+
+def _regradable(exercise_id: int):
+    return db.and_(
+        Submission.exercise_id == exercise_id,
+        Submission.status.in_(REGRADE_STATUSES),
+    )
+
+
+def start_regrade(ex: Exercise) -> RegradeJob:
+    """Create a job for `ex`'s current tests, cancelling older unfinished ones."""
+    now = datetime.utcnow()
+    db.session.execute(
+        db.update(RegradeJob)
+        .where(RegradeJob.exercise_id == ex.id, RegradeJob.status.in_(ACTIVE_STATUSES + ("FAILED",)))
+        .values(status="CANCELLED", finished_at=now, last_error="Superseded by a newer regrade.")
+    )
+    max_id = db.session.query(db.func.max(Submission.id)).filter(Submission.exercise_id == ex.id).scalar() or 0
+    total = Submission.query.filter(_regradable(ex.id), Submission.id <= max_id).count()
+    job = RegradeJob(
+        exercise_id=ex.id, tests_sha=tests_sha(ex.tests_py), status="QUEUED",
+        max_submission_id=max_id, total=total,
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def cancel_regrade(job_id: int) -> bool:
+    res = db.session.execute(
+        db.update(RegradeJob)
+        .where(RegradeJob.id == job_id, RegradeJob.status.in_(ACTIVE_STATUSES + ("FAILED",)))
+        .values(status="CANCELLED", finished_at=datetime.utcnow())
+    )
+    db.session.commit()
+    return res.rowcount == 1
+
+
+def resume_regrade(job_id: int) -> bool:
+    """Requeue a FAILED job, or a RUNNING one whose runner stopped heartbeating."""
+    res = db.session.execute(
+        db.update(RegradeJob)
+        .where(RegradeJob.id == job_id, db.or_(RegradeJob.status == "FAILED", _stale(datetime.utcnow())))
+        .values(status="QUEUED", worker_id=None, finished_at=None, last_error="")
+    )
+    db.session.commit()
+    return res.rowcount == 1
+
+
+def _stale(now: datetime):
+    cutoff = now - timedelta(seconds=current_app.config.get("REGRADE_LEASE_SEC", 120))
+    return db.and_(
+        RegradeJob.status == "RUNNING",
+        db.or_(RegradeJob.heartbeat_at.is_(None), RegradeJob.heartbeat_at < cutoff),
+    )
+
+
+def _claimable(now: datetime):
+    return db.or_(RegradeJob.status == "QUEUED", _stale(now))
+
+
+def next_claimable() -> Optional[int]:
+    row = (
+        db.session.query(RegradeJob.id)
+        .filter(_claimable(datetime.utcnow()))
+        .order_by(RegradeJob.id.asc())
+        .first()
+    )
+    db.session.rollback()
+    return row[0] if row else None
+
+
+def claim_regrade(job_id: int, worker_id: str) -> bool:
+    now = datetime.utcnow()
+    res = db.session.execute(
+        db.update(RegradeJob)
+        .where(RegradeJob.id == job_id, _claimable(now))
+        .values(
+            status="RUNNING", worker_id=worker_id, heartbeat_at=now, finished_at=None,
+            started_at=db.func.coalesce(RegradeJob.started_at, now),
+        )
+    )
+    db.session.commit()
+    return res.rowcount == 1
+
+
+def _owned(job_id: int, worker_id: str):
+    return db.and_(RegradeJob.id == job_id, RegradeJob.worker_id == worker_id, RegradeJob.status == "RUNNING")
+
+
+def _heartbeat(job_id: int, worker_id: str) -> bool:
+    res = db.session.execute(
+        db.update(RegradeJob).where(_owned(job_id, worker_id)).values(heartbeat_at=datetime.utcnow())
+    )
+    db.session.commit()
+    return res.rowcount == 1
+
+
+def _finish(job_id: int, worker_id: str, status: str, error: str = "") -> None:
+    values = {"status": status, "last_error": error}
+    if status == "QUEUED":
+        values["worker_id"] = None
+    else:
+        values["finished_at"] = datetime.utcnow()
+    db.session.execute(db.update(RegradeJob).where(_owned(job_id, worker_id)).values(**values))
+    db.session.commit()
+
+
+def regrade_status(job: RegradeJob) -> dict:
+    """Progress and throughput of one job, for the admin UI and JSON."""
+    rate = job.rate_per_sec or 0
+    remaining = max(0, (job.total or 0) - (job.done or 0))
+    return {
+        "id": job.id,
+        "exercise_id": job.exercise_id,
+        "exercise": job.exercise.title if job.exercise else "",
+        "status": job.status,
+        "total": job.total,
+        "done": job.done,
+        "changed": job.changed,
+        "percent": round(100 * job.done / job.total, 1) if job.total else 100.0,
+        "rate_per_sec": round(rate, 2),
+        "eta_sec": int(remaining / rate) if rate and job.status == "RUNNING" else None,
+        "last_error": job.last_error or "",
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+# --- pool processes --------------------------------------------------------
+
+def _init_worker(config: dict, niceness: int) -> None:
+    try:
+        os.nice(niceness)
+    except OSError:
+        pass
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(config)
+    app.app_context().push()
+
+
+def _grade_one(code_py: str, ex_fields: dict) -> dict:
+    return evaluate_submission(code_py, SimpleNamespace(**ex_fields))
+
+
+def _worker_config(cfg) -> dict:
+    out = {k: v for k, v in cfg.items() if k.startswith(_WORKER_CONFIG_PREFIXES)}
+    # each pool process grades one submission at a time
+    out["GRADER_POOL_SIZE"] = min(1, cfg.get("GRADER_POOL_SIZE", 0))
+    return out
+
+
+def _make_pool(workers: int) -> ProcessPoolExecutor:
+    cfg = current_app.config
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(_worker_config(cfg), cfg.get("REGRADE_NICE", 10)),
+    )
+
+
+# --- runner ----------------------------------------------------------------
+
+def _live_backlog() -> int:
+    n = Submission.query.filter_by(status="PENDING").count()
+    db.session.rollback()
+    return n
+
+
+def _next_batch(job: RegradeJob, size: int) -> list:
+    return (
+        db.session.query(Submission.id, Submission.student_id, Submission.status, Submission.code_py)
+        .filter(
+            _regradable(job.exercise_id),
+            Submission.id > job.cursor_id,
+            Submission.id <= job.max_submission_id,
+        )
+        .order_by(Submission.id.asc())
+        .limit(size)
+        .all()
+    )
+
+
+def _write_batch(job_id: int, worker_id: str, ex: Exercise, rows: list, results: list, rate: float) -> bool:
+    """Store one batch of verdicts and advance the cursor atomically."""
+    changed = sum(1 for row, new in zip(rows, results) if new["status"] != row.status)
+    claimed = db.session.execute(
+        db.update(RegradeJob)
+        .where(_owned(job_id, worker_id))
+        .values(
+            cursor_id=rows[-1].id,
+            done=RegradeJob.done + len(rows),
+            changed=RegradeJob.changed + changed,
+            rate_per_sec=rate,
+            heartbeat_at=datetime.utcnow(),
+        )
+    )
+    if claimed.rowcount != 1:  # cancelled, or another runner took over
+        db.session.rollback()
+        return False
+
+    table = Submission.__table__
+    stmt = table.update().where(table.c.id == db.bindparam("b_id"), table.c.status == db.bindparam("b_old"))
+    db.session.execute(stmt, [{"b_id": row.id, "b_old": row.status, **new} for row, new in zip(rows, results)])
+    if ex.bench_enabled:
+        for student_id in {row.student_id for row in rows}:
+            refresh_entry(student_id, ex.id)
+    db.session.commit()
+    return True
+
+
+def _wait_all(futures: list, job_id: int, worker_id: str, interval: float) -> bool:
+    """Wait for a batch, heartbeating meanwhile. False if the job was lost."""
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=interval, return_when=FIRST_EXCEPTION)
+        for f in done:
+            f.result()  # re-raise a pool failure
+        if pending and not _heartbeat(job_id, worker_id):
+            return False
+    return True
+
+
+def run_regrade(job_id: int, worker_id: str, workers: int = None, batch_size: int = None,
+                stop: threading.Event = None, log: Callable[[str], None] = None) -> str:
+    """Claim and run one job until it is done, cancelled, lost or `stop` is set.
+
+    Returns the job's status afterwards ("QUEUED" when stopped early, so it
+    can be resumed), or "" if the job could not be claimed.
+    """
+    cfg = current_app.config
+    workers = max(1, workers or cfg.get("REGRADE_WORKERS", 2))
+    batch_size = max(1, batch_size or cfg.get("REGRADE_BATCH_SIZE", 25))
+    max_live = cfg.get("REGRADE_MAX_LIVE_PENDING", 3)
+    backoff = cfg.get("REGRADE_BACKOFF_SEC", 2)
+    interval = max(1.0, cfg.get("REGRADE_LEASE_SEC", 120) / 3)
+    stop = stop or threading.Event()
+    log = log or (lambda _msg: None)
+
+    if not claim_regrade(job_id, worker_id):
+        return ""
+
+    started, processed = time.monotonic(), 0
+    try:
+        with _make_pool(workers) as pool:
+            while True:
+                db.session.rollback()  # see other writers' commits
+                job = db.session.get(RegradeJob, job_id)
+                if job is None or job.status != "RUNNING" or job.worker_id != worker_id:
+                    return job.status if job else ""
+                if stop.is_set():
+                    _finish(job_id, worker_id, "QUEUED")
+                    return "QUEUED"
+                ex = job.exercise
+                if ex is None or tests_sha(ex.tests_py) != job.tests_sha:
+                    _finish(job_id, worker_id, "CANCELLED", "The exercise's tests changed again.")
+                    return "CANCELLED"
+
+                rows = _next_batch(job, batch_size)
+                if not rows:
+                    _finish(job_id, worker_id, "DONE")
+                    log(f"job {job_id}: done, {job.done}/{job.total} regraded, {job.changed} changed")
+                    return "DONE"
+
+                # Throttle: let live grading drain before taking more CPU.
+                if max_live >= 0 and _live_backlog() > max_live:
+                    if not _heartbeat(job_id, worker_id):
+                        continue
+                    stop.wait(backoff)
+                    continue
+
+                ex_fields = {c.name: getattr(ex, c.name) for c in Exercise.__table__.columns}
+                futures = [pool.submit(_grade_one, row.code_py, ex_fields) for row in rows]
+                if not _wait_all(futures, job_id, worker_id, interval):
+                    continue
+                results = [{k: f.result()[k] for k in RESULT_FIELDS} for f in futures]
+
+                processed += len(rows)
+                rate = processed / max(time.monotonic() - started, 1e-6)
+                done, total = job.done + len(rows), job.total
+                if not _write_batch(job_id, worker_id, ex, rows, results, rate):
+                    continue
+                log(f"job {job_id}: {done}/{total} ({rate:.1f}/s)")
+    except Exception as e:
+        db.session.rollback()
+        _finish(job_id, worker_id, "FAILED", str(e) or e.__class__.__name__)
+        return "FAILED"
+
+
+def launch_in_background(job_id: int) -> threading.Thread:
+    """Run a job on a daemon thread of this (web) process."""
+    app = current_app._get_current_object()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:web"
+
+    def _run():
+        with app.app_context():
+            try:
+                run_regrade(job_id, worker_id)
+            finally:
+                db.session.remove()
+
+    t = threading.Thread(target=_run, name=f"regrade-{job_id}", daemon=True)
+    t.start()
+    return t
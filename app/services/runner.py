@@ -1,35 +1,107 @@
-import os, sys, tempfile, subprocess, time
-from flask import current_app
-
-def run_python(code_py: str, stdin_text: str = ""):
-    start = time.perf_counter()
-    with tempfile.TemporaryDirectory() as td:
-        sol = os.path.join(td, "solution.py")
-        with open(sol, "w", encoding="utf-8") as f:
-            f.write(code_py)
-
-        try:
-            p = subprocess.run(
-                [sys.executable, sol],
-                cwd=td,
-                input=stdin_text,
-                capture_output=True,
-                text=True,
-                timeout=current_app.config.get("RUN_TIMEOUT_SEC", 100),
-                env={**os.environ, "PYTHONUNBUFFERED": "1"},
-            )
-            runtime_ms = int((time.perf_counter() - start) * 1000)
-            out = (p.stdout or "")
-            err = (p.stderr or "")
-            return {
-                "status": "OK" if p.returncode == 0 else "RUNTIME_ERROR",
-                "runtime_ms": runtime_ms,
-                "stdout": out,
-                "stderr": err,
-            }
-        except subprocess.TimeoutExpired:
-            runtime_ms = int((time.perf_counter() - start) * 1000)
-            return {"status": "TIMEOUT", "runtime_ms": runtime_ms, "stdout": "", "stderr": "TIMEOUT"}
-        except Exception as e:
-            runtime_ms = int((time.perf_counter() - start) * 1000)
-            return {"status": "ERROR", "runtime_ms": runtime_ms, "stdout": "", "stderr": str(e)}
+import os, sys, subprocess, time
+from flask import current_app
+from .sandbox import run_limited, stream_limited
+from .workspace import get_workspaces, workspace
+
+def run_python(code_py: str, stdin_text: str = "", memory_limit_mb: int = None):
+    cfg = current_app.config
+    start = time.perf_counter()
+    with workspace() as ws:
+        sol = ws.write("solution.py", code_py)
+
+        try:
+            p = run_limited(
+                [sys.executable, sol],
+                cwd=ws.path,
+                stdin_text=stdin_text,
+                timeout=cfg.get("RUN_TIMEOUT_SEC", 15),
+                cpu_ms=cfg.get("RUN_CPU_LIMIT_SEC", 5) * 1000,
+                memory_mb=memory_limit_mb or cfg.get("RUN_MEMORY_LIMIT_MB", 256),
+                env={**os.environ, "PYTHONUNBUFFERED": "1"},
+                max_output=cfg.get("RUN_OUTPUT_MAX_BYTES", 64 * 1024),
+            )
+            runtime_ms = int((time.perf_counter() - start) * 1000)
+            stderr = p["stderr"]
+            if p["truncated"]:
+                status = "OUTPUT_LIMIT"
+                stderr += f"\n[output truncated at {cfg.get('RUN_OUTPUT_MAX_BYTES', 64 * 1024)} bytes; program stopped]"
+            elif p["cpu_exceeded"]:
+                status = "TIMEOUT"
+                stderr = stderr or "CPU time limit exceeded"
+            else:
+                status = "OK" if p["returncode"] == 0 else "RUNTIME_ERROR"
+            return {
+                "status": status,
+                "runtime_ms": runtime_ms,
+                "cpu_ms": p["cpu_ms"],
+                "peak_rss_kb": p["peak_rss_kb"],
+                "stdout": p["stdout"],
+                "stderr": stderr,
+            }
+        except subprocess.TimeoutExpired:
+            runtime_ms = int((time.perf_counter() - start) * 1000)
+            return {"status": "TIMEOUT", "runtime_ms": runtime_ms, "stdout": "", "stderr": "TIMEOUT"}
+        except Exception as e:
+            runtime_ms = int((time.perf_counter() - start) * 1000)
+            return {"status": "ERROR", "runtime_ms": runtime_ms, "stdout": "", "stderr": str(e)}
+
+
+def stream_python(code_py: str, stdin_text: str = "", memory_limit_mb: int = None):
+    """Streaming variant of run_python for the terminal.
+
+    Reads the config now and returns a generator of (event, data):
+    ("stdout" | "stderr", text) as the program prints, ("ping", None)
+    while it is quiet, then ("done", {"status", "runtime_ms", "cpu_ms",
+    "peak_rss_kb", "truncated"}). Closing the generator kills the program.
+    """
+    cfg = current_app.config
+    limits = dict(
+        timeout=cfg.get("RUN_TIMEOUT_SEC", 15),
+        cpu_ms=cfg.get("RUN_CPU_LIMIT_SEC", 5) * 1000,
+        memory_mb=memory_limit_mb or cfg.get("RUN_MEMORY_LIMIT_MB", 256),
+        max_bytes=cfg.get("RUN_OUTPUT_MAX_BYTES", 64 * 1024),
+        heartbeat_sec=cfg.get("RUN_STREAM_HEARTBEAT_SEC", 2),
+    )
+    return _stream(code_py, stdin_text, limits, get_workspaces())
+
+
+def _stream(code_py: str, stdin_text: str, limits: dict, workspaces):
+    start = time.perf_counter()
+    with workspaces.use() as ws:
+        sol = ws.write("solution.py", code_py)
+
+        info = None
+        try:
+            for event, data in stream_limited(
+                [sys.executable, sol], cwd=ws.path, stdin_text=stdin_text,
+                env={**os.environ, "PYTHONUNBUFFERED": "1"}, **limits,
+            ):
+                if event == "exit":
+                    info = data
+                else:
+                    yield event, data
+        except Exception as e:
+            yield "stderr", str(e)
+
+    runtime_ms = int((time.perf_counter() - start) * 1000)
+    if info is None:
+        status = "ERROR"
+    elif info["truncated"]:
+        status = "OUTPUT_LIMIT"
+    elif info["timeout"] or info["cpu_exceeded"]:
+        status = "TIMEOUT"
+    else:
+        status = "OK" if info["returncode"] == 0 else "RUNTIME_ERROR"
+    if info and info["truncated"]:
+        yield "stderr", f"\n[output truncated at {limits['max_bytes']} bytes; program stopped]"
+    elif info and info["cpu_exceeded"]:
+        yield "stderr", "CPU time limit exceeded"
+    elif info and info["timeout"]:
+        yield "stderr", "TIMEOUT"
+    yield "done", {
+        "status": status,
+        "runtime_ms": runtime_ms,
+        "cpu_ms": info["cpu_ms"] if info else None,
+        "peak_rss_kb": info["peak_rss_kb"] if info else None,
+        "truncated": bool(info and info["truncated"]),
+    }
@@ -0,0 +1,367 @@
+"""Resource limits and accounting for grading / "Run" child processes.
+
+Limits are applied with setrlimit in the child (RLIMIT_CPU for CPU time,
+RLIMIT_AS for address space); the parent reaps it with os.wait4 to get the
+child's real CPU time instead of wall-clock time that includes waiting on
+the machine.
+
+Peak RSS is sampled from /proc/<pid>/status (VmHWM) while the child runs:
+Linux carries the forking process's RSS over into ru_maxrss across exec,
+so for a child of the web process ru_maxrss would report the web process's
+size. ru_maxrss is only used where /proc is not available.
+
+Also imported as a plain module by pool_worker.py (same directory), so it
+must not import the Flask app.
+"""
+
+from __future__ import annotations
+
+import codecs
+import math
+import os
+import selectors
+import signal
+import subprocess
+import tempfile
+import time
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, fall back to wall-clock only
+    resource = None
+
+
+def supported() -> bool:
+    return resource is not None and hasattr(os, "wait4")
+
+
+def cpu_limit_sec(cpu_ms: Optional[int]) -> Optional[int]:
+    # RLIMIT_CPU has one-second granularity; the exact budget is checked
+    # against the measured cpu_ms afterwards.
+    if not cpu_ms:
+        return None
+    return max(1, math.ceil(cpu_ms / 1000))
+
+
+def set_limits(cpu_ms: Optional[int] = None, memory_mb: Optional[int] = None,
+               file_bytes: Optional[int] = None) -> None:
+    """Apply the limits to the current process. Call in the child only.
+
+    `file_bytes` caps the size of any file written (RLIMIT_FSIZE, SIGXFSZ
+    past it); used where output goes to a file instead of a pipe.
+    """
+    if resource is None:
+        return
+    if file_bytes:
+        resource.setrlimit(resource.RLIMIT_FSIZE, (file_bytes, file_bytes))
+        # Python starts with SIGXFSZ ignored (writes then fail with EFBIG);
+        # restore the default so the child is killed at the cap.
+        signal.signal(signal.SIGXFSZ, signal.SIG_DFL)
+    sec = cpu_limit_sec(cpu_ms)
+    if sec:
+        # SIGXCPU at the soft limit, SIGKILL one second later.
+        resource.setrlimit(resource.RLIMIT_CPU, (sec, sec + 1))
+    if memory_mb:
+        size = int(memory_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (size, size))
+
+
+def usage(ru, peak_rss_kb: Optional[int] = None) -> dict:
+    """cpu_ms / peak_rss_kb from a wait4() rusage (ru_maxrss is KiB on Linux)."""
+    return {
+        "cpu_ms": int((ru.ru_utime + ru.ru_stime) * 1000),
+        "peak_rss_kb": peak_rss_kb if peak_rss_kb is not None else int(ru.ru_maxrss),
+    }
+
+
+def _vm_hwm_kb(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _kill_group(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def wait_with_usage(pid: int, timeout: float):
+    """Reap `pid`, killing its process group after `timeout` seconds.
+
+    Whatever the child left running in its group is killed once it exits:
+    the job's workspace is reused, so nothing may keep writing to it.
+    Returns (status, timed_out, rusage, peak_rss_kb); peak_rss_kb is None if
+    it could not be sampled.
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.001
+    peak = None
+    while True:
+        hwm = _vm_hwm_kb(pid)
+        if hwm is not None:
+            peak = max(peak or 0, hwm)
+        wpid, status, ru = os.wait4(pid, os.WNOHANG)
+        if wpid:
+            _kill_group(pid)
+            return status, False, ru, peak
+        if time.monotonic() >= deadline:
+            _kill_group(pid)
+            _, status, ru = os.wait4(pid, 0)
+            return status, True, ru, peak
+        time.sleep(delay)
+        delay = min(delay * 2, 0.02)
+
+
+def cpu_exceeded(status: int) -> bool:
+    """True if the child was stopped by RLIMIT_CPU (SIGXCPU, or SIGKILL at the hard limit)."""
+    return os.WIFSIGNALED(status) and os.WTERMSIG(status) in (signal.SIGXCPU, signal.SIGKILL)
+
+
+class OutputCapture:
+    """Bounded text buffer: keeps the first and last `keep // 2` characters.
+
+    Memory stays at about `keep` however much is written; getvalue() puts a
+    marker with the number of characters dropped between head and tail.
+    `keep=None` keeps everything.
+    """
+
+    def __init__(self, keep: Optional[int] = None):
+        self.half = None if keep is None else max(1, keep // 2)
+        self.head = []
+        self.head_len = 0
+        self.tail = ""
+        self.total = 0
+
+    def write(self, text: str) -> None:
+        self.total += len(text)
+        if self.half is None or self.head_len < self.half:
+            take = text if self.half is None else text[: self.half - self.head_len]
+            self.head.append(take)
+            self.head_len += len(take)
+            text = text[len(take):]
+        if text:
+            self.tail = (self.tail + text)[-self.half:]
+
+    @property
+    def omitted(self) -> int:
+        return self.total - self.head_len - len(self.tail)
+
+    def getvalue(self) -> str:
+        head = "".join(self.head)
+        if not self.omitted:
+            return head + self.tail
+        return f"{head}\n\n... [{self.omitted} characters omitted] ...\n\n{self.tail}"
+
+
+def read_head_tail(f, keep: Optional[int]) -> str:
+    """Decode a captured-output file, keeping head and tail like OutputCapture."""
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    if keep is None or size <= keep:
+        return f.read().decode("utf-8", errors="replace")
+    half = max(1, keep // 2)
+    head = f.read(half).decode("utf-8", errors="replace")
+    f.seek(size - half)
+    tail = f.read(half).decode("utf-8", errors="replace")
+    return f"{head}\n\n... [{size - 2 * half} bytes omitted] ...\n\n{tail}"
+
+
+def output_exceeded(status: int) -> bool:
+    """True if the child was killed by RLIMIT_FSIZE (its output file hit the cap)."""
+    return os.WIFSIGNALED(status) and os.WTERMSIG(status) == getattr(signal, "SIGXFSZ", None)
+
+
+def run_limited(
+    cmd: list,
+    cwd: Optional[str],
+    timeout: float,
+    cpu_ms: Optional[int] = None,
+    memory_mb: Optional[int] = None,
+    stdin_text: str = "",
+    env: Optional[dict] = None,
+    max_output: Optional[int] = None,
+    keep_output: Optional[int] = None,
+) -> dict:
+    """Run `cmd` under the limits and return its output and resource usage.
+
+    Output is read from pipes as it is produced. Past `max_output` bytes
+    (stdout + stderr) the child is killed and "truncated" is set; each
+    stream keeps at most `keep_output` characters (head and tail, see
+    OutputCapture), so memory stays bounded whatever the child prints.
+
+    Returns {"returncode", "timeout", "cpu_exceeded", "truncated", "stdout",
+    "stderr", "cpu_ms", "peak_rss_kb"}; the last two are None where wait4
+    is missing. Raises subprocess.TimeoutExpired on the wall-clock timeout.
+    """
+    if not supported():
+        p = subprocess.run(
+            cmd, cwd=cwd, input=stdin_text, capture_output=True, text=True, timeout=timeout, env=env
+        )
+        return {
+            "returncode": p.returncode, "timeout": False, "cpu_exceeded": False, "truncated": False,
+            "stdout": p.stdout or "", "stderr": p.stderr or "",
+            "cpu_ms": None, "peak_rss_kb": None,
+        }
+
+    keep = keep_output if keep_output is not None else max_output
+    captured = {"stdout": OutputCapture(keep), "stderr": OutputCapture(keep)}
+    info = {}
+    for event, data in stream_limited(
+        cmd, cwd, timeout, cpu_ms, memory_mb, stdin_text, env, max_bytes=max_output
+    ):
+        if event == "exit":
+            info = data
+        else:
+            captured[event].write(data)
+    if info["timeout"]:
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    return {
+        **info,
+        "stdout": captured["stdout"].getvalue(),
+        "stderr": captured["stderr"].getvalue(),
+    }
+
+
+def stream_limited(
+    cmd: list,
+    cwd: Optional[str],
+    timeout: float,
+    cpu_ms: Optional[int] = None,
+    memory_mb: Optional[int] = None,
+    stdin_text: str = "",
+    env: Optional[dict] = None,
+    max_bytes: Optional[int] = None,
+    heartbeat_sec: Optional[float] = None,
+):
+    """Like run_limited, but yields the output while the child runs.
+
+    Yields ("stdout" | "stderr", text) chunks as they arrive, ("ping", None)
+    after `heartbeat_sec` without output (so the caller writes something and
+    notices a closed connection), and finally ("exit", {"returncode",
+    "timeout", "cpu_exceeded", "truncated", "cpu_ms", "peak_rss_kb"}).
+
+    Output past `max_bytes` (stdout + stderr) is dropped and the child is
+    killed; files it writes are capped at the same size. Closing the generator early (client went away) kills the
+    child's process group.
+    """
+    if not supported():
+        try:
+            p = run_limited(cmd, cwd, timeout, cpu_ms, memory_mb, stdin_text, env)
+        except subprocess.TimeoutExpired:
+            yield "exit", {"returncode": None, "timeout": True, "cpu_exceeded": False,
+                           "truncated": False, "cpu_ms": None, "peak_rss_kb": None}
+            return
+        for name in ("stdout", "stderr"):
+            if p[name]:
+                yield name, p[name][:max_bytes] if max_bytes else p[name]
+        info = {k: p[k] for k in ("returncode", "timeout", "cpu_exceeded", "cpu_ms", "peak_rss_kb")}
+        info["truncated"] = bool(max_bytes) and len(p["stdout"]) + len(p["stderr"]) > max_bytes
+        yield "exit", info
+        return
+
+    with tempfile.TemporaryFile() as fin:
+        fin.write(stdin_text.encode("utf-8"))
+        fin.seek(0)
+        p = subprocess.Popen(
+            cmd,
+            cwd=cwd,
+            stdin=fin,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env,
+            start_new_session=True,
+            # The file cap also covers output the child sends to a file
+            # (pytest captures test output in temporary files).
+            preexec_fn=lambda: set_limits(cpu_ms, memory_mb, max_bytes),
+        )
+    reaped = False
+    sel = selectors.DefaultSelector()
+    try:
+        sel.register(p.stdout, selectors.EVENT_READ, "stdout")
+        sel.register(p.stderr, selectors.EVENT_READ, "stderr")
+        decoders = {n: codecs.getincrementaldecoder("utf-8")(errors="replace") for n in ("stdout", "stderr")}
+        deadline = time.monotonic() + timeout
+        last_yield = time.monotonic()
+        sent, peak = 0, None
+        timed_out = truncated = False
+        exited = None  # (status, rusage) if reaped while the pipes were open
+
+        while sel.get_map() and not truncated:
+            now = time.monotonic()
+            if now >= deadline:
+                timed_out = True
+                break
+            hwm = _vm_hwm_kb(p.pid)
+            if hwm is not None:
+                peak = max(peak or 0, hwm)
+            ready = sel.select(timeout=min(0.02, deadline - now))
+            if not ready:
+                # Quiet: if the child is gone and only something it spawned
+                # keeps the pipes open, stop here instead of at the timeout.
+                wpid, st, r = os.wait4(p.pid, os.WNOHANG)
+                if wpid:
+                    exited = (st, r)
+                    break
+            for key, _ in ready:
+                data = os.read(key.fileobj.fileno(), 65536)
+                if not data:
+                    sel.unregister(key.fileobj)
+                    continue
+                if max_bytes is not None and sent + len(data) > max_bytes:
+                    data = data[: max_bytes - sent]
+                    truncated = True
+                sent += len(data)
+                text = decoders[key.data].decode(data, final=truncated)
+                if text:
+                    yield key.data, text
+                    last_yield = time.monotonic()
+                if truncated:
+                    break
+            if heartbeat_sec and time.monotonic() - last_yield >= heartbeat_sec:
+                yield "ping", None
+                last_yield = time.monotonic()
+
+        if not (timed_out or truncated):
+            for name, dec in decoders.items():
+                tail = dec.decode(b"", final=True)
+                if tail:
+                    yield name, tail
+        if exited:
+            status, ru = exited
+            _kill_group(p.pid)  # leftovers of the student's process group
+        elif timed_out or truncated:
+            _kill_group(p.pid)
+            _, status, ru = os.wait4(p.pid, 0)
+        else:
+            status, timed_out, ru, hwm = wait_with_usage(p.pid, max(0.0, deadline - time.monotonic()))
+            if hwm is not None:
+                peak = max(peak or 0, hwm)
+        reaped = True
+        p.returncode = os.waitstatus_to_exitcode(status)
+        yield "exit", {
+            "returncode": p.returncode,
+            "timeout": timed_out,
+            "cpu_exceeded": not (timed_out or truncated) and cpu_exceeded(status),
+            "truncated": truncated or output_exceeded(status),
+            **usage(ru, peak),
+        }
+    finally:
+        sel.close()
+        if not reaped:
+            _kill_group(p.pid)
+            try:
+                _, status, _ = os.wait4(p.pid, 0)
+                p.returncode = os.waitstatus_to_exitcode(status)
+            except ChildProcessError:
+                pass
+        p.stdout.close()
+        p.stderr.close()
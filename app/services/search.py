@@ -0,0 +1,275 @@
+"""Full-text search over users, lessons and exercises.
+
+On SQLite the `search_index` FTS5 table holds one row per user (username),
+lesson (title, content) and exercise (title, prompt). The row's rowid
+encodes what it points at: id * 4 + kind. Triggers on the three tables keep
+it in sync with every write, ORM or raw SQL, and update one index row by
+rowid. Results are ranked with bm25, with titles weighted over text.
+Every query word is a prefix ("pyth lo" finds "Python loops"), which the
+2- and 3-character prefix indexes keep cheap for type-ahead.
+
+Other databases, or SQLite builds without FTS5, fall back to LIKE
+matching (every word, anywhere in the same fields), ordered by title.
+
+Users are filtered by role inside the query (`user_scope`): admins find
+everyone, teachers their own students, students their teacher. `suggest`
+serves the type-ahead box with id/label pairs of one kind, cached per
+process for SEARCH_SUGGEST_TTL_SEC by (scope, kind, prefix); students of
+one teacher share a scope, and lessons and exercises are one shared scope.
+
+`python -m app.search_index --rebuild` repopulates the index from the
+tables, e.g. after restoring a backup made without the triggers.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+
+from flask import current_app
+
+from ..extensions import db
+from ..models import Exercise, Lesson, Role, User
+
+USER, LESSON, EXERCISE = 1, 2, 3
+
+# (kind, table, title column, text column or '' for none)
+_SOURCES = (
+    (USER, "user", "username", "''"),
+    (LESSON, "lesson", "title", "content"),
+    (EXERCISE, "exercise", "title", "prompt"),
+)
+_MODELS = {USER: User, LESSON: Lesson, EXERCISE: Exercise}
+_LIKE_FIELDS = {USER: (User.username,), LESSON: (Lesson.title, Lesson.content), EXERCISE: (Exercise.title, Exercise.prompt)}
+
+_MAX_TERMS = 8
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+_fts_ready: Optional[bool] = None
+
+
+class Scope(NamedTuple):
+    key: str  # cache key: users with the same key see the same users
+    users: Optional[tuple]  # filters on User; None = every user
+
+
+def _triggers(kind: int, table: str, title: str, text: str) -> list:
+    def row(ref):
+        t = f"{ref}.{text}" if text != "''" else text
+        return f"INSERT INTO search_index (rowid, title, body) VALUES ({ref}.id * 4 + {kind}, {ref}.{title}, {t});"
+
+    changed = f"{title}, {text}" if text != "''" else title
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS search_{table}_ai AFTER INSERT ON \"{table}\" BEGIN {row('new')} END",
+        f"CREATE TRIGGER IF NOT EXISTS search_{table}_au AFTER UPDATE OF {changed} ON \"{table}\" BEGIN "
+        f"DELETE FROM search_index WHERE rowid = old.id * 4 + {kind}; {row('new')} END",
+        f"CREATE TRIGGER IF NOT EXISTS search_{table}_ad AFTER DELETE ON \"{table}\" BEGIN "
+        f"DELETE FROM search_index WHERE rowid = old.id * 4 + {kind}; END",
+    ]
+
+
+def ensure_search_index() -> bool:
+    """Create the FTS table and its triggers if missing (SQLite only);
+    a new table is filled from the existing rows. Returns True if FTS is used."""
+    global _fts_ready
+    if db.engine.url.drivername != "sqlite":
+        _fts_ready = False
+        return False
+    exists = db.session.execute(
+        db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'")
+    ).first()
+    try:
+        db.session.execute(db.text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "title, body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        ))
+    except Exception:  # SQLite built without FTS5
+        db.session.rollback()
+        _fts_ready = False
+        return False
+    for source in _SOURCES:
+        for ddl in _triggers(*source):
+            db.session.execute(db.text(ddl))
+    db.session.commit()
+    _fts_ready = True
+    if not exists:
+        rebuild_search_index()
+    return True
+
+
+def rebuild_search_index() -> dict:
+    """Refill the index from the tables. Returns rows indexed per table."""
+    counts = {}
+    db.session.execute(db.text("DELETE FROM search_index"))
+    for kind, table, title, text in _SOURCES:
+        t = text if text == "''" else f"COALESCE({text}, '')"
+        counts[table] = db.session.execute(db.text(
+            f"INSERT INTO search_index (rowid, title, body) "
+            f"SELECT id * 4 + {kind}, COALESCE({title}, ''), {t} FROM \"{table}\""
+        )).rowcount
+    db.session.execute(db.text("INSERT INTO search_index (search_index) VALUES ('optimize')"))
+    db.session.commit()
+    return counts
+
+
+def index_counts() -> dict:
+    rows = db.session.execute(db.text("SELECT rowid % 4, COUNT(*) FROM search_index GROUP BY rowid % 4")).all()
+    by_kind = dict(rows)
+    return {table: by_kind.get(kind, 0) for kind, table, _, _ in _SOURCES}
+
+
+def _terms(q: str) -> list:
+    return _WORD.findall(q.lower())[:_MAX_TERMS]
+
+
+def user_scope(user) -> Scope:
+    """Which users `user` may find: admins everyone, teachers their own
+    students, students their teacher. Lessons and exercises are not scoped."""
+    if user.role == Role.ADMIN:
+        return Scope("all", None)
+    if user.role == Role.TEACHER:
+        return Scope(f"teacher:{user.id}", (User.role == Role.STUDENT, User.created_by_id == user.id))
+    if user.created_by_id is not None:
+        return Scope(f"user:{user.created_by_id}", (User.id == user.created_by_id,))
+    return Scope("none", (db.false(),))
+
+
+def _fts_ids(match: str, limit: int, scope: Scope, kinds: tuple) -> dict:
+    si = db.table("search_index", db.column("rowid"))
+    hits = db.select(si.c.rowid, db.func.bm25(db.literal_column("search_index"), 10.0, 1.0).label("score")).where(
+        db.text("search_index MATCH :q").bindparams(q=match)
+    )
+    if len(kinds) < len(_MODELS):
+        hits = hits.where((si.c.rowid % 4).in_(kinds))
+    if scope.users is not None and USER in kinds:
+        allowed = db.select(User.id * 4 + USER).where(*scope.users)
+        hits = hits.where(db.or_(si.c.rowid % 4 != USER, si.c.rowid.in_(allowed)))
+    hits = hits.subquery()
+    # One MATCH for all kinds; row_number keeps the best `limit` of each.
+    ranked = db.select(
+        hits.c.rowid, db.func.row_number().over(partition_by=hits.c.rowid % 4, order_by=hits.c.score).label("n")
+    ).subquery()
+    rows = db.session.execute(db.select(ranked.c.rowid).where(ranked.c.n <= limit).order_by(ranked.c.n)).all()
+    ids: dict = {kind: [] for kind in kinds}
+    for (rowid,) in rows:
+        ids.setdefault(rowid % 4, []).append(rowid // 4)
+    return ids
+
+
+def _like_ids(terms: list, limit: int, scope: Scope, kinds: tuple) -> dict:
+    ids = {}
+    for kind in kinds:
+        model, fields = _MODELS[kind], _LIKE_FIELDS[kind]
+        q = db.session.query(model.id)
+        if kind == USER and scope.users is not None:
+            q = q.filter(*scope.users)
+        for term in terms:
+            q = q.filter(db.or_(*(f.ilike(f"%{term}%") for f in fields)))
+        ids[kind] = [r[0] for r in q.order_by(fields[0].asc()).limit(limit).all()]
+    return ids
+
+
+def _ranked_ids(terms: list, limit: int, scope: Scope, kinds: tuple) -> dict:
+    if _fts_ready is None:
+        ensure_search_index()
+    if _fts_ready:
+        return _fts_ids(" ".join(f'"{t}"*' for t in terms), limit, scope, kinds)
+    return _like_ids(terms, limit, scope, kinds)
+
+
+def search(q: str, scope: Scope, limit: int = 30) -> dict:
+    """{"users", "lessons", "exercises"}: up to `limit` matches each, best
+    first; users only within `scope` (see `user_scope`)."""
+    out = {"users": [], "lessons": [], "exercises": []}
+    terms = _terms(q)
+    if not terms:
+        return out
+    ids = _ranked_ids(terms, limit, scope, (USER, LESSON, EXERCISE))
+    for kind, key in ((USER, "users"), (LESSON, "lessons"), (EXERCISE, "exercises")):
+        if not ids.get(kind):
+            continue
+        model = _MODELS[kind]
+        found = {obj.id: obj for obj in model.query.filter(model.id.in_(ids[kind])).all()}
+        out[key] = [found[i] for i in ids[kind] if i in found]
+    return out
+
+
+class SuggestCache:
+    """(scope, kind, prefix) -> [{"id", "label"}], kept `ttl` seconds, at most
+    `max_entries` per process. Entries are not invalidated: a new or renamed
+    row shows up in suggestions within the TTL."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[tuple, tuple[float, list]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple, load: Callable[[], list]) -> list:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = load()
+        with self._lock:
+            self._data[key] = (now + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_sec": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+_suggest_cache: Optional[SuggestCache] = None
+_suggest_cache_lock = threading.Lock()
+
+
+def get_suggest_cache() -> SuggestCache:
+    global _suggest_cache
+    with _suggest_cache_lock:
+        if _suggest_cache is None:
+            cfg = current_app.config
+            _suggest_cache = SuggestCache(
+                cfg.get("SEARCH_SUGGEST_CACHE_ENTRIES", 1024), cfg.get("SEARCH_SUGGEST_TTL_SEC", 30)
+            )
+        return _suggest_cache
+
+
+def suggest(q: str, scope: Scope, kind: int = USER, limit: int = 8) -> list:
+    """Type-ahead: the best `limit` matches of one kind as {"id", "label"}."""
+    terms = _terms(q)
+    if not terms:
+        return []
+    if kind != USER:
+        scope = Scope("all", None)  # lessons and exercises are the same for everyone
+
+    def load() -> list:
+        ids = _ranked_ids(terms, limit, scope, (kind,)).get(kind, [])
+        if not ids:
+            return []
+        model, label = _MODELS[kind], _LIKE_FIELDS[kind][0]
+        labels = dict(db.session.query(model.id, label).filter(model.id.in_(ids)).all())
+        return [{"id": i, "label": labels[i]} for i in ids if i in labels]
+
+    return get_suggest_cache().get((scope.key, kind, " ".join(terms), limit), load)
@@ -50,6 +50,25 @@ def ensure_sqlite_schema() -> None:
         ("exercise", "require_print", "require_print BOOLEAN DEFAULT 0"),
         ("exercise", "forbid_print", "forbid_print BOOLEAN DEFAULT 0"),
         ("exercise", "require_input", "require_input BOOLEAN DEFAULT 0"),
+        ("exercise", "forbidden_imports", "forbidden_imports VARCHAR(255) DEFAULT ''"),
+        ("exercise", "require_recursion", "require_recursion BOOLEAN DEFAULT 0"),
+        ("exercise", "forbid_recursion", "forbid_recursion BOOLEAN DEFAULT 0"),
+        ("exercise", "forbid_comprehensions", "forbid_comprehensions BOOLEAN DEFAULT 0"),
+        ("exercise", "memory_limit_mb", "memory_limit_mb INTEGER DEFAULT 256"),
+        ("exercise", "bench_enabled", "bench_enabled BOOLEAN DEFAULT 0"),
+        ("exercise", "bench_function", "bench_function VARCHAR(64)"),
+        ("exercise", "bench_inputs", "bench_inputs TEXT DEFAULT ''"),
+        ("exercise", "bench_repeats", "bench_repeats INTEGER DEFAULT 7"),
+        ("exercise", "bench_reference_ms", "bench_reference_ms FLOAT"),
+
+        ("message", "conversation_key", "conversation_key VARCHAR(32)"),
+
+        ("progress", "highest_ordinal", "highest_ordinal INTEGER"),
+
+        ("submission", "cpu_ms", "cpu_ms INTEGER"),
+        ("submission", "peak_rss_kb", "peak_rss_kb INTEGER"),
+        ("submission", "bench_median_ms", "bench_median_ms FLOAT"),
+        ("submission", "bench_p95_ms", "bench_p95_ms FLOAT"),
     ]
 
     for table, col, ddl in needed:
@@ -61,4 +80,14 @@ def ensure_sqlite_schema() -> None:
         db.text("CREATE UNIQUE INDEX IF NOT EXISTS ix_user_email ON user (email)")
     )
 
+    # Messages from before conversation_key, then its index (create_all only
+    # indexes new tables).
+    db.session.execute(db.text(
+        "UPDATE message SET conversation_key = MIN(sender_id, receiver_id) || ':' || MAX(sender_id, receiver_id) "
+        "WHERE conversation_key IS NULL"
+    ))
+    db.session.execute(
+        db.text("CREATE INDEX IF NOT EXISTS ix_message_conversation ON message (conversation_key, id)")
+    )
+
     db.session.commit()
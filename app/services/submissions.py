@@ -0,0 +1,85 @@
+from flask import current_app
+
+from ..extensions import db
+from ..models import Submission
+from .benchmark import benchmark_python
+from .code_checker import check_code
+from .grader import grade_python
+from .leaderboard import record_benchmark
+
+# Submission columns set by `evaluate_submission`
+RESULT_FIELDS = ("status", "runtime_ms", "cpu_ms", "peak_rss_kb", "output", "bench_median_ms", "bench_p95_ms")
+
+
+def grade_submission(sub: Submission) -> Submission:
+    """Check code rules, run the exercise tests and store the verdict on `sub`."""
+    for field, value in evaluate_submission(sub.code_py, sub.exercise).items():
+        setattr(sub, field, value)
+    record_benchmark(sub)
+    db.session.commit()
+    return sub
+
+
+def evaluate_submission(code_py: str, ex) -> dict:
+    """Grade `code_py` against exercise `ex` without touching the database.
+
+    `ex` only needs the Exercise attributes (rules, tests, limits, benchmark
+    settings), so a plain namespace works too, e.g. in bulk-regrade workers.
+    Returns the RESULT_FIELDS values for the Submission.
+    """
+    res = dict.fromkeys(RESULT_FIELDS)
+
+    # 1) Check structural rules before running pytest (fast + clearer feedback)
+    try:
+        rule_errors = check_code(code_py, ex)
+    except Exception as e:
+        rule_errors = [f"Code rule check failed: {e}"]
+
+    if rule_errors:
+        res["status"] = "FAILED"
+        res["runtime_ms"] = 0
+        res["output"] = "CODE RULES FAILED:\n" + "\n".join([f"- {m}" for m in rule_errors])
+        return res
+
+    # 2) Then run tests in the grader
+    result = grade_python(code_py, ex.tests_py, ex.time_limit_ms, ex.memory_limit_mb)
+    res["runtime_ms"] = result.get("runtime_ms")
+    res["cpu_ms"] = result.get("cpu_ms")
+    res["peak_rss_kb"] = result.get("peak_rss_kb")
+    res["output"] = result.get("output") or ""
+
+    if result["status"] == "PASSED" and ex.bench_enabled and (ex.bench_inputs or "").strip():
+        # 3) Performance-graded exercise: time the passing solution
+        _run_benchmark(code_py, ex, res)
+    elif result["status"] == "PASSED":
+        res["status"] = "WAITING_APPROVAL"
+        res["output"] += "\n\n✅ Tests passed. Waiting for teacher approval."
+    elif result["status"] == "FAILED":
+        res["status"] = "FAILED"
+    else:
+        res["status"] = "ERROR"
+    return res
+
+
+def _run_benchmark(code_py: str, ex, res: dict) -> None:
+    repeats = ex.bench_repeats or 7
+    # CPU budget: the per-run limit for the warm-up and every timed pass.
+    cpu_ms = (ex.time_limit_ms or 400) * (repeats + 1) + current_app.config.get("GRADER_CPU_OVERHEAD_MS", 1000)
+    bench = benchmark_python(
+        code_py, ex.bench_function or ex.function_name or "solve", ex.bench_inputs, repeats,
+        cpu_ms=cpu_ms, memory_mb=ex.memory_limit_mb,
+    )
+    if bench["status"] != "OK":
+        res["status"] = "FAILED" if bench["status"] == "FAILED" else "ERROR"
+        res["output"] += "\n\n❌ Tests passed, but the benchmark did not complete:\n" + bench["output"]
+        return
+
+    res["bench_median_ms"] = bench["median_ms"]
+    res["bench_p95_ms"] = bench["p95_ms"]
+    summary = f"⏱ Benchmark: median {bench['median_ms']:.3f} ms, p95 {bench['p95_ms']:.3f} ms over {repeats} runs"
+    if ex.bench_reference_ms and bench["median_ms"] > ex.bench_reference_ms:
+        res["status"] = "FAILED"
+        res["output"] += f"\n\n{summary}\n❌ Too slow: the median must be at most {ex.bench_reference_ms:g} ms."
+        return
+    res["status"] = "WAITING_APPROVAL"
+    res["output"] += f"\n\n{summary}\n✅ Tests passed. Waiting for teacher approval."
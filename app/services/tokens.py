@@ -1,13 +1,22 @@
 from ..extensions import db
 from ..models import User
+from .user_cache import invalidate_user
 
 def add_tokens(user: User, amount: int):
     user.tokens = max(0, (user.tokens or 0) + amount)
     db.session.commit()
 
-def spend_token(user: User, amount: int = 1) -> bool:
-    if (user.tokens or 0) < amount:
-        return False
-    user.tokens -= amount
+def spend_token(user, amount: int = 1) -> bool:
+    # `user` may be the cached current_user snapshot: update the row directly
+    # (atomically, so two requests cannot spend the same token).
+    spent = db.session.execute(
+        db.update(User).where(User.id == user.id, User.tokens >= amount).values(tokens=User.tokens - amount)
+    ).rowcount
     db.session.commit()
-    return True
+    if spent:
+        invalidate_user(user.id)
+        if not isinstance(user, User):
+            # A snapshot: keep this request's page in sync (a User row is
+            # expired by the commit and reloads on its own).
+            user.tokens = (user.tokens or 0) - amount
+    return bool(spent)
@@ -0,0 +1,129 @@
+"""Per-process cache of logged-in users for Flask-Login.
+
+`load_user` runs on every authenticated request; instead of a query each
+time it returns a `UserSnapshot` (identity, role, subscription, tokens)
+cached for USER_CACHE_TTL_SEC, at most USER_CACHE_ENTRIES users per process.
+
+Any committed ORM change to a User row drops that user from this process's
+cache (session hooks below); code that changes users with bulk UPDATEs
+calls `invalidate_user`. Other processes pick the change up within the TTL,
+which bounds how long a role change or deactivation can lag there.
+
+`current_user` is therefore a read-only snapshot, not a session object:
+load the User row to change it.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..models import User
+
+_FIELDS = ("id", "username", "role", "email", "created_by_id", "is_active_paid", "paid_until", "tokens")
+
+
+class UserSnapshot(UserMixin):
+    def __init__(self, user: User):
+        for name in _FIELDS:
+            setattr(self, name, getattr(user, name))
+
+    subscription_ok = User.subscription_ok
+
+    def __repr__(self) -> str:
+        return f"<UserSnapshot {self.id} {self.username}>"
+
+
+class UserCache:
+    def __init__(self, max_entries: int = 2048, ttl: float = 10.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[int, tuple[float, UserSnapshot]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int, load: Callable[[int], Optional[User]]) -> Optional[UserSnapshot]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        user = load(user_id)
+        if user is None:
+            return None
+        snap = UserSnapshot(user)
+        with self._lock:
+            self._data[user_id] = (now + self.ttl, snap)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return snap
+
+    def invalidate(self, *user_ids: int) -> None:
+        with self._lock:
+            for uid in user_ids:
+                if self._data.pop(uid, None) is not None:
+                    self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_sec": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+_cache: Optional[UserCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_user_cache() -> UserCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            cfg = current_app.config
+            _cache = UserCache(cfg.get("USER_CACHE_ENTRIES", 2048), cfg.get("USER_CACHE_TTL_SEC", 10))
+        return _cache
+
+
+def invalidate_user(*user_ids: int) -> None:
+    if _cache is not None:
+        _cache.invalidate(*user_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _note_user_changes(session, _flush_context):
+    ids = {obj.id for obj in session.dirty | session.deleted if isinstance(obj, User) and obj.id is not None}
+    if ids:
+        session.info.setdefault("users_changed", set()).update(ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _drop_changed_users(session):
+    ids = session.info.pop("users_changed", None)
+    if ids:
+        invalidate_user(*ids)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_user_changes(session, _previous_transaction):
+    session.info.pop("users_changed", None)
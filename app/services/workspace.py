@@ -0,0 +1,236 @@
+"""Reusable working directories for running student code.
+
+Every Run, grading job and benchmark needs a directory holding
+`solution.py` (plus the exercise tests when grading). Instead of creating
+and deleting a TemporaryDirectory each time, each process keeps a few
+directories under WORKSPACE_DIR (default /dev/shm, so the files never
+touch the disk) and empties them after every job.
+
+Tests are staged once per exercise version: a workspace remembers which
+tests it holds, and checkout prefers an idle workspace that already has the
+requested version, so grading a run of submissions to one exercise only
+writes `solution.py`. Staged files are kept only while their inode and
+ctime are unchanged since they were written (ctime cannot be set from user
+space), so tests a job edited or replaced are written again. Everything
+else a job leaves behind is removed on release, notably `__pycache__`:
+a stale solution.pyc with the same size and mtime second would be imported
+instead of the new source. A workspace that cannot be emptied is dropped.
+
+Workspaces without a tests key never contain test files, so a Run cannot
+read the hidden tests.
+"""
+
+from __future__ import annotations
+
+import atexit
+import hashlib
+import os
+import shutil
+import socket
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Optional
+
+from flask import current_app
+
+_PREFIX = "eduplatform-ws-"
+
+
+def default_root() -> str:
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+@lru_cache(maxsize=512)
+def tests_key(tests_py: str, engine: str) -> str:
+    """Identifies one version of an exercise's tests (per engine)."""
+    return hashlib.sha256(f"{engine}\0{tests_py}".encode("utf-8")).hexdigest()
+
+
+def _write(path: str, data) -> None:
+    # Unlink first and create exclusively: never write through a symlink the
+    # previous job may have left in place of the file.
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    with open(path, "xb") as f:
+        f.write(data.encode("utf-8") if isinstance(data, str) else data)
+
+
+class Workspace:
+    def __init__(self, path: str):
+        self.path = path
+        self.tests_key: Optional[str] = None
+        self._staged: dict = {}  # name -> (st_ino, st_ctime_ns, st_size)
+
+    def write(self, name: str, data) -> str:
+        path = os.path.join(self.path, name)
+        _write(path, data)
+        return path
+
+    def _intact(self, name: str) -> bool:
+        try:
+            st = os.lstat(os.path.join(self.path, name))
+        except OSError:
+            return False
+        return (st.st_ino, st.st_ctime_ns, st.st_size) == self._staged[name]
+
+    def stage(self, key: Optional[str], files: dict) -> bool:
+        """Make the staged files exactly `files` for `key`; True if anything was written."""
+        if key is not None and key == self.tests_key and all(self._intact(n) for n in self._staged):
+            return False
+        self.unstage()
+        for name, data in files.items():
+            path = self.write(name, data)
+            st = os.lstat(path)
+            self._staged[name] = (st.st_ino, st.st_ctime_ns, st.st_size)
+        self.tests_key = key
+        return bool(files)
+
+    def unstage(self) -> None:
+        for name in self._staged:
+            try:
+                os.unlink(os.path.join(self.path, name))
+            except FileNotFoundError:
+                pass
+        self._staged = {}
+        self.tests_key = None
+
+    def clean(self) -> bool:
+        """Remove what the job left behind. Returns False if that failed."""
+        try:
+            if not all(self._intact(n) for n in self._staged):
+                self.unstage()
+            for entry in os.listdir(self.path):
+                if entry in self._staged:
+                    continue
+                path = os.path.join(self.path, entry)
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            return sorted(os.listdir(self.path)) == sorted(self._staged)
+        except OSError:
+            return False
+
+
+class WorkspacePool:
+    def __init__(self, root: str, size: int = 4):
+        self.size = max(1, size)
+        self.dir = os.path.join(os.path.abspath(root), f"{_PREFIX}{socket.gethostname()}-{os.getpid()}")
+        self._idle: list[Workspace] = []
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.created = self.jobs = self.staged = 0
+
+        _sweep(os.path.dirname(self.dir))
+        os.makedirs(self.dir, mode=0o700, exist_ok=True)
+        for _ in range(self.size):
+            self._idle.append(self._create())
+
+    def _create(self) -> Workspace:
+        with self._lock:
+            self._seq += 1
+            self.created += 1
+            path = os.path.join(self.dir, str(self._seq))
+        os.mkdir(path, 0o700)
+        return Workspace(path)
+
+    def checkout(self, key: Optional[str] = None) -> Workspace:
+        with self._lock:
+            self.jobs += 1
+            ws = None
+            # Prefer the tests we need, else a workspace without tests (keeps
+            # other exercises' staged tests around), else any.
+            for cand in reversed(self._idle):
+                if cand.tests_key == key:
+                    ws = cand
+                    break
+            if ws is None:
+                ws = next((c for c in reversed(self._idle) if c.tests_key is None), None)
+            if ws is None and self._idle:
+                ws = self._idle[0]  # least recently used
+            if ws is not None:
+                self._idle.remove(ws)
+        return ws if ws is not None else self._create()
+
+    def release(self, ws: Workspace) -> None:
+        if ws.clean():
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append(ws)
+                    return
+        shutil.rmtree(ws.path, ignore_errors=True)
+
+    @contextmanager
+    def use(self, key: Optional[str] = None, staged: Optional[dict] = None):
+        """A clean workspace holding `staged` (test files) for `key`."""
+        ws = self.checkout(key)
+        try:
+            if ws.stage(key, staged or {}) and staged:
+                with self._lock:
+                    self.staged += 1
+            yield ws
+        finally:
+            self.release(ws)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"dir": self.dir, "idle": len(self._idle), "created": self.created,
+                    "jobs": self.jobs, "tests_written": self.staged}
+
+    def shutdown(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def _sweep(root: str) -> None:
+    # Remove workspace roots of processes on this host that are gone
+    # (crashed, or multiprocessing children, which skip atexit).
+    prefix = f"{_PREFIX}{socket.gethostname()}-"
+    try:
+        entries = os.listdir(root)
+    except OSError:
+        return
+    for entry in entries:
+        if not entry.startswith(prefix):
+            continue
+        try:
+            pid = int(entry[len(prefix):])
+            os.kill(pid, 0)
+        except ValueError:
+            continue
+        except ProcessLookupError:
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+        except OSError:
+            pass  # alive, another user
+
+
+_pool: Optional[WorkspacePool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_workspaces() -> WorkspacePool:
+    """This process's workspace pool, created on first use (or after a fork)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            cfg = current_app.config
+            _pool = WorkspacePool(cfg.get("WORKSPACE_DIR") or default_root(), cfg.get("WORKSPACE_POOL_SIZE", 4))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def workspace(key: Optional[str] = None, staged: Optional[dict] = None):
+    """Context manager: a workspace from this process's pool (see WorkspacePool.use)."""
+    return get_workspaces().use(key, staged)
+
+
+@atexit.register
+def _shutdown_pool() -> None:
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.shutdown()
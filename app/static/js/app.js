@@ -61,6 +61,7 @@ const I18N = {
     "nav.dashboard": "Dashboard",
     "nav.search": "Search",
     "nav.lab": "Laboratory",
+    "nav.inbox": "Messages",
     "nav.reviews": "Reviews",
     "nav.logout": "Logout",
     "nav.login": "Login",
@@ -72,6 +73,7 @@ const I18N = {
     "nav.dashboard": "لوحة التحكم",
     "nav.search": "بحث",
     "nav.lab": "المختبر",
+    "nav.inbox": "الرسائل",
     "nav.reviews": "المراجعات",
     "nav.logout": "تسجيل الخروج",
     "nav.login": "تسجيل الدخول",
@@ -167,7 +169,35 @@ function stopLoadingBar(){
   }, 220);
 }
 
+// Type-ahead for the top search box: user names from /api/search/suggest
+function initSearchSuggest(){
+  const input = document.querySelector(".search-mini input[name=q]");
+  const list = document.getElementById("searchSuggest");
+  if (!input || !list) return;
+  let timer = null, last = "";
+  input.addEventListener("input", () => {
+    clearTimeout(timer);
+    timer = setTimeout(async () => {
+      const q = input.value.trim();
+      if (q.length < 2 || q === last) return;
+      last = q;
+      try {
+        const r = await fetch("/api/search/suggest?q=" + encodeURIComponent(q));
+        if (!r.ok) return;
+        const items = await r.json();
+        if (input.value.trim() !== q) return;  // typed on meanwhile
+        list.replaceChildren(...items.map(it => {
+          const o = document.createElement("option");
+          o.value = it.label;
+          return o;
+        }));
+      } catch (e) { /* offline: no suggestions */ }
+    }, 150);
+  });
+}
+
 document.addEventListener("DOMContentLoaded", () => {
+  initSearchSuggest();
   // quick load feel on first render
   startLoadingBar();
   setTimeout(stopLoadingBar, 5000);
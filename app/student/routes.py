@@ -1,13 +1,16 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify
+import json
+
+from flask import Blueprint, Response, render_template, redirect, url_for, request, flash, jsonify, abort
 from flask_login import current_user
 from ..decorators import role_required
 from ..extensions import db
 from ..models import Role, Lesson, Exercise, Submission, Progress
-from ..services.gating import can_open_exercise, get_progress, progress_stats
+from ..services.gating import can_open_exercise, exercise_states, lesson_states
 from ..services.tokens import spend_token
-from ..services.grader import grade_python
-from ..services.code_checker import check_code
-from ..services.runner import run_python
+from ..services.grading_queue import enqueue_submission, expire_stale_pending, wait_for_submission
+from ..services.admission import Busy, admit_run
+from ..services.runner import run_python, stream_python
+from ..services.leaderboard import rank_of, top_entries
 
 student_bp = Blueprint("student", __name__)
 
@@ -15,13 +18,14 @@ student_bp = Blueprint("student", __name__)
 @role_required(Role.STUDENT)
 def dashboard():
     lessons = Lesson.query.order_by(Lesson.order.asc()).all()
-    prog = get_progress(current_user.id)
-    passed_count, total = progress_stats(current_user.id)
+    states = lesson_states(current_user.id)
+    passed_count = sum(st["passed"] for st in states.values())
+    total = sum(st["total"] for st in states.values())
     progress_pct = 0 if total == 0 else int((passed_count / total) * 100)
     return render_template(
         "student_dashboard.html",
         lessons=lessons,
-        prog=prog,
+        states=states,
         total=total,
         passed=passed_count,
         progress_pct=progress_pct,
@@ -32,7 +36,7 @@ def dashboard():
 def lesson_view(lesson_id):
     lesson = Lesson.query.get_or_404(lesson_id)
     exercises = Exercise.query.filter_by(lesson_id=lesson_id).order_by(Exercise.order.asc()).all()
-    return render_template("lesson.html", lesson=lesson, exercises=exercises)
+    return render_template("lesson.html", lesson=lesson, exercises=exercises, states=exercise_states(current_user.id))
 
 @student_bp.get("/exercise/<int:exercise_id>")
 @role_required(Role.STUDENT)
@@ -42,7 +46,28 @@ def exercise_view(exercise_id):
         flash("This exercise is locked. Pass the previous one first.")
         return redirect(url_for("student.dashboard"))
     last = Submission.query.filter_by(student_id=current_user.id, exercise_id=ex.id).order_by(Submission.id.desc()).first()
-    return render_template("exercise.html", ex=ex, last=last, show_hint=False)
+    return render_template("exercise.html", ex=ex, last=last, show_hint=False, **_leaderboard_ctx(ex))
+
+def _leaderboard_ctx(ex):
+    if not ex.bench_enabled:
+        return {"board": [], "my_rank": None, "my_best": None}
+    my_rank, my_best = rank_of(ex.id, current_user.id)
+    return {"board": top_entries(ex.id), "my_rank": my_rank, "my_best": my_best}
+
+@student_bp.get("/exercise/<int:exercise_id>/leaderboard")
+@role_required(Role.STUDENT)
+def leaderboard(exercise_id):
+    ex = Exercise.query.get_or_404(exercise_id)
+    if not can_open_exercise(current_user.id, ex.id):
+        abort(403)
+    limit = min(max(request.args.get("limit", 10, type=int), 1), 100)
+    my_rank, my_best = rank_of(ex.id, current_user.id) if ex.bench_enabled else (None, None)
+    return jsonify({
+        "exercise_id": ex.id,
+        "reference_ms": ex.bench_reference_ms,
+        "entries": top_entries(ex.id, limit) if ex.bench_enabled else [],
+        "me": {"rank": my_rank, "median_ms": my_best.median_ms} if my_best else None,
+    })
 
 @student_bp.post("/exercise/<int:exercise_id>/hint")
 @role_required(Role.STUDENT)
@@ -52,7 +77,7 @@ def hint(exercise_id):
         flash("Not enough tokens.")
         return redirect(url_for("student.exercise_view", exercise_id=ex.id))
     last = Submission.query.filter_by(student_id=current_user.id, exercise_id=ex.id).order_by(Submission.id.desc()).first()
-    return render_template("exercise.html", ex=ex, last=last, show_hint=True)
+    return render_template("exercise.html", ex=ex, last=last, show_hint=True, **_leaderboard_ctx(ex))
 
 # ✅ Terminal Run endpoint (supports input via stdin_text)
 @student_bp.post("/exercise/<int:exercise_id>/run")
@@ -65,9 +90,48 @@ def run_code(exercise_id):
     code = request.form.get("code_py") or ""
     stdin_text = request.form.get("stdin_text") or ""
 
-    result = run_python(code, stdin_text)
+    try:
+        ticket = admit_run(current_user.id)
+    except Busy as e:
+        resp = jsonify({"status": "BUSY", "stdout": "", "stderr": str(e)})
+        resp.headers["Retry-After"] = str(e.retry_after)
+        return resp, 429
+
+    if "text/event-stream" in request.headers.get("Accept", ""):
+        try:
+            events = stream_python(code, stdin_text, memory_limit_mb=ex.memory_limit_mb)
+        except Exception:
+            ticket.release()
+            raise
+        resp = Response(
+            _sse(events), mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        resp.call_on_close(ticket.release)  # the slot is held until the stream ends
+        return resp
+
+    with ticket:
+        result = run_python(code, stdin_text, memory_limit_mb=ex.memory_limit_mb)
     return jsonify(result)
 
+def _sse(events):
+    """Format runner events as Server-Sent Events.
+
+    Pings go out as comments; they exist so that writing to a closed
+    connection fails, the server closes this generator and the runner
+    kills the program.
+    """
+    try:
+        for event, data in events:
+            if event == "ping":
+                yield ": ping\n\n"
+            elif event == "done":
+                yield f"event: done\ndata: {json.dumps(data)}\n\n"
+            else:
+                yield f"event: {event}\ndata: {json.dumps({'text': data})}\n\n"
+    finally:
+        events.close()
+
 @student_bp.post("/exercise/<int:exercise_id>/submit")
 @role_required(Role.STUDENT)
 def submit(exercise_id):
@@ -81,39 +145,48 @@ def submit(exercise_id):
     db.session.add(sub)
     db.session.commit()
 
-    # 1) Check structural rules before running pytest (fast + clearer feedback)
-    try:
-        rule_errors = check_code(code, ex)
-    except Exception as e:
-        rule_errors = [f"Code rule check failed: {e}"]
-
-    if rule_errors:
-        sub.status = "FAILED"
+    # Grading happens in the background; the page polls submission_status.
+    if not enqueue_submission(sub.id):
+        sub.status = "ERROR"
         sub.runtime_ms = 0
-        sub.output = "CODE RULES FAILED:\n" + "\n".join([f"- {m}" for m in rule_errors])
+        sub.output = "The grader is busy right now. Please submit again in a moment."
         db.session.commit()
-        flash("Code rules not satisfied. Fix the issues and try again.")
+        flash("The grader is busy. Try again in a moment.")
         return redirect(url_for("student.exercise_view", exercise_id=ex.id))
 
-    # 2) Then run tests in the grader
-    result = grade_python(code, ex.tests_py)
-    sub.runtime_ms = result.get("runtime_ms")
-    sub.output = result.get("output") or ""
-
-    if result["status"] == "PASSED":
-        sub.status = "WAITING_APPROVAL"
-        sub.output += "\n\n✅ Tests passed. Waiting for teacher approval."
-    elif result["status"] == "FAILED":
-        sub.status = "FAILED"
-    else:
-        sub.status = "ERROR"
-
-    db.session.commit()
-
-    # ✅ Redirect to dashboard + congrats on success
-    if sub.status == "WAITING_APPROVAL":
-        flash("🎉 Correct! Tests passed ✅. Waiting for teacher approval.")
-        return redirect(url_for("student.dashboard"))
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({
+            "id": sub.id,
+            "status": sub.status,
+            "status_url": url_for("student.submission_status", sub_id=sub.id),
+        }), 202
 
-    flash("Not passed yet. Check output.")
+    flash("Submitted. Grading your code...")
     return redirect(url_for("student.exercise_view", exercise_id=ex.id))
+
+@student_bp.get("/submission/<int:sub_id>/status")
+@role_required(Role.STUDENT)
+def submission_status(sub_id):
+    sub = Submission.query.get_or_404(sub_id)
+    if sub.student_id != current_user.id:
+        abort(404)
+
+    # ?wait=N holds the request briefly; kept small because every waiting
+    # request pins one of the few gunicorn worker threads.
+    wait = min(max(request.args.get("wait", 0, type=float), 0), 2)
+    if wait and sub.status == "PENDING":
+        sub = wait_for_submission(sub.id, wait)
+    if sub.status == "PENDING" and expire_stale_pending(sub.id):
+        db.session.refresh(sub)
+
+    return jsonify({
+        "id": sub.id,
+        "status": sub.status,
+        "done": sub.status != "PENDING",
+        "runtime_ms": sub.runtime_ms,
+        "cpu_ms": sub.cpu_ms,
+        "peak_rss_kb": sub.peak_rss_kb,
+        "bench_median_ms": sub.bench_median_ms,
+        "bench_p95_ms": sub.bench_p95_ms,
+        "output": sub.output or "",
+    })
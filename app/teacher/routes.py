@@ -4,7 +4,8 @@ from flask_login import current_user
 from ..decorators import role_required
 from ..extensions import db
 from ..models import Role, User, Submission, Exercise
-from ..services.gating import mark_passed
+from ..services.gating import mark_passed, progress_for_students
+from ..services.leaderboard import refresh_entry
 from ..services.tokens import add_tokens
 
 teacher_bp = Blueprint("teacher", __name__)
@@ -24,7 +25,10 @@ def dashboard():
         .order_by(Submission.created_at.desc())
         .limit(20).all()
     )
-    return render_template("teacher_dashboard.html", my_students=my_students, recent=recent, waiting_count=waiting_count)
+    progress = progress_for_students([s.id for s in my_students])
+    return render_template(
+        "teacher_dashboard.html", my_students=my_students, progress=progress, recent=recent, waiting_count=waiting_count,
+    )
 
 @teacher_bp.post("/create-student")
 @role_required(Role.TEACHER)
@@ -91,6 +95,7 @@ def reject(sub_id):
     sub.reviewed_by_id = current_user.id
     sub.reviewed_at = datetime.utcnow()
     sub.review_note = note
+    refresh_entry(sub.student_id, sub.exercise_id)  # drop it from the leaderboard
     db.session.commit()
 
     flash("Rejected ❌.")
@@ -0,0 +1,165 @@
+"""Drive the Docker container pool against benchmarks/fake_docker.py.
+
+Usage:
+    python benchmarks/bench_docker_pool.py [runs]
+
+No Docker daemon is needed: the pool is pointed at the fake CLI, so this
+exercises the pool's own bookkeeping (checkout, per-job reset, replacement
+after a timeout, after `max_jobs` and after a failed health check) and
+prints median / p95 wall time per job. Exits non-zero if a check fails.
+"""
+
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.services.docker_pool import RUNNER_MOUNT, ContainerPool  # noqa: E402
+from app.services.lite_engine import RUNNER_SCRIPT, compile_tests  # noqa: E402
+from app.services.lite_runner import TESTS_BYTECODE  # noqa: E402
+
+FAKE_DOCKER = os.path.join(ROOT, "benchmarks", "fake_docker.py")
+PYTEST = ["pytest", "-q", "-p", "no:cacheprovider"]
+LITE = ["python", RUNNER_MOUNT]
+
+CODE = """
+def add(a, b):
+    return a + b
+"""
+
+TESTS = """
+from solution import add
+
+def test_small():
+    assert add(1, 2) == 3
+
+def test_negative():
+    assert add(-1, -1) == -2
+"""
+
+LEFTOVER_TESTS = """
+def test_leave_files():
+    open("leftover.txt", "w").write("x")
+"""
+
+SEES_LEFTOVER_TESTS = """
+import os
+
+def test_clean_workdir():
+    assert not os.path.exists("leftover.txt")
+"""
+
+LOOP_TESTS = """
+def test_forever():
+    while True:
+        pass
+"""
+
+failures = []
+
+
+def check(label, ok):
+    print(f"{'ok  ' if ok else 'FAIL'} {label}")
+    if not ok:
+        failures.append(label)
+
+
+def names(pool):
+    with pool._lock:
+        return {c.name for c in pool._all}
+
+
+def bench(label, pool, files, cmd, runs):
+    times = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        reply = pool.run(files, cmd, timeout=10)
+        times.append((time.perf_counter() - t) * 1000)
+        if reply["returncode"] != 0:
+            check(f"{label}: job passed", False)
+            print(reply["output"])
+            return
+    times.sort()
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(f"     {label:<20} median {statistics.median(times):8.1f} ms   p95 {p95:8.1f} ms")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    tmp = tempfile.mkdtemp(prefix="bench-docker-pool-")
+    os.environ["FAKE_DOCKER_STATE"] = os.path.join(tmp, "state")
+
+    pool = ContainerPool(
+        image="edu_runner:latest",
+        size=2,
+        max_jobs=1000,
+        root_dir=os.path.join(tmp, "work"),
+        docker_bin=FAKE_DOCKER,
+        runner_script=RUNNER_SCRIPT,
+    )
+    try:
+        check("pool starts `size` containers", pool.stats()["containers"] == 2)
+
+        # checkout / return
+        files = {"solution.py": CODE, "test_solution.py": TESTS}
+        before = names(pool)
+        reply = pool.run(files, PYTEST, timeout=10)
+        check("pytest job passes", reply["returncode"] == 0 and not reply["timeout"])
+        lite_files = {**files, TESTS_BYTECODE: compile_tests(TESTS)}
+        reply = pool.run(lite_files, LITE, timeout=10)
+        check("lite job passes via the read-only runner mount", reply["returncode"] == 0)
+        check("containers are reused", names(pool) == before and pool.stats()["idle"] == 2)
+
+        # reset
+        pool.run({"solution.py": CODE, "test_solution.py": LEFTOVER_TESTS}, PYTEST, timeout=10)
+        with pool._lock:
+            workdirs = [c.workdir for c in pool._all]
+        check("work dirs are emptied after a job", all(not os.listdir(d) for d in workdirs))
+        reply = pool.run({"solution.py": CODE, "test_solution.py": SEES_LEFTOVER_TESTS}, PYTEST, timeout=10)
+        check("next job does not see the previous job's files", reply["returncode"] == 0)
+
+        # replace on timeout
+        before, replaced = names(pool), pool.replaced
+        reply = pool.run({"solution.py": CODE, "test_solution.py": LOOP_TESTS}, PYTEST, timeout=2)
+        check("timed-out job reports TIMEOUT", reply["timeout"] and reply["output"] == "TIMEOUT")
+        check("timed-out container is replaced", pool.replaced == replaced + 1 and len(names(pool) - before) == 1)
+        check("pool is back to full size", pool.stats()["containers"] == 2)
+
+        # health replacement: "stop" one container behind the pool's back
+        before, replaced = names(pool), pool.replaced
+        victim = sorted(before)[0]
+        subprocess.run([FAKE_DOCKER, "rm", "-f", victim], capture_output=True, env=os.environ)
+        with pool._lock:
+            for c in pool._all:
+                c.checked_at = 0  # force a health check on the next checkout
+        for _ in range(2):
+            reply = pool.run(files, PYTEST, timeout=10)
+            check("job after a dead container still passes", reply["returncode"] == 0)
+        check("dead container is replaced", victim not in names(pool) and pool.replaced == replaced + 1)
+
+        # recycling after max_jobs
+        pool.max_jobs = 1
+        before = names(pool)
+        pool.run(files, PYTEST, timeout=10)
+        check("container is recycled after max_jobs", len(names(pool) - before) == 1)
+        pool.max_jobs = 1000
+
+        bench("pytest", pool, files, PYTEST, runs)
+        bench("lite", pool, lite_files, LITE, runs)
+    finally:
+        pool.shutdown()
+
+    check("shutdown removes every container", not os.listdir(os.environ["FAKE_DOCKER_STATE"]))
+    shutil.rmtree(tmp, ignore_errors=True)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
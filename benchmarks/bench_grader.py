@@ -0,0 +1,67 @@
+"""Compare grading engines on a small exercise.
+
+Usage:
+    python benchmarks/bench_grader.py [runs]
+
+Runs the same passing submission through every local grading path
+(fresh subprocess vs warm pool, pytest vs lite engine) and prints
+median / p95 wall time per submission. No database is needed.
+"""
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+
+from app.config import Config  # noqa: E402
+from app.services.grader import _grade_local, _grade_pooled  # noqa: E402
+
+CODE = """
+def add(a, b):
+    return a + b
+"""
+
+TESTS = """
+from solution import add
+
+def test_small():
+    assert add(1, 2) == 3
+
+def test_negative():
+    assert add(-1, -1) == -2
+
+def test_strings():
+    assert add("a", "b") == "ab"
+"""
+
+
+def bench(label, fn, runs):
+    fn()  # warm-up (starts pool workers, fills bytecode cache)
+    times = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - t) * 1000)
+        assert result["status"] == "PASSED", result
+    times.sort()
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(f"{label:<24} median {statistics.median(times):8.1f} ms   p95 {p95:8.1f} ms")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    with app.app_context():
+        bench("subprocess + pytest", lambda: _grade_local(CODE, TESTS, "pytest"), runs)
+        bench("subprocess + lite", lambda: _grade_local(CODE, TESTS, "lite"), runs)
+        bench("warm pool + pytest", lambda: _grade_pooled(CODE, TESTS, "pytest"), runs)
+        bench("warm pool + lite", lambda: _grade_pooled(CODE, TESTS, "lite"), runs)
+
+
+if __name__ == "__main__":
+    main()
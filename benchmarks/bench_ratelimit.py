@@ -0,0 +1,73 @@
+"""Per-check cost of the rate-limit storages, and whether limits hold.
+
+Usage:
+    python benchmarks/bench_ratelimit.py [checks] [processes]
+
+Times `hit()` for the fixed-window and sliding-window-counter strategies on
+the in-memory storage and on the shared SQLite storage (a temporary file),
+then has several processes hit one "10 per minute" limit at once and counts
+how many hits were allowed: it must be 10 for the shared storage, whatever
+the number of processes. No app or database is needed.
+"""
+
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from limits import parse  # noqa: E402
+from limits.storage import storage_from_string  # noqa: E402
+from limits.strategies import FixedWindowRateLimiter, SlidingWindowCounterRateLimiter  # noqa: E402
+
+import app.services.ratelimit_store  # noqa: E402,F401  registers "sqlite-limits"
+
+STRATEGIES = {"fixed-window": FixedWindowRateLimiter, "sliding-window-counter": SlidingWindowCounterRateLimiter}
+
+
+def bench(label, limiter, checks):
+    item = parse(f"{checks * 10} per hour")
+    times = []
+    for i in range(checks):
+        t = time.perf_counter()
+        limiter.hit(item, "bench", str(i % 50))  # 50 distinct clients
+        times.append((time.perf_counter() - t) * 1e6)
+    times.sort()
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(f"{label:<40} median {statistics.median(times):7.1f} us   p95 {p95:7.1f} us")
+
+
+def _hammer(uri, strategy, tries, out):
+    limiter = STRATEGIES[strategy](storage_from_string(uri))
+    item = parse("10 per minute")
+    out.put(sum(limiter.hit(item, "login", "1.2.3.4") for _ in range(tries)))
+
+
+def shared_limit(uri, strategy, processes):
+    out = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=_hammer, args=(uri, strategy, 20, out)) for _ in range(processes)]
+    for p in procs:
+        p.start()
+    allowed = sum(out.get() for _ in procs)
+    for p in procs:
+        p.join()
+    print(f"{strategy:<24} {processes} processes x 20 hits on 10/minute: {allowed} allowed")
+
+
+def main():
+    checks = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    with tempfile.TemporaryDirectory() as tmp:
+        for strategy, cls in STRATEGIES.items():
+            bench(f"memory  {strategy}", cls(storage_from_string("memory://")), checks)
+            uri = f"sqlite-limits:///{tmp}/{strategy}.db"
+            bench(f"sqlite  {strategy}", cls(storage_from_string(uri)), checks)
+        for strategy in STRATEGIES:
+            shared_limit(f"sqlite-limits:///{tmp}/shared-{strategy}.db", strategy, processes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""Stand-in for the `docker` CLI, for running the container pool locally.
+
+Point DOCKER_BIN at this file (it must be executable) to exercise
+services/docker_pool.py without a Docker daemon. "Containers" are just
+state files; `exec` runs the command on the host in the directory mounted
+at /work, with container paths of other `-v` mounts mapped back to the host.
+Shell commands (the pool's cleanup step) are not run at all. Only the
+subcommands the pool uses are implemented:
+
+    run -d --name N ... -v HOST:CONTAINER[:ro] ... IMAGE CMD...
+    exec [-w DIR] N CMD...
+    inspect -f FORMAT N
+    rm -f N
+
+State lives in $FAKE_DOCKER_STATE (default: /tmp/fake-docker).
+"""
+
+import json
+import os
+import sys
+
+STATE = os.environ.get("FAKE_DOCKER_STATE", "/tmp/fake-docker")
+
+
+def _path(name: str) -> str:
+    return os.path.join(STATE, name + ".json")
+
+
+def _load(name: str):
+    try:
+        with open(_path(name)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def cmd_run(args):
+    name, mounts = None, {}
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a == "--name":
+            name = args[i + 1]
+            i += 2
+        elif a in ("-v", "-w", "-e", "--user", "--tmpfs"):
+            if a == "-v":
+                host, target = args[i + 1].split(":")[:2]
+                mounts[target] = host
+            i += 2
+        elif a.startswith("-"):
+            i += 1
+        else:
+            break  # image
+    os.makedirs(STATE, exist_ok=True)
+    with open(_path(name), "w") as f:
+        json.dump({"name": name, "mounts": mounts}, f)
+    print(name)
+    return 0
+
+
+def cmd_exec(args):
+    workdir = "/work"
+    if args[0] == "-w":
+        workdir, args = args[1], args[2:]
+    c = _load(args[0])
+    if c is None:
+        print(f"Error: No such container: {args[0]}", file=sys.stderr)
+        return 125
+    mounts = c["mounts"]
+    cwd = mounts["/work"] + workdir[len("/work"):] if workdir.startswith("/work") else mounts["/work"]
+    argv = [mounts.get(a, a) for a in args[1:]]
+    if argv[:1] == ["sh"]:
+        return 0  # `kill -9 -1` / `rm -rf /tmp/*` must never run on the host
+    # The image's python/pytest may follow a wrapper such as `prlimit ... --`.
+    host_argv = []
+    for a in argv:
+        if a == "python":
+            host_argv.append(sys.executable)
+        elif a == "pytest":
+            host_argv += [sys.executable, "-m", "pytest"]
+        else:
+            host_argv.append(a)
+    argv = host_argv
+    # exec in place so a client-side timeout kill also stops the "job"
+    os.chdir(cwd)
+    os.execvpe(argv[0], argv, {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"})
+
+
+def cmd_inspect(args):
+    c = _load(args[-1])
+    if c is None:
+        print(f"Error: No such object: {args[-1]}", file=sys.stderr)
+        return 1
+    print("true")
+    return 0
+
+
+def cmd_rm(args):
+    try:
+        os.remove(_path(args[-1]))
+    except FileNotFoundError:
+        pass
+    print(args[-1])
+    return 0
+
+
+def main():
+    sub, args = sys.argv[1], sys.argv[2:]
+    handlers = {"run": cmd_run, "exec": cmd_exec, "inspect": cmd_inspect, "rm": cmd_rm}
+    if sub not in handlers:
+        print(f"fake docker: unsupported command {sub}", file=sys.stderr)
+        return 1
+    return handlers[sub](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())